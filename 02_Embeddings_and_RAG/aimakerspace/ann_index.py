@@ -0,0 +1,202 @@
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from aimakerspace import instrumentation
+from aimakerspace.vector_store import MatrixStore, top_k_indices, top_k_indices_2d
+
+
+class ExactIndex:
+    """Brute-force cosine search over every row of a :class:`MatrixStore`."""
+
+    def __init__(self):
+        self.store: Optional[MatrixStore] = None
+
+    def attach(self, store: MatrixStore) -> None:
+        self.store = store
+
+    def add(self, rows: np.ndarray) -> None:
+        pass
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the index on top of the store."""
+        return 0
+
+    def update(self, row: int) -> None:
+        pass
+
+    def rebuild(self) -> None:
+        """Called after the store is compacted and row ids have changed."""
+        pass
+
+    def state(self) -> Dict[str, np.ndarray]:
+        """Arrays that let :meth:`restore` skip rebuilding the index after a load; empty if there are none."""
+        return {}
+
+    def restore(self, state: Dict[str, np.ndarray]) -> bool:
+        """
+        Adopts a saved :meth:`state` for every row of the attached store, in place
+        of :meth:`add`. Returns False if the state does not fit this index.
+        """
+        return False
+
+    def search(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        instrumentation.increment("vector_db.vectors_scanned", len(self.store))
+        scores = self.store.scores(query_vector)
+        rows = top_k_indices(scores, k)
+        return rows, scores[rows]
+
+    def search_many(self, query_vectors: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        scores = self.store.scores_many(query_vectors)
+        instrumentation.increment("vector_db.vectors_scanned", scores.size)
+        top = top_k_indices_2d(scores, k)
+        return [(rows, query_scores[rows]) for rows, query_scores in zip(top, scores)]
+
+
+def cluster_sums(vectors: np.ndarray, assignment: np.ndarray, n_clusters: int) -> np.ndarray:
+    """Per-cluster sums of ``vectors`` (a sort + reduceat, much faster than ``np.add.at``)."""
+    order = np.argsort(assignment, kind="stable")
+    counts = np.bincount(assignment, minlength=n_clusters)
+    sums = np.zeros((n_clusters, vectors.shape[1]), dtype=vectors.dtype)
+    nonempty = counts > 0
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    sums[nonempty] = np.add.reduceat(vectors[order], starts[nonempty], axis=0)
+    return sums
+
+
+def spherical_kmeans(
+    vectors: np.ndarray, n_clusters: int, n_iter: int = 20, seed: int = 0
+) -> np.ndarray:
+    """Clusters unit vectors by cosine similarity and returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = cluster_sums(vectors, assignment, n_clusters)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty clusters from random points so every list stays in use.
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.where(norms == 0, 1.0, norms)
+    return centroids.astype(vectors.dtype, copy=False)
+
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file approximate index with spherical k-means coarse quantisation.
+
+    Rows are bucketed by their nearest centroid; a query only scores the rows in
+    its ``nprobe`` closest buckets. Raising ``nprobe`` trades latency for recall.
+    Until ``min_train_size`` vectors have been inserted the index answers exactly.
+
+    :param nlist: Number of inverted lists (defaults to ~4 * sqrt(n) at training time)
+    :param nprobe: Number of lists scanned per query
+    :param min_train_size: Vectors required before the quantiser is trained
+    :param max_train_size: Cap on vectors sampled for k-means training
+    """
+
+    def __init__(
+        self,
+        nlist: Optional[int] = None,
+        nprobe: int = 8,
+        min_train_size: int = 10_000,
+        max_train_size: int = 100_000,
+        n_iter: int = 20,
+        seed: int = 0,
+    ):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.max_train_size = max_train_size
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []
+        self._list_arrays: List[Optional[np.ndarray]] = []
+        self._row_to_list = np.empty(0, dtype=np.int32)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self) -> None:
+        """(Re)trains the coarse quantiser on the store's current contents."""
+        vectors = self.store.matrix
+        n = len(vectors)
+        if n == 0:
+            return
+        nlist = min(self.nlist or max(1, int(4 * np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        sample = vectors
+        if n > self.max_train_size:
+            sample = vectors[np.sort(rng.choice(n, size=self.max_train_size, replace=False))]
+        sample = np.asarray(sample, dtype=np.float32)
+        self.centroids = spherical_kmeans(sample, nlist, n_iter=self.n_iter, seed=self.seed)
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = [None] * nlist
+        self._row_to_list = np.empty(0, dtype=np.int32)
+        self._assign(np.arange(n))
+
+    def _assign(self, rows: np.ndarray) -> None:
+        if len(rows) == 0:
+            return
+        if rows.max() >= len(self._row_to_list):
+            grown = np.full(max(int(rows.max()) + 1, 2 * len(self._row_to_list)), -1, dtype=np.int32)
+            grown[: len(self._row_to_list)] = self._row_to_list
+            self._row_to_list = grown
+        assignment = np.argmax(self.store.matrix[rows] @ self.centroids.T, axis=1)
+        for row, list_id in zip(rows.tolist(), assignment.tolist()):
+            self._lists[list_id].append(row)
+            self._list_arrays[list_id] = None
+        self._row_to_list[rows] = assignment
+
+    def add(self, rows: np.ndarray) -> None:
+        if self.is_trained:
+            self._assign(np.asarray(rows))
+        elif len(self.store) >= self.min_train_size:
+            self.train()
+
+    def update(self, row: int) -> None:
+        if not self.is_trained:
+            return
+        old = int(self._row_to_list[row])
+        self._lists[old].remove(row)
+        self._list_arrays[old] = None
+        self._assign(np.array([row]))
+
+    def memory_bytes(self) -> int:
+        centroids = 0 if self.centroids is None else self.centroids.nbytes
+        return centroids + 8 * sum(len(rows) for rows in self._lists)
+
+    def rebuild(self) -> None:
+        if self.is_trained or len(self.store) >= self.min_train_size:
+            self.train()
+
+    def _list_rows(self, list_id: int) -> np.ndarray:
+        rows = self._list_arrays[list_id]
+        if rows is None:
+            rows = np.array(self._lists[list_id], dtype=np.int64)
+            self._list_arrays[list_id] = rows
+        return rows
+
+    def _candidates(self, query: np.ndarray) -> np.ndarray:
+        probes = top_k_indices(self.centroids @ query, self.nprobe)
+        return np.concatenate([self._list_rows(list_id) for list_id in probes])
+
+    def search(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return super().search(query_vector, k)
+        query = self.store.normalise_query(query_vector)
+        candidates = self._candidates(query)
+        if self.store.deleted_count:
+            candidates = candidates[self.store.alive[candidates]]
+        instrumentation.increment("vector_db.vectors_scanned", len(candidates))
+        scores = self.store.matrix[candidates] @ query
+        best = top_k_indices(scores, k)
+        return candidates[best], scores[best]
+
+    def search_many(self, query_vectors: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not self.is_trained:
+            return super().search_many(query_vectors, k)
+        return [self.search(query_vector, k) for query_vector in np.atleast_2d(query_vectors)]
@@ -0,0 +1,498 @@
+import threading
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+import numpy as np
+from aimakerspace import instrumentation
+from aimakerspace.ann_index import ExactIndex
+from aimakerspace.metadata_index import MetadataStore, matches
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vector_store import MatrixStore, top_k_indices
+from aimakerspace.vectordatabase import VectorDatabase
+
+# Extra candidates fetched per search to absorb tombstones; widened only when they crowd out the top k.
+OVERFETCH = 32
+
+
+class _Staging:
+    """
+    Append-only segment the writer adds to between compactions.
+
+    Arrays grow by reallocation and rows are never written twice, so a view of
+    the first ``n`` rows taken for a snapshot stays valid while the writer appends.
+    """
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        self.capacity = capacity
+        self.count = 0
+        self.matrix = None if dim is None else np.zeros((capacity, dim), dtype=np.float32)
+        self.norms = np.zeros(capacity, dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+
+    def append(self, ids: List[int], texts: List[str], vectors: np.ndarray, metadatas: List) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.matrix is None:
+            self.matrix = np.zeros((self.capacity, vectors.shape[1]), dtype=np.float32)
+        elif vectors.shape[1] != self.matrix.shape[1]:
+            raise ValueError(f"Expected vectors of dimension {self.matrix.shape[1]}, got {vectors.shape[1]}")
+        end = self.count + len(ids)
+        if end > self.capacity:
+            capacity = max(end, 2 * self.capacity)
+            matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+            matrix[: self.count] = self.matrix[: self.count]
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[: self.count] = self.norms[: self.count]
+            record_ids = np.zeros(capacity, dtype=np.int64)
+            record_ids[: self.count] = self.ids[: self.count]
+            self.matrix, self.norms, self.ids, self.capacity = matrix, norms, record_ids, capacity
+        norms = np.linalg.norm(vectors, axis=1)
+        self.matrix[self.count : end] = vectors / np.where(norms == 0, 1.0, norms)[:, None]
+        self.norms[self.count : end] = norms
+        self.ids[self.count : end] = ids
+        self.texts.extend(texts)
+        # Stored as dicts, as the base's MetadataStore.get returns them.
+        self.metadatas.extend(metadata or {} for metadata in metadatas)
+        self.count = end
+
+
+def _live_top_k(
+    search: Callable[[int], Tuple[np.ndarray, np.ndarray]], ids: np.ndarray, k: int, deleted: FrozenSet[int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k ``(positions, scores)`` from ``search(fetch)`` (best first), skipping
+    tombstoned ids and -inf scores. Tombstones are dropped after searching, so
+    this fetches up to :data:`OVERFETCH` extra candidates and widens the search
+    only when they still leave fewer than k.
+    """
+    most = k + len(deleted)
+    fetch = min(most, k + max(k, OVERFETCH))
+    while True:
+        positions, scores = search(fetch)
+        keep = np.isfinite(scores)
+        if deleted:
+            keep &= np.fromiter(
+                (record_id not in deleted for record_id in ids[positions].tolist()), dtype=bool, count=len(positions)
+            )
+        if keep.sum() >= k or len(positions) < fetch or fetch >= most:
+            return positions[keep][:k], scores[keep][:k]
+        fetch = min(2 * fetch, most)
+
+
+class _Snapshot:
+    """Everything a reader needs, published by reference and never modified afterwards."""
+
+    __slots__ = ("base", "base_ids", "staging", "count", "deleted", "size")
+
+    def __init__(
+        self,
+        base: Optional[VectorDatabase],
+        base_ids: np.ndarray,
+        staging: _Staging,
+        deleted: FrozenSet[int],
+        size: int,
+    ):
+        self.base = base
+        self.base_ids = base_ids
+        self.staging = staging
+        self.count = staging.count
+        self.deleted = deleted
+        self.size = size
+
+
+class ConcurrentVectorDatabase:
+    """
+    Vector database for concurrent readers and writers, structured as a small LSM tree.
+
+    Records live in an immutable base :class:`VectorDatabase` plus an append-only
+    staging segment. Every write happens under a writer lock and ends by
+    publishing a new :class:`_Snapshot`; a reader picks up the current snapshot
+    with one attribute read and searches it without taking any lock, so searches
+    never wait for ingest and always see a consistent state.
+
+    Deletes and overwrites are tombstones until compaction merges the staging
+    segment into the base and drops them. Staged rows are appended into spare
+    capacity of the base arrays, past the rows any published base reads, so the
+    base is only copied when tombstones hit it or the capacity runs out.
+    Compaction runs outside the writer lock, so writers are only paused for the
+    final swap, and starts in a background thread once ``staging_limit`` records
+    or tombstones have accumulated (unless ``auto_compact`` is False).
+
+    :param embedding_model: Model used by :meth:`search_by_text` and :meth:`abuild_from_list`
+        (a default one is created on first use)
+    :param index_factory: Builds the search index of each new base
+    :param dtype: Storage dtype of the base, ``np.float32`` or ``np.float16``
+    :param staging_limit: Staged records or tombstones that trigger a compaction
+    :param auto_compact: Compact in the background when ``staging_limit`` is reached
+    """
+
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        index_factory: Callable[[], ExactIndex] = ExactIndex,
+        dtype=np.float32,
+        staging_limit: int = 10_000,
+        auto_compact: bool = True,
+    ):
+        self._embedding_model = embedding_model
+        self.index_factory = index_factory
+        self.dtype = dtype
+        self.staging_limit = staging_limit
+        self.auto_compact = auto_compact
+        self._write_lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        # Every live record, by id, including older records of keys that were added again.
+        self._id_to_key: Dict[int, str] = {}
+        # The latest live record of each key; as in VectorDatabase, older records of a key
+        # re-added with add_many stay live (shadowed) and take the key back when it is deleted.
+        self._key_to_id: Dict[str, int] = {}
+        self._shadowed_ids: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self.compactions = 0
+        # Row buffers behind the current base; rows past its length are free for the next merge.
+        self._base_matrix: Optional[np.ndarray] = None
+        self._base_norms: Optional[np.ndarray] = None
+        self._snapshot = _Snapshot(None, np.empty(0, dtype=np.int64), _Staging(), frozenset(), 0)
+
+    def __len__(self) -> int:
+        return self._snapshot.size
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    # Writes
+
+    def _publish(self, staging: _Staging, deleted: FrozenSet[int], size: int) -> None:
+        current = self._snapshot
+        self._snapshot = _Snapshot(current.base, current.base_ids, staging, deleted, size)
+        if self.auto_compact and (staging.count >= self.staging_limit or len(deleted) >= self.staging_limit):
+            self._compact_in_background()
+
+    def _append(
+        self,
+        texts: List[str],
+        vectors: np.ndarray,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]],
+        replace_keys: bool,
+    ) -> List[int]:
+        metadatas = list(metadatas or [None] * len(texts))
+        with self._write_lock:
+            snapshot = self._snapshot
+            if replace_keys:
+                # As in VectorDatabase.insert, an overwrite without metadata keeps the old metadata.
+                for position, text in enumerate(texts):
+                    previous = self._key_to_id.get(text)
+                    if previous is not None and metadatas[position] is None:
+                        metadatas[position] = self._metadata_of(snapshot, previous)
+            ids = list(range(self._next_id, self._next_id + len(texts)))
+            snapshot.staging.append(ids, list(texts), vectors, metadatas)
+            self._next_id += len(texts)
+            deleted = set()
+            for text, record_id in zip(texts, ids):
+                previous = self._key_to_id.get(text)
+                if previous is not None:
+                    if replace_keys:
+                        del self._id_to_key[previous]
+                        deleted.add(previous)
+                    else:
+                        self._shadowed_ids.setdefault(text, []).append(previous)
+                self._key_to_id[text] = record_id
+                self._id_to_key[record_id] = text
+            self._publish(snapshot.staging, snapshot.deleted | deleted, snapshot.size + len(ids) - len(deleted))
+        instrumentation.increment("concurrent_db.writes", len(ids))
+        return ids
+
+    @staticmethod
+    def _metadata_of(snapshot: _Snapshot, record_id: int) -> Dict[str, Any]:
+        # Ids only grow, so both the base ids and the staged ids are sorted.
+        staged = snapshot.staging.ids[: snapshot.count]
+        position = int(np.searchsorted(staged, record_id))
+        if position < len(staged) and staged[position] == record_id:
+            return snapshot.staging.metadatas[position]
+        row = int(np.searchsorted(snapshot.base_ids, record_id))
+        if snapshot.base is not None and row < len(snapshot.base_ids) and snapshot.base_ids[row] == record_id:
+            return snapshot.base.metadata.get(row)
+        return {}
+
+    def add_many(
+        self,
+        texts: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """
+        Adds a batch of new records, even if their texts already exist, and returns their ids.
+
+        As in :meth:`VectorDatabase.add_many`, a repeated text keeps its older records live:
+        the key names the newest one, and falls back to the previous one when that is deleted.
+        """
+        if len(texts) == 0:
+            return []
+        return self._append(list(texts), vectors, metadatas, replace_keys=False)
+
+    def add(self, text: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> int:
+        return self.add_many([text], [vector], [metadata])[0]
+
+    def insert_many(
+        self,
+        keys: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Upserts by key: a key that exists is tombstoned and re-added with the new vector."""
+        if len(keys) == 0:
+            return []
+        latest = {key: position for position, key in enumerate(keys)}
+        positions = sorted(latest.values())
+        vectors = np.asarray(vectors, dtype=np.float32)[positions]
+        if metadatas is not None:
+            metadatas = [metadatas[position] for position in positions]
+        return self._append([keys[position] for position in positions], vectors, metadatas, replace_keys=True)
+
+    def insert(self, key: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> int:
+        return self.insert_many([key], [vector], None if metadata is None else [metadata])[0]
+
+    def delete_ids(self, ids: List[int]) -> int:
+        """Tombstones records by id and returns how many were live."""
+        with self._write_lock:
+            snapshot = self._snapshot
+            live = {record_id for record_id in ids if record_id in self._id_to_key}
+            for record_id in live:
+                self._forget(record_id)
+            if live:
+                self._publish(snapshot.staging, snapshot.deleted | live, snapshot.size - len(live))
+        return len(live)
+
+    def _forget(self, record_id: int) -> None:
+        """Drops a deleted record from the key maps, handing its key back to the latest shadowed record."""
+        key = self._id_to_key.pop(record_id)
+        shadowed = self._shadowed_ids.get(key)
+        if self._key_to_id[key] == record_id:
+            if shadowed:
+                self._key_to_id[key] = shadowed.pop()
+            else:
+                del self._key_to_id[key]
+        else:
+            shadowed.remove(record_id)
+        if shadowed is not None and not shadowed:
+            del self._shadowed_ids[key]
+
+    def delete(self, key: str) -> bool:
+        """Removes the record ``key`` names; returns False if it was not present."""
+        with self._write_lock:
+            record_id = self._key_to_id.get(key)
+        return record_id is not None and self.delete_ids([record_id]) == 1
+
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> "ConcurrentVectorDatabase":
+        """Embeds outside any lock, then upserts the batch in one write."""
+        embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
+        self.insert_many(list_of_text, embeddings, metadatas)
+        return self
+
+    # Compaction
+
+    def _compact_in_background(self) -> None:
+        if self._compaction is not None and self._compaction.is_alive():
+            return
+        self._compaction = threading.Thread(target=self.compact, name="vector-db-compaction", daemon=True)
+        self._compaction.start()
+
+    def compact(self) -> None:
+        """Folds the staging segment and tombstones into a new base, then swaps it in."""
+        with self._compact_lock:
+            cut = self._snapshot
+            if cut.count == 0 and not cut.deleted:
+                return
+            with instrumentation.span("concurrent_db.compact"):
+                base, base_ids = self._merge_base(cut)
+            with self._write_lock:
+                current = self._snapshot
+                staging = _Staging(capacity=max(1024, current.count - cut.count))
+                if current.count > cut.count:
+                    # Records written while the base was being built carry over into the new staging segment.
+                    old = current.staging
+                    staging.append(
+                        old.ids[cut.count : current.count].tolist(),
+                        old.texts[cut.count : current.count],
+                        old.matrix[cut.count : current.count] * old.norms[cut.count : current.count, None],
+                        old.metadatas[cut.count : current.count],
+                    )
+                self._snapshot = _Snapshot(base, base_ids, staging, current.deleted - cut.deleted, current.size)
+                self.compactions += 1
+
+    def _merge_base(self, snapshot: _Snapshot) -> Tuple[Optional[VectorDatabase], np.ndarray]:
+        base, staging = snapshot.base, snapshot.staging
+        deleted_ids = np.fromiter(snapshot.deleted, dtype=np.int64, count=len(snapshot.deleted))
+        staged = np.flatnonzero(~np.isin(staging.ids[: snapshot.count], deleted_ids))
+        size = 0 if base is None else len(base.store)
+        kept = None
+        if size and len(deleted_ids):
+            dropped = np.isin(snapshot.base_ids, deleted_ids)
+            if dropped.any():
+                kept = np.flatnonzero(~dropped)
+        head = size if kept is None else len(kept)
+        count = head + len(staged)
+        if count == 0:
+            return None, np.empty(0, dtype=np.int64)
+
+        matrix, norms = self._base_matrix, self._base_norms
+        if kept is not None or matrix is None or count > len(matrix):
+            dim = base.store.dim if size else staging.matrix.shape[1]
+            capacity = max(1024, 2 * count)
+            matrix = np.empty((capacity, dim), dtype=self.dtype)
+            norms = np.empty(capacity, dtype=np.float32)
+            if head:
+                matrix[:head] = base.store.matrix if kept is None else base.store.matrix[kept]
+                norms[:head] = base.store.norms if kept is None else base.store.norms[kept]
+            self._base_matrix, self._base_norms = matrix, norms
+        matrix[head:count] = staging.matrix[staged]
+        norms[head:count] = staging.norms[staged]
+
+        ids = snapshot.base_ids if kept is None else snapshot.base_ids[kept]
+        ids = np.concatenate([ids, staging.ids[staged]])
+        if base is None:
+            texts = []
+        elif kept is None:
+            texts = base._texts
+        else:
+            texts = [base._texts[row] for row in kept.tolist()]
+        texts = texts + [staging.texts[position] for position in staged.tolist()]
+        staged_metadatas = [staging.metadatas[position] for position in staged.tolist()]
+        fields = dict.fromkeys(base.metadata.columns if base is not None else ())
+        for metadata in staged_metadatas:
+            fields.update(dict.fromkeys(metadata))
+        columns = {}
+        for field in fields:
+            column = None if base is None else base.metadata.columns.get(field)
+            if column is None:
+                column = [None] * head
+            elif kept is not None:
+                column = [column[row] for row in kept.tolist()]
+            columns[field] = column + [metadata.get(field) for metadata in staged_metadatas]
+        merged = VectorDatabase._from_rows(
+            MatrixStore.from_arrays(matrix[:count], norms[:count]),
+            texts,
+            ids.tolist(),
+            MetadataStore.from_columns(columns, count),
+            embedding_model=self._embedding_model,
+            index=self.index_factory(),
+            keyed=False,
+        )
+        return merged, ids
+
+    # Reads (lock-free)
+
+    def _search_snapshot(
+        self, snapshot: _Snapshot, query_vector: np.ndarray, k: int, filter: Optional[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        query = query / norm if norm else query
+        candidates = []
+        if snapshot.base is not None and len(snapshot.base):
+            base = snapshot.base
+            rows, scores = _live_top_k(
+                lambda fetch: base._search_rows(query, fetch, filter)[0], snapshot.base_ids, k, snapshot.deleted
+            )
+            for row, score in zip(rows.tolist(), scores.tolist()):
+                candidates.append((score, int(snapshot.base_ids[row]), base._text(row), base.metadata.get(row)))
+        if snapshot.count:
+            staging = snapshot.staging
+            all_scores = staging.matrix[: snapshot.count] @ query
+            if filter:
+                for position in range(snapshot.count):
+                    if not matches(staging.metadatas[position], filter):
+                        all_scores[position] = -np.inf
+
+            def top(fetch: int) -> Tuple[np.ndarray, np.ndarray]:
+                positions = top_k_indices(all_scores, fetch)
+                return positions, all_scores[positions]
+
+            positions, scores = _live_top_k(top, staging.ids, k, snapshot.deleted)
+            for position, score in zip(positions.tolist(), scores.tolist()):
+                candidates.append(
+                    (score, int(staging.ids[position]), staging.texts[position], staging.metadatas[position])
+                )
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [
+            {"id": record_id, "text": text, "score": score, "metadata": metadata}
+            for score, record_id, text, metadata in candidates[:k]
+        ]
+
+    def search_records(
+        self, query_vector: np.array, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Top-k dicts with id, text, score and metadata from one consistent snapshot."""
+        instrumentation.increment("concurrent_db.searches")
+        return self._search_snapshot(self._snapshot, query_vector, k, filter)
+
+    def search(
+        self, query_vector: np.array, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        """Cosine top-k (text, score) pairs; never blocks on writers."""
+        return [(record["text"], record["score"]) for record in self.search_records(query_vector, k, filter)]
+
+    def search_many(
+        self, query_vectors: np.array, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """:meth:`search` for each query, all against the same snapshot."""
+        snapshot = self._snapshot
+        return [
+            [(record["text"], record["score"]) for record in self._search_snapshot(snapshot, query, k, filter)]
+            for query in np.atleast_2d(np.asarray(query_vectors))
+        ]
+
+    def unit_vectors(self, record_ids: List[int]) -> np.ndarray:
+        """
+        Stored (normalised) vectors of ``record_ids``, one float32 row each, from the
+        current snapshot. Records deleted since a search returned them get a zero row.
+        """
+        snapshot = self._snapshot
+        base, staging = snapshot.base, snapshot.staging
+        if staging.matrix is not None:
+            dim = staging.matrix.shape[1]
+        else:
+            dim = base.store.dim if base is not None and base.store.dim else 0
+        staged = {record_id: position for position, record_id in enumerate(staging.ids[: snapshot.count].tolist())}
+        vectors = np.zeros((len(record_ids), dim), dtype=np.float32)
+        for i, record_id in enumerate(record_ids):
+            if record_id in snapshot.deleted:
+                continue
+            if record_id in staged:
+                vectors[i] = staging.matrix[staged[record_id]]
+            elif base is not None and record_id in base._id_to_row:
+                vectors[i] = base.store.matrix[base._id_to_row[record_id]]
+        return vectors
+
+    def search_by_text(
+        self,
+        query_text: str,
+        k: int,
+        return_as_text: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Tuple[str, float]]:
+        query_vector = self.embedding_model.get_embedding(query_text)
+        results = self.search(query_vector, k, filter=filter)
+        return [result[0] for result in results] if return_as_text else results
+
+    def stats(self) -> Dict[str, int]:
+        snapshot = self._snapshot
+        return {
+            "records": snapshot.size,
+            "base_rows": 0 if snapshot.base is None else len(snapshot.base),
+            "staged": snapshot.count,
+            "tombstones": len(snapshot.deleted),
+            "compactions": self.compactions,
+        }
@@ -0,0 +1,243 @@
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from aimakerspace.text_utils import default_token_counter
+
+
+class _Span:
+    """A run of chunks from one document, merged into a single piece of text."""
+
+    __slots__ = ("lo", "hi", "text", "tokens", "records")
+
+    def __init__(self, lo: int, hi: int, text: str, tokens: int, records: List[Dict[str, Any]]):
+        self.lo = lo
+        self.hi = hi
+        self.text = text
+        self.tokens = tokens
+        self.records = records
+
+
+class ContextPacker:
+    """
+    Turns scored search results into a prompt context that fits a token budget.
+
+    Candidates are taken in maximal marginal relevance (MMR) order when their
+    stored vectors are given, otherwise in score order. A candidate is dropped
+    if it is a near-duplicate of one already taken (cosine similarity at or
+    above ``duplicate_threshold``, or identical text), or if it does not fit the
+    remaining budget. Taken chunks that overlap or touch in the same document are
+    merged, so the overlap repeated by a splitter is only paid for once. Positions
+    come from metadata as written by :class:`~aimakerspace.vectordatabase.VectorDatabase`:
+    ``source`` plus ``start_char`` (a character offset), ``start_byte`` (a UTF-8
+    byte offset into a ``MappedCorpus`` document; ``start`` is read the same way)
+    or ``chunk`` (an index). Overlap is cut at those offsets and only after checking
+    that the shared text agrees; chunks known only by index are joined without
+    removing anything, since an index says nothing about how much text they share.
+
+    :param max_tokens: Token budget of the packed context
+    :param mmr_lambda: Relevance weight in MMR (1.0 ignores diversity)
+    :param duplicate_threshold: Similarity at which a candidate counts as a duplicate
+    :param merge_adjacent: Merge overlapping or adjacent chunks of the same document
+    :param separator: Placed between packed chunks
+    :param token_counter: Callable counting tokens (tiktoken when installed)
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 2000,
+        mmr_lambda: float = 0.7,
+        duplicate_threshold: float = 0.95,
+        merge_adjacent: bool = True,
+        separator: str = "\n\n",
+        token_counter: Optional[Callable[[str], int]] = None,
+    ):
+        self.max_tokens = max_tokens
+        self.mmr_lambda = mmr_lambda
+        self.duplicate_threshold = duplicate_threshold
+        self.merge_adjacent = merge_adjacent
+        self.separator = separator
+        self.token_counter = token_counter or default_token_counter()
+        self._separator_tokens = self.token_counter(separator) if separator else 0
+
+    @staticmethod
+    def _position(record: Dict[str, Any]) -> Optional[Tuple[Any, str, int, int]]:
+        """``(source, unit, lo, hi)`` of a record inside its document, if known."""
+        metadata = record.get("metadata") or {}
+        source = metadata.get("source")
+        if source is None:
+            return None
+        if metadata.get("start_char") is not None:
+            start = int(metadata["start_char"])
+            return source, "start_char", start, start + len(record["text"])
+        start = metadata.get("start_byte", metadata.get("start"))
+        if start is not None:
+            start = int(start)
+            return source, "start_byte", start, start + len(record["text"].encode("utf-8"))
+        if metadata.get("chunk") is not None:
+            chunk = int(metadata["chunk"])
+            return source, "chunk", chunk, chunk + 1
+        return None
+
+    @staticmethod
+    def _tail(unit: str, text: str, span: _Span, hi: int) -> Optional[str]:
+        """The text of ``span`` past offset ``hi``, or None if its overlap with ``text`` does not line up."""
+        if unit == "chunk":
+            return span.text
+        cut = hi - span.lo
+        if unit == "start_char":
+            return span.text[cut:] if text.endswith(span.text[:cut]) else None
+        data = span.text.encode("utf-8")
+        # A cut on a UTF-8 continuation byte (0b10xxxxxx) would split a character.
+        if cut < len(data) and data[cut] & 0xC0 == 0x80:
+            return None
+        if not text.encode("utf-8").endswith(data[:cut]):
+            return None
+        return data[cut:].decode("utf-8")
+
+    def _merge(
+        self, unit: str, spans: List[_Span], record: Dict[str, Any], lo: int, hi: int
+    ) -> Optional[_Span]:
+        """
+        Folds ``record`` and every span it overlaps or touches into one span, or
+        returns None if their offsets disagree with their text.
+        """
+        pieces = sorted(spans + [_Span(lo, hi, record["text"], 0, [record])], key=lambda span: span.lo)
+        merged = pieces[0]
+        text, records = merged.text, list(merged.records)
+        lo, hi = merged.lo, merged.hi
+        for span in pieces[1:]:
+            if span.hi <= hi:
+                # Wholly inside what is already there.
+                records.extend(span.records)
+                continue
+            tail = self._tail(unit, text, span, hi)
+            if tail is None:
+                return None
+            text += tail
+            hi = span.hi
+            records.extend(span.records)
+        return _Span(lo, hi, text, self.token_counter(text), records)
+
+    def select(
+        self, records: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+        """
+        Picks, merges and budgets ``records``.
+
+        :param records: Dicts with ``text`` and ``score`` (plus ``id`` and
+            ``metadata``), as returned by ``VectorDatabase.search_records``
+        :param vectors: Optional stored vectors, one row per record, used for MMR
+            and near-duplicate detection
+        :return: Packed chunks (dicts with ``ids``, ``text``, ``score``,
+            ``metadata``), best first, and stats including ``tokens_saved``
+        """
+        n = len(records)
+        scores = np.array([record["score"] for record in records], dtype=np.float32)
+        similarities = None
+        if vectors is not None and n:
+            vectors = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+            similarities = vectors @ vectors.T
+        token_counts = [self.token_counter(record["text"]) for record in records]
+        stats = {
+            "candidates": n,
+            "selected": 0,
+            "merged": 0,
+            "dropped_duplicates": 0,
+            "dropped_budget": 0,
+            "input_tokens": sum(token_counts) + self._separator_tokens * max(n - 1, 0),
+        }
+
+        remaining = np.ones(n, dtype=bool)
+        max_similarity = np.full(n, -np.inf, dtype=np.float32)
+        seen_texts = set()
+        spans: Dict[Any, List[_Span]] = {}
+        loose: List[_Span] = []
+        used = 0
+        while remaining.any():
+            if similarities is not None:
+                redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+                mmr = self.mmr_lambda * scores - (1 - self.mmr_lambda) * redundancy
+                i = int(np.argmax(np.where(remaining, mmr, -np.inf)))
+            else:
+                i = int(np.flatnonzero(remaining)[np.argmax(scores[remaining])])
+            remaining[i] = False
+            record = records[i]
+
+            text_key = " ".join(record["text"].split())
+            if text_key in seen_texts or (
+                similarities is not None and max_similarity[i] >= self.duplicate_threshold
+            ):
+                stats["dropped_duplicates"] += 1
+                continue
+
+            position = self._position(record) if self.merge_adjacent else None
+            merged = None
+            if position is not None:
+                source, unit, lo, hi = position
+                document = spans.setdefault((source, unit), [])
+                touching = [span for span in document if span.lo <= hi and lo <= span.hi]
+                merged = self._merge(unit, touching, record, lo, hi)
+            if merged is None:
+                cost = token_counts[i] + (self._separator_tokens if used else 0)
+                if used + cost > self.max_tokens:
+                    stats["dropped_budget"] += 1
+                    continue
+                loose.append(_Span(0, 0, record["text"], token_counts[i], [record]))
+            else:
+                cost = merged.tokens - sum(span.tokens for span in touching)
+                if not touching and used:
+                    cost += self._separator_tokens
+                if used + cost > self.max_tokens:
+                    stats["dropped_budget"] += 1
+                    continue
+                if touching:
+                    stats["merged"] += 1
+                    spans[(source, unit)] = [span for span in document if span not in touching] + [merged]
+                else:
+                    document.append(merged)
+
+            used += cost
+            stats["selected"] += 1
+            seen_texts.add(text_key)
+            if similarities is not None:
+                np.maximum(max_similarity, similarities[i], out=max_similarity)
+
+        packed = loose + [span for document in spans.values() for span in document]
+        chunks = [
+            {
+                "ids": [record.get("id") for record in span.records],
+                "text": span.text,
+                "score": max(record["score"] for record in span.records),
+                "metadata": span.records[0].get("metadata") or {},
+            }
+            for span in packed
+        ]
+        chunks.sort(key=lambda chunk: chunk["score"], reverse=True)
+        stats["output_tokens"] = used
+        stats["tokens_saved"] = stats["input_tokens"] - used
+        return chunks, stats
+
+    def pack(
+        self, records: List[Dict[str, Any]], vectors: Optional[np.ndarray] = None
+    ) -> Tuple[str, Dict[str, int]]:
+        """Like :meth:`select`, but returns the packed chunks joined into one context string."""
+        chunks, stats = self.select(records, vectors)
+        return self.separator.join(chunk["text"] for chunk in chunks), stats
+
+
+if __name__ == "__main__":
+    text = "Alpha beta gamma. " * 40
+    records = [
+        {
+            "id": i,
+            "text": text[start : start + 200],
+            "score": 0.9 - 0.01 * i,
+            "metadata": {"source": "a.txt", "start_char": start},
+        }
+        for i, start in enumerate(range(0, 600, 150))
+    ]
+    records.append({"id": 9, "text": "Unrelated note about fruit.", "score": 0.5, "metadata": {}})
+    context, stats = ContextPacker(max_tokens=120).pack(records)
+    print(context)
+    print(stats)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader
+from aimakerspace.vectordatabase import VectorDatabase
+
+_DONE = object()
+
+
+def iter_chunk_batches(
+    loader: TextFileLoader,
+    splitter: CharacterTextSplitter,
+    batch_size: int,
+    counters: Optional[Dict[str, int]] = None,
+) -> Iterator[List[str]]:
+    """Lazily reads the loader's files and yields chunks in micro-batches of ``batch_size``."""
+    batch: List[str] = []
+    for path in loader.iter_paths():
+        with open(path, "r", encoding=loader.encoding) as f:
+            for chunk in splitter.iter_split_stream(f):
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if counters is not None:
+            counters["files"] += 1
+    if batch:
+        yield batch
+
+
+async def astream_ingest(
+    loader: TextFileLoader,
+    splitter: CharacterTextSplitter,
+    vector_db: VectorDatabase,
+    batch_size: int = 256,
+    queue_depth: int = 4,
+    concurrency: int = 2,
+    progress_callback: Optional[Callable[[Dict[str, float]], None]] = None,
+) -> Dict[str, float]:
+    """
+    Streams files from ``loader`` through ``splitter`` into ``vector_db``.
+
+    Files are read and split on a worker thread while earlier micro-batches are
+    embedded and inserted, so reading, embedding and inserting overlap. At most
+    ``queue_depth + concurrency`` batches of chunks are held in memory at once.
+
+    :param batch_size: Chunks per embedding request
+    :param queue_depth: Batches buffered between the reader and the embedders
+    :param concurrency: Number of batches embedded concurrently
+    :param progress_callback: Called with the running stats after every batch
+    :return: Final stats (files, chunks, batches, seconds, chunks_per_sec)
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_depth)
+    counters = {"files": 0, "chunks": 0, "batches": 0}
+    start = time.perf_counter()
+
+    def stats() -> Dict[str, float]:
+        seconds = time.perf_counter() - start
+        return {
+            **counters,
+            "seconds": seconds,
+            "chunks_per_sec": counters["chunks"] / seconds if seconds > 0 else 0.0,
+        }
+
+    stopped = threading.Event()
+
+    def produce() -> None:
+        try:
+            for batch in iter_chunk_batches(loader, splitter, batch_size, counters):
+                if stopped.is_set():
+                    return
+                # Blocks the reader thread while the queue is full: this is the memory bound.
+                asyncio.run_coroutine_threadsafe(queue.put(batch), loop).result()
+        finally:
+            if not stopped.is_set():
+                for _ in range(concurrency):
+                    asyncio.run_coroutine_threadsafe(queue.put(_DONE), loop).result()
+
+    async def consume() -> None:
+        while True:
+            batch = await queue.get()
+            if batch is _DONE:
+                return
+            embeddings = await vector_db.embedding_model.async_get_embeddings(batch)
+            vector_db.insert_many(batch, embeddings)
+            counters["chunks"] += len(batch)
+            counters["batches"] += 1
+            if progress_callback is not None:
+                progress_callback(stats())
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    consumers = [asyncio.create_task(consume()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(producer, *consumers)
+    except BaseException:
+        stopped.set()
+        for consumer in consumers:
+            consumer.cancel()
+        # Drain so a reader blocked on a full queue can notice the stop and exit.
+        while not producer.done():
+            while not queue.empty():
+                queue.get_nowait()
+            await asyncio.sleep(0.01)
+        raise
+    return stats()
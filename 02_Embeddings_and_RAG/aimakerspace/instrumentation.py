@@ -0,0 +1,252 @@
+"""
+Lightweight, process-wide instrumentation for aimakerspace.
+
+Disabled by default: every hook is then a global flag check, and :func:`span`
+returns a shared no-op context manager. Once :func:`enable` is called, spans
+record their duration into a histogram, counters accumulate, and every event is
+passed to the registered callbacks.
+
+    from aimakerspace import instrumentation
+    instrumentation.enable()
+    ...
+    print(instrumentation.metrics.snapshot())
+    print(instrumentation.metrics.to_prometheus())
+
+Names are dotted (``embedding.api_calls``, ``vector_db.search``). Spans are
+histograms of seconds; :func:`increment` and :func:`observe` feed counters and
+histograms directly.
+"""
+import functools
+import inspect
+import math
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+_enabled = False
+_callbacks: List[Callable[[Dict[str, Any]], None]] = []
+
+
+class Histogram:
+    """Count, sum, min and max of every observation plus a window of recent ones for quantiles."""
+
+    def __init__(self, window: int = 4096):
+        self.window = window
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self._recent: List[float] = []
+
+    def observe(self, value: float) -> None:
+        if self.count < self.window:
+            self._recent.append(value)
+        else:
+            self._recent[self.count % self.window] = value
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self._recent)
+
+        def at(q: float) -> float:
+            return ordered[min(int(q * len(ordered)), len(ordered) - 1)] if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+            "p50": at(0.50),
+            "p95": at(0.95),
+            "p99": at(0.99),
+        }
+
+
+class Metrics:
+    """Thread-safe registry of named counters and histograms."""
+
+    def __init__(self, window: int = 4096):
+        self.window = window
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(self.window)
+            histogram.observe(value)
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Counters and histogram summaries (count, sum, mean, min, max, p50, p95, p99)."""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.summary() for name, histogram in self.histograms.items()},
+            }
+
+    def to_prometheus(self, prefix: str = "aimakerspace") -> str:
+        """Prometheus text exposition: counters as ``*_total``, histograms as summaries."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = _metric_name(prefix, name) + "_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {_sample_value(value)}"]
+        for name, summary in sorted(snapshot["histograms"].items()):
+            metric = _metric_name(prefix, name)
+            lines.append(f"# TYPE {metric} summary")
+            for q in ("0.5", "0.95", "0.99"):
+                key = "p" + str(round(float(q) * 100))
+                lines.append(f'{metric}{{quantile="{q}"}} {_sample_value(summary[key])}')
+            lines += [f"{metric}_sum {_sample_value(summary['sum'])}", f"{metric}_count {summary['count']}"]
+        return "\n".join(lines) + "\n"
+
+
+def _sample_value(value: float) -> str:
+    """Exact sample text: integral values as integers, others with every significant digit."""
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _metric_name(prefix: str, name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{name}" if prefix else name)
+
+
+metrics = Metrics()
+
+
+def enable(callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> None:
+    """Turns instrumentation on, optionally registering ``callback`` for every event."""
+    global _enabled
+    if callback is not None:
+        add_callback(callback)
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def add_callback(callback: Callable[[Dict[str, Any]], None]) -> None:
+    """Registers ``callback``; it receives ``{"type", "name", "value"}`` dicts as events happen."""
+    _callbacks.append(callback)
+
+
+def remove_callback(callback: Callable[[Dict[str, Any]], None]) -> None:
+    _callbacks.remove(callback)
+
+
+def _emit(kind: str, name: str, value: float) -> None:
+    for callback in _callbacks:
+        callback({"type": kind, "name": name, "value": value})
+
+
+def increment(name: str, value: float = 1) -> None:
+    """Adds ``value`` to counter ``name``."""
+    if _enabled:
+        metrics.increment(name, value)
+        if _callbacks:
+            _emit("counter", name, value)
+
+
+def observe(name: str, value: float) -> None:
+    """Records ``value`` in histogram ``name``."""
+    if _enabled:
+        metrics.observe(name, value)
+        if _callbacks:
+            _emit("observation", name, value)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """Times a ``with`` block into histogram ``name`` (seconds); failures also count ``name.errors``."""
+
+    __slots__ = ("name", "start", "seconds")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = 0.0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self.start
+        metrics.observe(self.name, self.seconds)
+        if exc_type is not None:
+            metrics.increment(self.name + ".errors")
+        if _callbacks:
+            _emit("span", self.name, self.seconds)
+        return False
+
+
+def span(name: str):
+    """Context manager timing a stage; a shared no-op while instrumentation is disabled."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name)
+
+
+def timed(name: str) -> Callable:
+    """Decorator wrapping a sync or async function in :func:`span`."""
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
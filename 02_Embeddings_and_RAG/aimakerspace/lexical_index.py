@@ -0,0 +1,237 @@
+import math
+import re
+from array import array
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from aimakerspace import instrumentation
+from aimakerspace.vector_store import top_k_indices
+
+# Words, plus compounds such as error codes and versions ("ERR-404", "v1.2.3").
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-.:/]\w+)*")
+_PART_PATTERN = re.compile(r"\w+")
+_MAX_TF = 65535
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; a compound like ``ERR-404`` yields ``err-404``, ``err`` and ``404``."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum() and "_" not in token:
+            tokens.extend(_PART_PATTERN.findall(token))
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index over the rows of a :class:`~aimakerspace.vectordatabase.VectorDatabase`.
+
+    Each term keeps its postings as two packed arrays, row ids (``uint32``) and
+    term frequencies (``uint16``), so a posting costs 6 bytes. Per-term impact
+    scores are computed when a term is first queried after a change and cached
+    until the next one.
+
+    Top-k retrieval is MaxScore style: query terms are visited from the highest
+    score bound down, and once the bound of the remaining terms cannot lift an
+    unseen row above the current k-th score, those (long, common-term) lists are
+    only probed for the surviving candidates instead of being scanned. Results
+    are identical to exhaustive scoring.
+
+    :param k1: Term-frequency saturation
+    :param b: Document-length normalisation
+    :param tokenizer: Text -> tokens, used for both documents and queries
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, tokenizer: Callable[[str], List[str]] = tokenize):
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._rows = 0
+        self._count = 0
+        self._total_length = 0
+        self._impacts: Dict[str, Tuple[np.ndarray, np.ndarray, float]] = {}
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self, size: int) -> None:
+        if size <= len(self._lengths):
+            return
+        capacity = max(size, 2 * len(self._lengths), 1024)
+        lengths = np.zeros(capacity, dtype=np.uint32)
+        lengths[: self._rows] = self._lengths[: self._rows]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._rows] = self._alive[: self._rows]
+        self._lengths, self._alive = lengths, alive
+
+    def add(self, rows: Sequence[int], texts: Sequence[str]) -> None:
+        """Indexes ``texts`` under ``rows``, which must be new and ascending."""
+        rows = [int(row) for row in rows]
+        if not rows:
+            return
+        self._grow(rows[-1] + 1)
+        for row, text in zip(rows, texts):
+            counts: Dict[str, int] = {}
+            for token in self.tokenizer(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = (array("I"), array("H"))
+                postings[0].append(row)
+                postings[1].append(min(tf, _MAX_TF))
+            length = sum(counts.values())
+            self._lengths[row] = length
+            self._alive[row] = True
+            self._total_length += length
+            self._count += 1
+        self._rows = max(self._rows, rows[-1] + 1)
+        self._impacts.clear()
+
+    def delete(self, row: int) -> None:
+        """Tombstones ``row``; its postings are dropped at the next :meth:`compact`."""
+        if row < self._rows and self._alive[row]:
+            self._alive[row] = False
+            self._count -= 1
+            self._total_length -= int(self._lengths[row])
+            self._impacts.clear()
+
+    def compact(self, alive: np.ndarray) -> None:
+        """Keeps only rows where ``alive`` is True and renumbers them, matching :meth:`MatrixStore.compact`."""
+        alive = np.asarray(alive, dtype=bool)
+        new_row = np.cumsum(alive, dtype=np.int64) - 1
+        for token in list(self._postings):
+            rows = np.frombuffer(self._postings[token][0], dtype=np.uint32)
+            tfs = np.frombuffer(self._postings[token][1], dtype=np.uint16)
+            keep = alive[rows] & self._alive[rows]
+            if not keep.any():
+                del self._postings[token]
+                continue
+            self._postings[token] = (
+                array("I", new_row[rows[keep]].astype(np.uint32).tobytes()),
+                array("H", tfs[keep].tobytes()),
+            )
+        kept = np.flatnonzero(alive)
+        self._lengths = self._lengths[kept].copy()
+        self._alive = self._alive[kept].copy()
+        self._rows = len(kept)
+        self._impacts.clear()
+
+    def document_frequency(self, token: str) -> int:
+        """Postings held for ``token``, including rows deleted since the last compaction."""
+        postings = self._postings.get(token)
+        return 0 if postings is None else len(postings[0])
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the postings, per-row columns and cached impacts."""
+        postings = sum(
+            rows.itemsize * len(rows) + tfs.itemsize * len(tfs) for rows, tfs in self._postings.values()
+        )
+        impacts = sum(rows.nbytes + scores.nbytes for rows, scores, _ in self._impacts.values())
+        return postings + self._lengths.nbytes + self._alive.nbytes + impacts
+
+    def _term_impacts(self, token: str) -> Optional[Tuple[np.ndarray, np.ndarray, float]]:
+        """Live rows (ascending), their BM25 contribution for ``token``, and its maximum."""
+        cached = self._impacts.get(token)
+        if cached is not None:
+            return cached
+        postings = self._postings.get(token)
+        if postings is None:
+            return None
+        rows = np.frombuffer(postings[0], dtype=np.uint32)
+        tfs = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+        live = self._alive[rows]
+        if not live.all():
+            rows, tfs = rows[live], tfs[live]
+        if len(rows) == 0:
+            return None
+        average = self._total_length / max(self._count, 1)
+        idf = math.log(1.0 + (self._count - len(rows) + 0.5) / (len(rows) + 0.5))
+        norm = self.k1 * (1.0 - self.b + self.b * self._lengths[rows] / max(average, 1e-9))
+        scores = (idf * tfs * (self.k1 + 1.0) / (tfs + norm)).astype(np.float32)
+        cached = self._impacts[token] = (rows.astype(np.int64), scores, float(scores.max()))
+        return cached
+
+    def search(
+        self, query_text: str, k: int, allowed: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-``k`` (rows, scores) by BM25, best first.
+
+        :param allowed: Optional boolean mask over rows; other rows are never returned
+        """
+        instrumentation.increment("lexical.queries")
+        with instrumentation.span("lexical.search"):
+            return self._search(query_text, k, allowed)
+
+    def _search(
+        self, query_text: str, k: int, allowed: Optional[np.ndarray]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        query_counts: Dict[str, int] = {}
+        for token in self.tokenizer(query_text):
+            query_counts[token] = query_counts.get(token, 0) + 1
+        terms = []
+        for token, count in query_counts.items():
+            impacts = self._term_impacts(token)
+            if impacts is not None:
+                rows, scores, bound = impacts
+                terms.append((rows, scores * count if count > 1 else scores, bound * count))
+        empty = np.empty(0, dtype=np.int64)
+        if not terms or k <= 0:
+            return empty, empty.astype(np.float32)
+
+        terms.sort(key=lambda term: term[2], reverse=True)
+        remaining = np.cumsum([term[2] for term in terms][::-1])[::-1]
+        candidates, totals = empty, np.empty(0, dtype=np.float32)
+        threshold = -np.inf
+        scanned = probed = 0
+        for (rows, scores, _), bound in zip(terms, remaining):
+            if len(candidates) >= k and bound <= threshold:
+                # No row outside the candidates can reach the top k any more: probe, don't scan.
+                survivors = totals + bound > threshold
+                candidates, totals = candidates[survivors], totals[survivors]
+                positions = np.searchsorted(rows, candidates)
+                found = positions < len(rows)
+                found[found] = rows[positions[found]] == candidates[found]
+                totals[found] += scores[positions[found]]
+                probed += len(candidates)
+            else:
+                if allowed is not None:
+                    keep = allowed[rows]
+                    rows, scores = rows[keep], scores[keep]
+                scanned += len(rows)
+                merged = np.concatenate([candidates, rows])
+                candidates, inverse = np.unique(merged, return_inverse=True)
+                totals = np.bincount(
+                    inverse, weights=np.concatenate([totals, scores]), minlength=len(candidates)
+                ).astype(np.float32)
+            if len(candidates) >= k:
+                threshold = float(np.partition(totals, len(totals) - k)[len(totals) - k])
+        instrumentation.increment("lexical.postings_scanned", scanned)
+        instrumentation.increment("lexical.postings_probed", probed)
+        best = top_k_indices(totals, k)
+        return candidates[best], totals[best]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Hashable]], k: int = 60, weights: Optional[Sequence[float]] = None
+) -> List[Tuple[Hashable, float]]:
+    """
+    Fuses ranked lists by reciprocal rank: each item scores ``sum(weight / (k + rank))``.
+
+    :param rankings: Lists of item ids, best first
+    :param k: Rank damping constant (60 in the original paper)
+    :param weights: Optional per-list weights
+    :return: (item, fused score) pairs, best first
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[Hashable, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + weight / (k + rank)
+    return sorted(fused.items(), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,172 @@
+import numpy as np
+from typing import Any, Dict, Hashable, List, Optional, Set
+
+RANGE_OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+}
+
+
+def matches(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """Whether one record's ``metadata`` satisfies ``filter``, with :class:`MetadataStore` semantics."""
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        if value is None or not isinstance(value, Hashable):
+            return False
+        if isinstance(condition, dict):
+            for operator, bound in condition.items():
+                if operator == "$eq":
+                    if value != bound:
+                        return False
+                elif operator == "$in":
+                    if value not in bound:
+                        return False
+                elif operator in RANGE_OPERATORS:
+                    try:
+                        if not RANGE_OPERATORS[operator](value, bound):
+                            return False
+                    except TypeError:
+                        return False
+                else:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+        elif isinstance(condition, (list, tuple, set, frozenset)):
+            if value not in condition:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+class MetadataStore:
+    """
+    Columnar metadata for the rows of a :class:`~aimakerspace.vector_store.MatrixStore`.
+
+    Each field is one list holding a value per row (``None`` where absent). A hash
+    index (value -> rows) is built for a field the first time it is filtered on and
+    kept up to date afterwards, so a filter resolves to candidate rows without
+    touching the rows that do not match.
+
+    Filters are dicts of field conditions, all of which must hold:
+
+    - ``{"source": "a.txt"}`` equality
+    - ``{"tenant": ["t1", "t2"]}`` membership (also ``{"$in": [...]}``)
+    - ``{"year": {"$gte": 2020, "$lt": 2024}}`` ranges over the field's distinct values
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, List[Any]] = {}
+        self._size = 0
+        self._indexes: Dict[str, Dict[Hashable, Set[int]]] = {}
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]], size: int) -> "MetadataStore":
+        """Wraps per-field columns of ``size`` values each (``None`` where absent) without copying them."""
+        store = cls()
+        store.columns = columns
+        store._size = size
+        return store
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        start = self._size
+        self._size += len(metadatas)
+        for column in self.columns.values():
+            column.extend([None] * len(metadatas))
+        for offset, metadata in enumerate(metadatas):
+            self._write(start + offset, metadata or {})
+
+    def set(self, row: int, metadata: Optional[Dict[str, Any]]) -> None:
+        """Replaces the metadata of ``row``."""
+        self._unindex(row)
+        for column in self.columns.values():
+            column[row] = None
+        self._write(row, metadata or {})
+
+    def get(self, row: int) -> Dict[str, Any]:
+        return {field: column[row] for field, column in self.columns.items() if column[row] is not None}
+
+    def delete(self, row: int) -> None:
+        """Drops ``row`` from the indexes; its column values stay until :meth:`compact`."""
+        self._unindex(row)
+
+    def compact(self, alive: np.ndarray) -> None:
+        """Keeps only rows where ``alive`` is True, matching :meth:`MatrixStore.compact`."""
+        keep = np.flatnonzero(alive).tolist()
+        self.columns = {field: [column[row] for row in keep] for field, column in self.columns.items()}
+        self._size = len(keep)
+        for field in list(self._indexes):
+            self._build_index(field)
+
+    def _write(self, row: int, metadata: Dict[str, Any]) -> None:
+        for field, value in metadata.items():
+            column = self.columns.get(field)
+            if column is None:
+                column = self.columns[field] = [None] * self._size
+            column[row] = value
+            index = self._indexes.get(field)
+            if index is not None and value is not None and isinstance(value, Hashable):
+                index.setdefault(value, set()).add(row)
+
+    def _unindex(self, row: int) -> None:
+        for field, index in self._indexes.items():
+            value = self.columns[field][row]
+            if value is not None and isinstance(value, Hashable):
+                rows = index.get(value)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del index[value]
+
+    def _build_index(self, field: str) -> Dict[Hashable, Set[int]]:
+        index: Dict[Hashable, Set[int]] = {}
+        for row, value in enumerate(self.columns.get(field, [])):
+            if value is not None and isinstance(value, Hashable):
+                index.setdefault(value, set()).add(row)
+        self._indexes[field] = index
+        return index
+
+    def _match_field(self, field: str, condition: Any) -> Set[int]:
+        index = self._indexes.get(field)
+        if index is None:
+            index = self._build_index(field)
+        if isinstance(condition, dict):
+            matched: Optional[Set[int]] = None
+            for operator, bound in condition.items():
+                if operator == "$eq":
+                    rows = set(index.get(bound, ()))
+                elif operator == "$in":
+                    rows = set().union(*(index.get(value, ()) for value in bound))
+                elif operator in RANGE_OPERATORS:
+                    compare = RANGE_OPERATORS[operator]
+                    rows = set()
+                    for value, value_rows in index.items():
+                        try:
+                            if compare(value, bound):
+                                rows |= value_rows
+                        except TypeError:
+                            continue
+                else:
+                    raise ValueError(f"Unsupported filter operator: {operator}")
+                matched = rows if matched is None else matched & rows
+            return matched or set()
+        if isinstance(condition, (list, tuple, set, frozenset)):
+            return set().union(*(index.get(value, ()) for value in condition))
+        return set(index.get(condition, ()))
+
+    def filter_rows(self, filter: Dict[str, Any], alive: Optional[np.ndarray] = None) -> np.ndarray:
+        """Resolves ``filter`` to the sorted array of matching live rows."""
+        matched: Optional[Set[int]] = None
+        for field, condition in filter.items():
+            rows = self._match_field(field, condition)
+            matched = rows if matched is None else matched & rows
+            if not matched:
+                return np.empty(0, dtype=np.int64)
+        rows = np.fromiter(matched or (), dtype=np.int64)
+        rows.sort()
+        if alive is not None and len(rows):
+            rows = rows[alive[rows]]
+        return rows
@@ -1,27 +1,282 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+from aimakerspace import instrumentation
+from aimakerspace.openai_utils.completion_cache import CompletionCache, completion_cache_key
+from aimakerspace.openai_utils.environment import load_api_key, running_loop
+import asyncio
+import threading
+import time
 
-load_dotenv()
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from openai.types.chat import ChatCompletion
+
+_shared_client: Optional["OpenAI"] = None
+
+
+def get_shared_client() -> "OpenAI":
+    """Process-wide sync client, so every call reuses one HTTP connection pool."""
+    global _shared_client
+    if _shared_client is None:
+        from openai import OpenAI
+
+        _shared_client = OpenAI()
+    return _shared_client
+
+
+def _record_usage(response) -> None:
+    instrumentation.increment("chat.api_calls")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        instrumentation.increment("chat.prompt_tokens", usage.prompt_tokens or 0)
+        instrumentation.increment("chat.completion_tokens", usage.completion_tokens or 0)
 
 
 class ChatOpenAI:
-    def __init__(self, model_name: str = "gpt-4.1-mini"):
+    def __init__(
+        self,
+        model_name: str = "gpt-4.1-mini",
+        client: Optional["OpenAI"] = None,
+        async_client: Optional["AsyncOpenAI"] = None,
+        cache: Optional[CompletionCache] = None,
+        coalesce: bool = False,
+    ):
+        """
+        :param model_name: Chat completion model
+        :param client: Sync client to use (defaults to the process-wide shared client)
+        :param async_client: Async client to use (defaults to one created on the
+            first async call in each event loop, since async clients are bound to
+            the loop they were first used on)
+        :param cache: Optional completion cache for ``run`` / ``arun``; only
+            deterministic requests (``temperature=0`` or a ``seed``) are cached
+        :param coalesce: Share one upstream call between concurrent identical
+            deterministic requests
+        """
         self.model_name = model_name
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.openai_api_key = load_api_key()
         if self.openai_api_key is None:
             raise ValueError("OPENAI_API_KEY is not set")
+        self._client = client
+        self._async_client = async_client
+        self._owns_async_client = False
+        self._async_client_loop = None
+        self.cache = cache
+        self.coalesce = coalesce
+        self.coalesced = 0
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._ainflight: Dict[str, asyncio.Future] = {}
 
-    def run(self, messages, text_only: bool = True, **kwargs):
+    @property
+    def client(self) -> "OpenAI":
+        return self._client or get_shared_client()
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """
+        The default client is bound to the event loop it was created on, so a new one
+        is created when called from another loop (e.g. a second ``asyncio.run``). A
+        client passed by the caller is returned as is.
+        """
+        loop = running_loop()
+        if self._async_client is None or (self._owns_async_client and self._async_client_loop is not loop):
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI()
+            self._owns_async_client = True
+            self._async_client_loop = loop
+        return self._async_client
+
+    async def aclose(self) -> None:
+        """Closes the default async client's connections; call before its event loop shuts down."""
+        if self._owns_async_client and self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+            self._async_client_loop = None
+
+    @staticmethod
+    def _check_messages(messages) -> None:
         if not isinstance(messages, list):
             raise ValueError("messages must be a list")
 
-        client = OpenAI()
-        response = client.chat.completions.create(
-            model=self.model_name, messages=messages, **kwargs
-        )
+    def _cache_key(self, messages, kwargs: Dict[str, Any]) -> Optional[str]:
+        if self.cache is None and not self.coalesce:
+            return None
+        return completion_cache_key(self.model_name, messages, kwargs)
+
+    @staticmethod
+    def _output(payload: Dict[str, Any], text_only: bool):
+        if text_only:
+            return payload["choices"][0]["message"]["content"]
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(payload)
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        payload = self.cache.get(key)
+        instrumentation.increment("chat.cache_hits" if payload is not None else "chat.cache_misses")
+        return payload
+
+    def _fetch(self, key: str, call: Callable[[], "ChatCompletion"]) -> Dict[str, Any]:
+        payload = self._cached(key)
+        if payload is not None:
+            return payload
+        payload = call().model_dump()
+        if self.cache is not None:
+            self.cache.set(key, payload)
+        return payload
+
+    def _coalesced(self, key: str, call: Callable[[], "ChatCompletion"]) -> Dict[str, Any]:
+        if not self.coalesce:
+            return self._fetch(key, call)
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            instrumentation.increment("chat.coalesced")
+            return future.result()
+        try:
+            payload = self._fetch(key, call)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(payload)
+            return payload
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    async def _afetch(self, key: str, call: Callable[[], Awaitable["ChatCompletion"]]) -> Dict[str, Any]:
+        payload = self._cached(key)
+        if payload is not None:
+            return payload
+        payload = (await call()).model_dump()
+        if self.cache is not None:
+            self.cache.set(key, payload)
+        return payload
+
+    async def _acoalesced(self, key: str, call: Callable[[], Awaitable["ChatCompletion"]]) -> Dict[str, Any]:
+        if not self.coalesce:
+            return await self._afetch(key, call)
+        task = self._ainflight.get(key)
+        if task is None:
+            task = self._ainflight[key] = asyncio.ensure_future(self._afetch(key, call))
+            task.add_done_callback(lambda _: self._ainflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            instrumentation.increment("chat.coalesced")
+        # Shielded so a cancelled waiter does not cancel the call the others share.
+        return await asyncio.shield(task)
+
+    def run(self, messages, text_only: bool = True, **kwargs):
+        self._check_messages(messages)
+
+        def call():
+            with instrumentation.span("chat.request"):
+                response = self.client.chat.completions.create(
+                    model=self.model_name, messages=messages, **kwargs
+                )
+            _record_usage(response)
+            return response
+
+        key = self._cache_key(messages, kwargs)
+        if key is not None:
+            return self._output(self._coalesced(key, call), text_only)
+
+        response = call()
+
+        if text_only:
+            return response.choices[0].message.content
+
+        return response
+
+    async def arun(self, messages, text_only: bool = True, **kwargs):
+        """Async :meth:`run`."""
+        self._check_messages(messages)
+
+        async def call():
+            with instrumentation.span("chat.request"):
+                response = await self.async_client.chat.completions.create(
+                    model=self.model_name, messages=messages, **kwargs
+                )
+            _record_usage(response)
+            return response
+
+        key = self._cache_key(messages, kwargs)
+        if key is not None:
+            return self._output(await self._acoalesced(key, call), text_only)
+
+        response = await call()
 
         if text_only:
             return response.choices[0].message.content
 
         return response
+
+    def stream(self, messages, **kwargs) -> Iterator[str]:
+        """Yields content tokens as they arrive."""
+        self._check_messages(messages)
+
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        instrumentation.increment("chat.api_calls")
+        first = True
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first:
+                    instrumentation.observe("chat.first_token", time.perf_counter() - start)
+                    first = False
+                yield chunk.choices[0].delta.content
+        instrumentation.observe("chat.stream", time.perf_counter() - start)
+
+    async def astream(self, messages, **kwargs) -> AsyncIterator[str]:
+        """Async :meth:`stream`."""
+        self._check_messages(messages)
+
+        start = time.perf_counter()
+        response = await self.async_client.chat.completions.create(
+            model=self.model_name, messages=messages, stream=True, **kwargs
+        )
+        instrumentation.increment("chat.api_calls")
+        first = True
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first:
+                    instrumentation.observe("chat.first_token", time.perf_counter() - start)
+                    first = False
+                yield chunk.choices[0].delta.content
+        instrumentation.observe("chat.stream", time.perf_counter() - start)
+
+    async def abatch(
+        self,
+        list_of_messages: List[List[Dict[str, Any]]],
+        max_concurrency: int = 8,
+        text_only: bool = True,
+        return_exceptions: bool = False,
+        **kwargs,
+    ) -> List[Any]:
+        """
+        Runs many prompts with at most ``max_concurrency`` requests in flight.
+
+        Results are returned in input order. With ``return_exceptions`` a failed
+        prompt yields its exception instead of failing the whole batch.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_one(messages):
+            async with semaphore:
+                return await self.arun(messages, text_only=text_only, **kwargs)
+
+        return await asyncio.gather(
+            *[run_one(messages) for messages in list_of_messages],
+            return_exceptions=return_exceptions,
+        )
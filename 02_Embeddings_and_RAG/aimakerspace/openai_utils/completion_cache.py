@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def is_deterministic(kwargs: Dict[str, Any]) -> bool:
+    """Only temperature-0 or seeded completions are safe to replay from a cache."""
+    return kwargs.get("temperature") == 0 or kwargs.get("seed") is not None
+
+
+def completion_cache_key(model_name: str, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]) -> Optional[str]:
+    """
+    Content address for a completion: a hash of the model, messages and request kwargs.
+
+    :return: The key, or None when the request is not deterministic
+    """
+    if not is_deterministic(kwargs):
+        return None
+    request = {"model": model_name, "messages": messages, "kwargs": kwargs}
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CompletionCache(ABC):
+    """
+    Base class for completion caches keyed by :func:`completion_cache_key`.
+
+    Values are the completion as a plain dict (``ChatCompletion.model_dump()``).
+    Entries older than ``ttl`` seconds are treated as misses (None keeps them
+    forever). Subclasses implement ``_get`` / ``set``; hit and miss counters are
+    maintained here.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    @abstractmethod
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        pass
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUCompletionCache(CompletionCache):
+    """In-memory cache that evicts the least recently used completion past ``max_items``."""
+
+    def __init__(self, max_items: int = 10_000, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.max_items = max_items
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            created, value = item
+            if self._expired(created):
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], created: Optional[float] = None) -> None:
+        with self._lock:
+            self._items[key] = (time.time() if created is None else created, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class SQLiteCompletionCache(CompletionCache):
+    """
+    On-disk cache in a SQLite file, storing completions as JSON.
+
+    Past ``max_items`` entries the least recently accessed are evicted; expired
+    entries are deleted when they are read.
+    """
+
+    def __init__(self, path: str, max_items: int = 100_000, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.path = path
+        self.max_items = max_items
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed)")
+        self._connection.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._get_with_created(key)[1]
+
+    def _get_with_created(self, key: str) -> Tuple[float, Optional[Dict[str, Any]]]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return 0.0, None
+            response, created = row
+            if self._expired(created):
+                self._connection.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._connection.commit()
+                return 0.0, None
+            self._connection.execute("UPDATE completions SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        return created, json.loads(response)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completions (key, response, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            excess = self._connection.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_items
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM completions WHERE key IN "
+                    "(SELECT key FROM completions ORDER BY accessed LIMIT ?)",
+                    (excess,),
+                )
+            self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class TieredCompletionCache(CompletionCache):
+    """In-memory LRU tier in front of an optional on-disk tier; disk hits are promoted."""
+
+    def __init__(self, memory: Optional[LRUCompletionCache] = None, disk: Optional[SQLiteCompletionCache] = None):
+        super().__init__()
+        self.memory = memory if memory is not None else LRUCompletionCache()
+        self.disk = disk
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            created, value = self.disk._get_with_created(key)
+            self.disk.hits += value is not None
+            self.disk.misses += value is None
+            if value is not None:
+                # Keep the original creation time so the memory tier honours the same TTL.
+                self.memory.set(key, value, created=created)
+        return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def stats(self) -> Dict[str, float]:
+        stats = super().stats()
+        stats["memory"] = self.memory.stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
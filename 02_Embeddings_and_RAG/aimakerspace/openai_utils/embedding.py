@@ -1,63 +1,227 @@
-from dotenv import load_dotenv
-from openai import AsyncOpenAI, OpenAI
-import openai
-from typing import List
-import os
-import asyncio
+from typing import TYPE_CHECKING, List, Optional, Tuple, Type
+from aimakerspace import instrumentation
+from aimakerspace.openai_utils.embedding_cache import EmbeddingCache, embedding_cache_key
+from aimakerspace.openai_utils.environment import load_api_key, require_api_key, running_loop
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from aimakerspace.openai_utils.scheduler import EmbeddingScheduler
+
+# openai takes most of a second to import, so it (and the asyncio-based scheduler) is
+# only imported once a client, its exception types or an async call are needed.
+
+
+def retryable_errors() -> Tuple[Type[Exception], ...]:
+    """OpenAI errors worth retrying: rate limits, connection problems, timeouts and 5xx."""
+    import openai
+
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+
+def __getattr__(name: str):
+    # ``RETRYABLE_ERRORS`` stays importable without importing openai up front.
+    if name == "RETRYABLE_ERRORS":
+        return retryable_errors()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _record_response(response, n_texts: int) -> None:
+    instrumentation.increment("embedding.api_calls")
+    instrumentation.increment("embedding.texts", n_texts)
+    usage = getattr(response, "usage", None)
+    if usage is not None and usage.total_tokens is not None:
+        instrumentation.increment("embedding.tokens", usage.total_tokens)
 
 
 class EmbeddingModel:
-    def __init__(self, embeddings_model_name: str = "text-embedding-3-small", batch_size: int = 1024):
-        load_dotenv()
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        self.async_client = AsyncOpenAI()
-        self.client = OpenAI()
-
-        if self.openai_api_key is None:
-            raise ValueError(
-                "OPENAI_API_KEY environment variable is not set. Please set it to your OpenAI API key."
-            )
+    def __init__(
+        self,
+        embeddings_model_name: str = "text-embedding-3-small",
+        batch_size: int = 1024,
+        cache: Optional[EmbeddingCache] = None,
+        scheduler: Optional["EmbeddingScheduler"] = None,
+    ):
+        """
+        Nothing is imported or connected here: ``.env`` is read and the clients are
+        created on first use, which is also when a missing OPENAI_API_KEY is reported.
+
+        :param cache: Optional embedding cache consulted before any API call
+        :param scheduler: Batching/retry policy (a default one is built on first use)
+        """
         self.embeddings_model_name = embeddings_model_name
         self.batch_size = batch_size
+        self.cache = cache
+        self._scheduler = scheduler
+        self._client: Optional["OpenAI"] = None
+        self._async_client: Optional["AsyncOpenAI"] = None
+        # The default async client is owned here and tied to the loop it was created on.
+        self._owns_async_client = False
+        self._async_client_loop = None
+
+    @property
+    def openai_api_key(self) -> Optional[str]:
+        return load_api_key()
+
+    @property
+    def client(self) -> "OpenAI":
+        if self._client is None:
+            require_api_key()
+            from openai import OpenAI
+
+            self._client = OpenAI()
+        return self._client
+
+    @client.setter
+    def client(self, client: "OpenAI") -> None:
+        self._client = client
+
+    @property
+    def async_client(self) -> "AsyncOpenAI":
+        """
+        The default client is bound to the event loop it was created on, so a new one
+        is created when called from another loop (e.g. a second ``asyncio.run``). A
+        client assigned by the caller is returned as is.
+        """
+        loop = running_loop()
+        if self._async_client is None or (self._owns_async_client and self._async_client_loop is not loop):
+            require_api_key()
+            from openai import AsyncOpenAI
+
+            self._async_client = AsyncOpenAI()
+            self._owns_async_client = True
+            self._async_client_loop = loop
+        return self._async_client
+
+    @async_client.setter
+    def async_client(self, client: "AsyncOpenAI") -> None:
+        self._async_client = client
+        self._owns_async_client = False
+        self._async_client_loop = None
+
+    async def aclose(self) -> None:
+        """Closes the default async client's connections; call before its event loop shuts down."""
+        if self._owns_async_client and self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+            self._async_client_loop = None
+
+    @property
+    def scheduler(self) -> "EmbeddingScheduler":
+        if self._scheduler is None:
+            from aimakerspace.openai_utils.scheduler import MAX_ITEMS_PER_REQUEST, EmbeddingScheduler
+
+            # Batches are bounded by ``batch_size`` texts and the provider's per-request token limit.
+            self._scheduler = EmbeddingScheduler(
+                max_items_per_batch=min(self.batch_size, MAX_ITEMS_PER_REQUEST), retry_on=retryable_errors()
+            )
+        return self._scheduler
+
+    @scheduler.setter
+    def scheduler(self, scheduler: "EmbeddingScheduler") -> None:
+        self._scheduler = scheduler
+
+    def _lookup_cache(self, list_of_text: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+        """
+        Splits texts into cached embeddings and the unique texts that still need embedding.
+
+        :return: (results with ``None`` for misses, unique missing texts)
+        """
+        keys = [embedding_cache_key(self.embeddings_model_name, text) for text in list_of_text]
+        found = self.cache.get_many(dict.fromkeys(keys))
+        results = [found.get(key) for key in keys]
+        missing = list(dict.fromkeys(text for text, result in zip(list_of_text, results) if result is None))
+        instrumentation.increment("embedding.cache_hits", len(list_of_text) - len(missing))
+        instrumentation.increment("embedding.cache_misses", len(missing))
+        return results, missing
+
+    def _merge_cache(
+        self,
+        list_of_text: List[str],
+        results: List[Optional[List[float]]],
+        missing: List[str],
+        embeddings: List[List[float]],
+    ) -> List[List[float]]:
+        fetched = dict(zip(missing, embeddings))
+        self.cache.set_many({embedding_cache_key(self.embeddings_model_name, text): fetched[text] for text in missing})
+        return [result if result is not None else fetched[text] for text, result in zip(list_of_text, results)]
 
     async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        batches = [list_of_text[i:i + self.batch_size] for i in range(0, len(list_of_text), self.batch_size)]
-        
+        from aimakerspace.openai_utils.scheduler import EmbeddingBatchError
+
+        if self.cache is None:
+            return await self._async_fetch_embeddings(list_of_text)
+        results, missing = self._lookup_cache(list_of_text)
+        try:
+            embeddings = await self._async_fetch_embeddings(missing) if missing else []
+        except EmbeddingBatchError as e:
+            # Keep the batches that did succeed so a retry only pays for the failures.
+            self.cache.set_many({
+                embedding_cache_key(self.embeddings_model_name, text): embedding
+                for text, embedding in zip(missing, e.results)
+                if embedding is not None
+            })
+            raise
+        return self._merge_cache(list_of_text, results, missing, embeddings)
+
+    async def _async_fetch_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
         async def process_batch(batch):
-            embedding_response = await self.async_client.embeddings.create(
-                input=batch, model=self.embeddings_model_name
-            )
+            with instrumentation.span("embedding.request"):
+                embedding_response = await self.async_client.embeddings.create(
+                    input=batch, model=self.embeddings_model_name
+                )
+            _record_response(embedding_response, len(batch))
             return [embeddings.embedding for embeddings in embedding_response.data]
-        
-        # Use asyncio.gather to process all batches concurrently
-        results = await asyncio.gather(*[process_batch(batch) for batch in batches])
-        
-        # Flatten the results
-        return [embedding for batch_result in results for embedding in batch_result]
+
+        # The scheduler bounds concurrency, paces requests and retries failed batches
+        return await self.scheduler.run(list_of_text, process_batch)
 
     async def async_get_embedding(self, text: str) -> List[float]:
-        embedding = await self.async_client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+        if self.cache is not None:
+            return (await self.async_get_embeddings([text]))[0]
+        with instrumentation.span("embedding.request"):
+            embedding = await self.async_client.embeddings.create(
+                input=text, model=self.embeddings_model_name
+            )
+        _record_response(embedding, 1)
 
         return embedding.data[0].embedding
 
     def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
-        embedding_response = self.client.embeddings.create(
-            input=list_of_text, model=self.embeddings_model_name
-        )
+        if self.cache is None:
+            return self._fetch_embeddings(list_of_text)
+        results, missing = self._lookup_cache(list_of_text)
+        embeddings = self._fetch_embeddings(missing) if missing else []
+        return self._merge_cache(list_of_text, results, missing, embeddings)
+
+    def _fetch_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        with instrumentation.span("embedding.request"):
+            embedding_response = self.client.embeddings.create(
+                input=list_of_text, model=self.embeddings_model_name
+            )
+        _record_response(embedding_response, len(list_of_text))
 
         return [embeddings.embedding for embeddings in embedding_response.data]
 
     def get_embedding(self, text: str) -> List[float]:
-        embedding = self.client.embeddings.create(
-            input=text, model=self.embeddings_model_name
-        )
+        if self.cache is not None:
+            return self.get_embeddings([text])[0]
+        with instrumentation.span("embedding.request"):
+            embedding = self.client.embeddings.create(
+                input=text, model=self.embeddings_model_name
+            )
+        _record_response(embedding, 1)
 
         return embedding.data[0].embedding
 
 
 if __name__ == "__main__":
+    import asyncio
+
     embedding_model = EmbeddingModel()
     print(asyncio.run(embedding_model.async_get_embedding("Hello, world!")))
     print(
@@ -0,0 +1,211 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+
+def embedding_cache_key(model_name: str, text: str) -> str:
+    """Content address for an embedding: a hash of the model name plus the text."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache(ABC):
+    """
+    Base class for embedding caches keyed by :func:`embedding_cache_key`.
+
+    Subclasses implement ``_get_many`` / ``set_many``; hit and miss counters
+    are maintained here.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(keys)
+        found = self._get_many(keys)
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    @abstractmethod
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        pass
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        pass
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUEmbeddingCache(EmbeddingCache):
+    """In-memory cache that evicts the least recently used embedding past ``max_items``."""
+
+    def __init__(self, max_items: int = 100_000):
+        super().__init__()
+        self.max_items = max_items
+        self._items: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._items.get(key)
+                if value is not None:
+                    self._items.move_to_end(key)
+                    found[key] = value
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, value in items.items():
+                self._items[key] = value
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+
+class SQLiteEmbeddingCache(EmbeddingCache):
+    """
+    On-disk cache in a SQLite file, storing embeddings as float32 blobs.
+
+    When the stored payload exceeds ``max_bytes`` the least recently accessed
+    entries are evicted, in one batch, down to ``evict_to`` of the limit. The
+    payload size is counted once on open and then tracked per write, so the
+    file should not be shared with another writer process.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30, evict_to: float = 0.9):
+        super().__init__()
+        self.path = path
+        self.max_bytes = max_bytes
+        self.evict_to = evict_to
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS embeddings_accessed ON embeddings (accessed)")
+        self._connection.commit()
+        self._bytes = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET accessed = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._connection.commit()
+        return found
+
+    def _stored_bytes(self, keys: List[str]) -> int:
+        total = 0
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ",".join("?" * len(batch))
+            total += self._connection.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({placeholders})", batch
+            ).fetchone()[0]
+        return total
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        now = time.time()
+        rows = [(key, array("f", value).tobytes(), now) for key, value in items.items()]
+        with self._lock:
+            # Replaced rows give their bytes back before the new blobs are counted.
+            self._bytes -= self._stored_bytes(list(items))
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, accessed) VALUES (?, ?, ?)", rows
+            )
+            self._bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+            self._connection.commit()
+
+    def _evict(self) -> None:
+        # Walks the ``accessed`` index from the oldest entry and stops at the low-water mark.
+        excess = self._bytes - int(self.max_bytes * self.evict_to)
+        freed = 0
+        stale = []
+        for key, size in self._connection.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY accessed"
+        ):
+            stale.append((key,))
+            freed += size
+            if freed >= excess:
+                break
+        self._connection.executemany("DELETE FROM embeddings WHERE key = ?", stale)
+        self._bytes -= freed
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class TieredEmbeddingCache(EmbeddingCache):
+    """In-memory LRU tier in front of an optional on-disk tier; disk hits are promoted."""
+
+    def __init__(self, memory: Optional[LRUEmbeddingCache] = None, disk: Optional[EmbeddingCache] = None):
+        super().__init__()
+        self.memory = memory if memory is not None else LRUEmbeddingCache()
+        self.disk = disk
+
+    def _get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = self.memory.get_many(keys)
+        if self.disk is not None and len(found) < len(keys):
+            from_disk = self.disk.get_many([key for key in keys if key not in found])
+            if from_disk:
+                self.memory.set_many(from_disk)
+                found.update(from_disk)
+        return found
+
+    def set_many(self, items: Dict[str, List[float]]) -> None:
+        self.memory.set_many(items)
+        if self.disk is not None:
+            self.disk.set_many(items)
+
+    def stats(self) -> Dict[str, float]:
+        stats = super().stats()
+        stats["memory"] = self.memory.stats()
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
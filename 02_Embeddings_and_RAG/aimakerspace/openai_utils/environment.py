@@ -0,0 +1,40 @@
+import os
+import sys
+from typing import Optional
+
+_dotenv_loaded = False
+
+
+def load_api_key() -> Optional[str]:
+    """
+    ``OPENAI_API_KEY`` from the environment. The first call loads ``.env`` (without
+    overriding variables already set), so python-dotenv is only imported once a
+    client is actually needed.
+    """
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _dotenv_loaded = True
+    return os.getenv("OPENAI_API_KEY")
+
+
+def require_api_key() -> str:
+    key = load_api_key()
+    if key is None:
+        raise ValueError(
+            "OPENAI_API_KEY environment variable is not set. Please set it to your OpenAI API key."
+        )
+    return key
+
+
+def running_loop():
+    """The running asyncio event loop, or None (without importing asyncio if nothing has)."""
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
@@ -1,6 +1,9 @@
 import re
+from functools import lru_cache
+from string import Formatter
 from typing import Dict, List, Any, Optional, Union, Callable
 from abc import ABC, abstractmethod
+from aimakerspace import instrumentation
 
 
 class PromptValidationError(Exception):
@@ -8,6 +11,178 @@ class PromptValidationError(Exception):
     pass
 
 
+_CONDITIONAL_PATTERN = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
+_CONDITIONAL_VAR_PATTERN = re.compile(r'\{([^{}]+)\}')
+_BASE_VAR_PATTERN = re.compile(r"\{([^}]+)\}")
+_COMPARISON_OPERATORS = {
+    '>': lambda left, right: left > right,
+    '<': lambda left, right: left < right,
+    '>=': lambda left, right: left >= right,
+    '<=': lambda left, right: left <= right,
+    '!=': lambda left, right: left != right,
+}
+
+
+class _Variable:
+    """A ``{name}`` placeholder in a compiled template."""
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _Conditional:
+    """An ``{if condition}...{else}...{/if}`` block with both branches pre-parsed."""
+
+    __slots__ = ('condition', 'evaluate', 'true_branch', 'false_branch')
+
+    def __init__(self, condition: str, true_branch: tuple, false_branch: tuple):
+        self.condition = condition
+        self.evaluate = _compile_condition(condition)
+        self.true_branch = true_branch
+        self.false_branch = false_branch
+
+    def select(self, context: Dict[str, Any]) -> tuple:
+        try:
+            # Simple evaluation - check if variable exists and is truthy
+            if self.condition in context:
+                result = bool(context[self.condition])
+            else:
+                result = self.evaluate(context)
+        except Exception:
+            return self.false_branch
+        return self.true_branch if result else self.false_branch
+
+
+def _split_variables(text: str) -> tuple:
+    """Splits ``text`` into literal strings and :class:`_Variable` placeholders."""
+    segments = []
+    position = 0
+    for match in _CONDITIONAL_VAR_PATTERN.finditer(text):
+        if match.start() > position:
+            segments.append(text[position:match.start()])
+        segments.append(_Variable(match.group(1)))
+        position = match.end()
+    if position < len(text):
+        segments.append(text[position:])
+    return tuple(segments)
+
+
+@lru_cache(maxsize=1024)
+def _compile_conditional_template(prompt: str) -> tuple:
+    """Parses a :class:`ConditionalPrompt` template once into literals, variables and conditionals."""
+    nodes: List[Any] = []
+    position = 0
+    for match in _CONDITIONAL_PATTERN.finditer(prompt):
+        nodes.extend(_split_variables(prompt[position:match.start()]))
+        nodes.append(_Conditional(
+            match.group(1).strip(),
+            _split_variables(match.group(2).strip()),
+            _split_variables(match.group(3).strip() if match.group(3) else ""),
+        ))
+        position = match.end()
+    nodes.extend(_split_variables(prompt[position:]))
+    return tuple(nodes)
+
+
+@lru_cache(maxsize=1024)
+def _compile_condition(condition: str) -> Callable[[Dict[str, Any]], bool]:
+    """Parses a condition like 'var > 5' or 'var == "value"' once into an evaluator."""
+    # Simple equality check
+    if '==' in condition:
+        parts = condition.split('==')
+        if len(parts) == 2:
+            left = parts[0].strip()
+            right = parts[1].strip().strip('"').strip("'")
+            return lambda context: str(context.get(left, "")) == right
+
+    # Simple comparison; the first operator found decides, so 'a >= 1' splits on '>'
+    for op, compare in _COMPARISON_OPERATORS.items():
+        if op in condition:
+            parts = condition.split(op)
+            if len(parts) == 2:
+                left = parts[0].strip()
+                try:
+                    right_val = float(parts[1].strip())
+                except ValueError:
+                    return lambda context: False
+
+                def evaluate(context, left=left, right_val=right_val, compare=compare):
+                    try:
+                        return compare(float(context.get(left, 0)), right_val)
+                    except (ValueError, TypeError):
+                        return False
+
+                return evaluate
+
+    # Default: check if variable exists and is truthy
+    return lambda context: bool(context.get(condition, False))
+
+
+_CONVERSIONS = {None: lambda value: value, 's': str, 'r': repr, 'a': ascii}
+
+
+class _Field:
+    """A ``{name!conversion:format_spec}`` placeholder in a compiled template."""
+
+    __slots__ = ('name', 'convert', 'format_spec')
+
+    def __init__(self, name: str, conversion: Optional[str], format_spec: str):
+        self.name = name
+        self.convert = _CONVERSIONS[conversion]
+        self.format_spec = format_spec
+
+    def render(self, value: Any) -> str:
+        return format(self.convert(value), self.format_spec)
+
+
+def _field_names(prompt: str) -> List[str]:
+    """Base names of every replacement field, nested format specs included, in order."""
+    names = []
+    for _, field_name, format_spec, _ in Formatter().parse(prompt):
+        if field_name is None:
+            continue
+        names.append(re.split(r'[.\[]', field_name, maxsplit=1)[0])
+        if format_spec and '{' in format_spec:
+            names.extend(_field_names(format_spec))
+    return names
+
+
+@lru_cache(maxsize=1024)
+def _compile_format_template(prompt: str) -> tuple:
+    """
+    Parses a :class:`BasePrompt` template once into ``(segments, variables, error)``.
+
+    ``variables`` are the base names of the replacement fields, which is what
+    strict mode and :meth:`BasePrompt.get_input_variables` report. Plain fields,
+    conversions and format specs compile into ``segments``; fields the compiler
+    does not handle (attribute/index access, nested format specs) leave
+    ``segments`` as None and the template is rendered with ``str.format``.
+    ``error`` is set for malformed templates and positional fields, which
+    keyword arguments cannot fill.
+    """
+    try:
+        variables = tuple(_field_names(prompt))
+        if any(not name or name.isdigit() for name in variables):
+            raise ValueError("positional fields are not supported; name every placeholder")
+    except ValueError as e:
+        return None, (), e
+    segments: Optional[List[Any]] = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(prompt):
+        if literal:
+            segments.append(literal)
+        if field_name is None:
+            continue
+        if '.' in field_name or '[' in field_name or '{' in format_spec:
+            return None, variables, None
+        if format_spec or conversion:
+            segments.append(_Field(field_name, conversion, format_spec))
+        else:
+            segments.append(_Variable(field_name))
+    return tuple(segments), variables, None
+
+
 class ConditionalPrompt:
     """Enhanced prompt with conditional logic support"""
     
@@ -20,6 +195,9 @@ class ConditionalPrompt:
         - {if condition}content{else}alternative{/if}
         - Standard variables: {variable_name}
         
+        The template is parsed once (and cached per template string), so rendering
+        picks branches and joins the pieces in a single pass.
+        
         :param prompt: Template string with conditional logic
         :param strict: If True, raises error when required variables are missing
         :param defaults: Default values for template variables
@@ -27,83 +205,36 @@ class ConditionalPrompt:
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._var_pattern = re.compile(r'\{([^{}]+)\}')
-        self._conditional_pattern = re.compile(r'\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}', re.DOTALL)
+        self._var_pattern = _CONDITIONAL_VAR_PATTERN
+        self._conditional_pattern = _CONDITIONAL_PATTERN
         
     def format_prompt(self, **kwargs) -> str:
         """Format prompt with conditional logic evaluation"""
         merged_kwargs = {**self.defaults, **kwargs}
         
-        # Process conditional statements
-        result = self._process_conditionals(self.prompt, merged_kwargs)
-        
-        # Process regular variables
-        variables = self._var_pattern.findall(result)
-        
-        if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
-            if missing_vars:
-                raise PromptValidationError(f"Missing required variables: {missing_vars}")
-        
-        # Format remaining variables
-        for var in variables:
-            value = merged_kwargs.get(var, "")
-            result = result.replace(f"{{{var}}}", str(value))
-            
-        return result
-    
-    def _process_conditionals(self, text: str, context: Dict[str, Any]) -> str:
-        """Process conditional statements in the text"""
-        def replace_conditional(match):
-            condition = match.group(1).strip()
-            true_content = match.group(2).strip()
-            false_content = match.group(3).strip() if match.group(3) else ""
-            
-            # Evaluate condition
-            try:
-                # Simple evaluation - check if variable exists and is truthy
-                if condition in context:
-                    condition_result = bool(context[condition])
+        with instrumentation.span("prompt.render"):
+            # Pick the branch of each conditional; substituted values are never re-scanned
+            segments = []
+            for node in _compile_conditional_template(self.prompt):
+                if type(node) is _Conditional:
+                    segments.extend(node.select(merged_kwargs))
                 else:
-                    # Try to evaluate as a simple expression
-                    condition_result = self._evaluate_condition(condition, context)
-                
-                return true_content if condition_result else false_content
-            except Exception:
-                return false_content
+                    segments.append(node)
+        
+            if self.strict:
+                variables = {segment.name for segment in segments if type(segment) is _Variable}
+                missing_vars = variables - merged_kwargs.keys()
+                if missing_vars:
+                    raise PromptValidationError(f"Missing required variables: {missing_vars}")
         
-        return self._conditional_pattern.sub(replace_conditional, text)
+            return "".join([
+                segment if type(segment) is str else str(merged_kwargs.get(segment.name, ""))
+                for segment in segments
+            ])
     
     def _evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
         """Evaluate simple conditions like 'var > 5' or 'var == "value"'"""
-        # Simple equality check
-        if '==' in condition:
-            parts = condition.split('==')
-            if len(parts) == 2:
-                left = parts[0].strip()
-                right = parts[1].strip().strip('"').strip("'")
-                return str(context.get(left, "")) == right
-        
-        # Simple comparison
-        for op in ['>', '<', '>=', '<=', '!=']:
-            if op in condition:
-                parts = condition.split(op)
-                if len(parts) == 2:
-                    left = parts[0].strip()
-                    right = parts[1].strip()
-                    try:
-                        left_val = float(context.get(left, 0))
-                        right_val = float(right)
-                        if op == '>': return left_val > right_val
-                        elif op == '<': return left_val < right_val
-                        elif op == '>=': return left_val >= right_val
-                        elif op == '<=': return left_val <= right_val
-                        elif op == '!=': return left_val != right_val
-                    except (ValueError, TypeError):
-                        return False
-        
-        # Default: check if variable exists and is truthy
-        return bool(context.get(condition, False))
+        return _compile_condition(condition)(context)
 
 
 class BasePrompt:
@@ -111,6 +242,9 @@ class BasePrompt:
         """
         Initializes the BasePrompt object with a prompt template.
 
+        The template is parsed once (and cached per template string) into literal
+        and placeholder segments, so rendering is a single join.
+
         :param prompt: A string that can contain placeholders within curly braces
         :param strict: If True, raises error when required variables are missing
         :param defaults: Default values for template variables
@@ -118,16 +252,14 @@ class BasePrompt:
         self.prompt = prompt
         self.strict = strict
         self.defaults = defaults or {}
-        self._pattern = re.compile(r"\{([^}]+)\}")
+        self._pattern = _BASE_VAR_PATTERN
         self._validate_template()
 
     def _validate_template(self) -> None:
         """Validates the template syntax"""
-        try:
-            test_vars = {var: "test" for var in self.get_input_variables()}
-            self.prompt.format(**test_vars)
-        except (KeyError, ValueError) as e:
-            raise PromptValidationError(f"Invalid template syntax: {e}")
+        error = _compile_format_template(self.prompt)[2]
+        if error is not None:
+            raise PromptValidationError(f"Invalid template syntax: {error}")
 
     def format_prompt(self, **kwargs) -> str:
         """
@@ -137,21 +269,30 @@ class BasePrompt:
         :return: The formatted prompt string
         :raises PromptValidationError: If strict mode and required variables are missing
         """
-        variables = self.get_input_variables()
-        merged_kwargs = {**self.defaults, **kwargs}
+        with instrumentation.span("prompt.render"):
+            segments, variables, error = _compile_format_template(self.prompt)
+            merged_kwargs = {**self.defaults, **kwargs}
         
-        if self.strict:
-            missing_vars = set(variables) - set(merged_kwargs.keys())
-            if missing_vars:
-                raise PromptValidationError(f"Missing required variables: {missing_vars}")
+            if self.strict:
+                missing_vars = set(variables) - merged_kwargs.keys()
+                if missing_vars:
+                    raise PromptValidationError(f"Missing required variables: {missing_vars}")
         
-        # Use defaults for missing variables
-        format_dict = {var: merged_kwargs.get(var, self.defaults.get(var, "")) for var in variables}
+            if error is not None:
+                raise PromptValidationError(f"Error formatting prompt: {error}")
         
-        try:
-            return self.prompt.format(**format_dict)
-        except (KeyError, ValueError) as e:
-            raise PromptValidationError(f"Error formatting prompt: {e}")
+            # Use defaults for missing variables
+            try:
+                if segments is None:
+                    return self.prompt.format(**{var: merged_kwargs.get(var, "") for var in variables})
+                return "".join([
+                    segment if type(segment) is str
+                    else str(merged_kwargs.get(segment.name, "")) if type(segment) is _Variable
+                    else segment.render(merged_kwargs.get(segment.name, ""))
+                    for segment in segments
+                ])
+            except (KeyError, ValueError, IndexError, AttributeError, TypeError) as e:
+                raise PromptValidationError(f"Error formatting prompt: {e}")
 
     def get_input_variables(self) -> List[str]:
         """
@@ -159,7 +300,7 @@ class BasePrompt:
 
         :return: List of input variable names
         """
-        return self._pattern.findall(self.prompt)
+        return list(_compile_format_template(self.prompt)[1])
     
     def validate_inputs(self, **kwargs) -> Dict[str, List[str]]:
         """
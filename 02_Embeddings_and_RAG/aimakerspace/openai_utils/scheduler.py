@@ -0,0 +1,192 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Type
+
+# Per-request input limits of the OpenAI embeddings endpoint.
+MAX_ITEMS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def make_token_batches(
+    list_of_text: List[str],
+    max_tokens_per_batch: int,
+    max_items_per_batch: int,
+    token_counter: Callable[[str], int] = estimate_tokens,
+) -> List[Tuple[List[int], int]]:
+    """
+    Greedily packs texts, in order, into batches bounded by estimated tokens and item count.
+
+    :return: List of (indices into ``list_of_text``, estimated tokens) per batch
+    """
+    batches = []
+    indices: List[int] = []
+    tokens = 0
+    for i, text in enumerate(list_of_text):
+        text_tokens = token_counter(text)
+        if indices and (tokens + text_tokens > max_tokens_per_batch or len(indices) >= max_items_per_batch):
+            batches.append((indices, tokens))
+            indices, tokens = [], 0
+        indices.append(i)
+        tokens += text_tokens
+    if indices:
+        batches.append((indices, tokens))
+    return batches
+
+
+class RateLimiter:
+    """Async token bucket refilled continuously at ``limit_per_minute``."""
+
+    def __init__(self, limit_per_minute: float):
+        self.capacity = float(limit_per_minute)
+        self.rate = self.capacity / 60.0
+        self._available = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # A request larger than the whole bucket waits for a full bucket instead of forever.
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._available >= amount:
+                    self._available -= amount
+                    return
+                await asyncio.sleep((amount - self._available) / self.rate)
+
+
+class EmbeddingBatchError(Exception):
+    """
+    Raised when some batches fail (after retrying, if the error was retryable);
+    carries the partial results. The first underlying error is its ``__cause__``.
+    """
+
+    def __init__(self, message: str, results: List[Optional[List[float]]], failed_indices: List[int]):
+        super().__init__(message)
+        self.results = results
+        self.failed_indices = failed_indices
+
+
+class EmbeddingScheduler:
+    """
+    Runs embedding batches with bounded concurrency, rate budgets and retries.
+
+    :param max_concurrency: Maximum number of requests in flight
+    :param tokens_per_minute: Token budget per minute (None for unlimited)
+    :param requests_per_minute: Request budget per minute (None for unlimited)
+    :param max_tokens_per_batch: Estimated-token cap per request (the provider limit by default)
+    :param max_items_per_batch: Item cap per request
+    :param max_retries: Retries per batch before it is reported as failed
+    :param base_delay: Initial backoff delay in seconds
+    :param max_delay: Cap on a single backoff delay in seconds
+    :param retry_on: Exception types that trigger a retry; any other error fails its
+        batch straight away, and the remaining batches still run
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        tokens_per_minute: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        max_tokens_per_batch: int = MAX_TOKENS_PER_REQUEST,
+        max_items_per_batch: int = 1024,
+        max_retries: int = 5,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+        token_counter: Callable[[str], int] = estimate_tokens,
+    ):
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self.max_items_per_batch = max_items_per_batch
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.token_counter = token_counter
+        self.last_stats: Dict[str, float] = {}
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter keeps retrying clients from stampeding in lockstep.
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def run(
+        self,
+        list_of_text: List[str],
+        embed_batch: Callable[[List[str]], Awaitable[List[List[float]]]],
+    ) -> List[List[float]]:
+        """
+        Embeds ``list_of_text`` through ``embed_batch`` and returns vectors in input order.
+
+        :raises EmbeddingBatchError: If any batch exhausts its retries or hits a
+            non-retryable error; successful batches are still available on the exception
+        """
+        start = time.perf_counter()
+        results: List[Optional[List[float]]] = [None] * len(list_of_text)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        token_limiter = RateLimiter(self.tokens_per_minute) if self.tokens_per_minute else None
+        request_limiter = RateLimiter(self.requests_per_minute) if self.requests_per_minute else None
+        counters = {"requests": 0, "retries": 0}
+        failed: List[int] = []
+        errors: List[BaseException] = []
+
+        async def process_batch(indices: List[int], tokens: int) -> None:
+            batch = [list_of_text[i] for i in indices]
+            for attempt in range(self.max_retries + 1):
+                if request_limiter is not None:
+                    await request_limiter.acquire()
+                if token_limiter is not None:
+                    await token_limiter.acquire(tokens)
+                try:
+                    async with semaphore:
+                        counters["requests"] += 1
+                        embeddings = await embed_batch(batch)
+                except self.retry_on as e:
+                    if attempt == self.max_retries:
+                        failed.extend(indices)
+                        errors.append(e)
+                        return
+                    counters["retries"] += 1
+                    await asyncio.sleep(self._backoff(attempt))
+                    continue
+                except Exception as e:
+                    failed.extend(indices)
+                    errors.append(e)
+                    return
+                for i, embedding in zip(indices, embeddings):
+                    results[i] = embedding
+                return
+
+        batches = make_token_batches(
+            list_of_text, self.max_tokens_per_batch, self.max_items_per_batch, self.token_counter
+        )
+        await asyncio.gather(*[process_batch(indices, tokens) for indices, tokens in batches])
+
+        seconds = time.perf_counter() - start
+        completed = len(list_of_text) - len(failed)
+        self.last_stats = {
+            "texts": completed,
+            "batches": len(batches),
+            "requests": counters["requests"],
+            "retries": counters["retries"],
+            "failed": len(failed),
+            "seconds": seconds,
+            "texts_per_sec": completed / seconds if seconds > 0 else 0.0,
+        }
+        if failed:
+            raise EmbeddingBatchError(
+                f"{len(failed)} of {len(list_of_text)} texts failed to embed: {errors[0]!r}",
+                results,
+                sorted(failed),
+            ) from errors[0]
+        return results
@@ -0,0 +1,256 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from aimakerspace import instrumentation
+from aimakerspace.ann_index import ExactIndex, cluster_sums
+from aimakerspace.vector_store import top_k_indices
+
+BLOCK_ROWS = 65536
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, n_iter: int = 15, seed: int = 0) -> np.ndarray:
+    """Plain Lloyd's k-means under Euclidean distance; returns the centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignment = nearest_centroids(vectors, centroids)
+        sums = cluster_sums(vectors, assignment, n_clusters)
+        counts = np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+            counts[empty] = 1
+        centroids = (sums / counts[:, None]).astype(vectors.dtype, copy=False)
+    return centroids
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    distances = (
+        np.einsum("ij,ij->i", centroids, centroids)[None, :]
+        - 2 * vectors @ centroids.T
+    )
+    return np.argmin(distances, axis=1)
+
+
+class QuantizedIndex(ExactIndex, ABC):
+    """
+    Base class for indexes that scan compressed codes instead of the float matrix.
+
+    Codes are trained once ``min_train_size`` vectors exist; until then the index
+    answers exactly. With ``rerank`` > 0 the best ``rerank`` approximate candidates
+    are re-scored exactly against the store.
+
+    The codes are held in addition to the full-precision store, not instead of it:
+    a database built in memory keeps both resident. The saving only materialises
+    when the store is memory-mapped, i.e. the database is opened with
+    ``VectorDatabase.load(path, mmap=True, index=...)``; searches then read the
+    store only for the re-ranked candidates.
+
+    ``VectorDatabase.save`` writes the trained quantiser and codes next to the
+    vectors, and loading with an index of the same class and shape reuses them
+    instead of retraining, so reloaded results match the saved database.
+
+    :param rerank: Number of approximate candidates re-scored exactly (0 disables)
+    :param min_train_size: Vectors required before the quantiser is trained
+    :param max_train_size: Cap on vectors sampled for training
+    """
+
+    # Attributes set by _fit, saved and restored along with the codes.
+    PARAMETERS: Tuple[str, ...] = ()
+
+    def __init__(self, rerank: int = 0, min_train_size: int = 10_000, max_train_size: int = 100_000, seed: int = 0):
+        super().__init__()
+        self.rerank = rerank
+        self.min_train_size = min_train_size
+        self.max_train_size = max_train_size
+        self.seed = seed
+        self.is_trained = False
+        self._codes: Optional[np.ndarray] = None
+        self._size = 0
+
+    @property
+    def codes(self) -> np.ndarray:
+        return self._codes[: self._size]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the codes of the rows currently indexed (the store is not included)."""
+        return 0 if self._codes is None else self.codes.nbytes
+
+    @abstractmethod
+    def _fit(self, sample: np.ndarray) -> None:
+        pass
+
+    @abstractmethod
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        pass
+
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        """Per-query precomputation shared by every block of codes."""
+        return query
+
+    @abstractmethod
+    def _approximate_scores(self, prepared: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        pass
+
+    def train(self) -> None:
+        """(Re)trains the quantiser on the store's current contents and re-encodes every row."""
+        vectors = self.store.matrix
+        if len(vectors) == 0:
+            return
+        sample = vectors
+        if len(vectors) > self.max_train_size:
+            rng = np.random.default_rng(self.seed)
+            sample = vectors[np.sort(rng.choice(len(vectors), size=self.max_train_size, replace=False))]
+        self._fit(np.asarray(sample, dtype=np.float32))
+        self.is_trained = True
+        self._codes, self._size = None, 0
+        self._append(np.arange(len(vectors)))
+
+    def _append(self, rows: np.ndarray) -> None:
+        codes = self._encode(np.asarray(self.store.matrix[rows], dtype=np.float32))
+        if self._codes is None:
+            self._codes = np.empty((max(len(codes), 1024),) + codes.shape[1:], dtype=codes.dtype)
+        needed = self._size + len(codes)
+        if needed > len(self._codes):
+            grown = np.empty((max(needed, 2 * len(self._codes)),) + self._codes.shape[1:], dtype=self._codes.dtype)
+            grown[: self._size] = self._codes[: self._size]
+            self._codes = grown
+        self._codes[self._size : needed] = codes
+        self._size = needed
+
+    def add(self, rows: np.ndarray) -> None:
+        if self.is_trained:
+            self._append(np.asarray(rows))
+        elif len(self.store) >= self.min_train_size:
+            self.train()
+
+    def update(self, row: int) -> None:
+        if self.is_trained:
+            self._codes[row] = self._encode(np.asarray(self.store.matrix[[row]], dtype=np.float32))[0]
+
+    def rebuild(self) -> None:
+        if self.is_trained or len(self.store) >= self.min_train_size:
+            self.train()
+
+    def state(self) -> Dict[str, np.ndarray]:
+        if not self.is_trained:
+            return {}
+        return {"codes": self.codes, **{name: getattr(self, name) for name in self.PARAMETERS}}
+
+    def restore(self, state: Dict[str, np.ndarray]) -> bool:
+        if "codes" not in state or any(name not in state for name in self.PARAMETERS):
+            return False
+        if len(state["codes"]) != len(self.store):
+            return False
+        for name in self.PARAMETERS:
+            setattr(self, name, np.asarray(state[name]))
+        self._codes = np.array(state["codes"])
+        self._size = len(self._codes)
+        self.is_trained = True
+        return True
+
+    def _scan(self, query: np.ndarray) -> np.ndarray:
+        prepared = self._prepare_query(query)
+        scores = np.empty(self._size, dtype=np.float32)
+        for start in range(0, self._size, BLOCK_ROWS):
+            block = self._codes[start : min(start + BLOCK_ROWS, self._size)]
+            scores[start : start + len(block)] = self._approximate_scores(prepared, block)
+        if self.store.deleted_count:
+            scores[~self.store.alive] = -np.inf
+        return scores
+
+    def search(self, query_vector: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        if not self.is_trained:
+            return super().search(query_vector, k)
+        query = self.store.normalise_query(query_vector)
+        instrumentation.increment("vector_db.codes_scanned", self._size)
+        scores = self._scan(query)
+        if self.rerank <= 0:
+            rows = top_k_indices(scores, k)
+            return rows, scores[rows]
+        candidates = top_k_indices(scores, max(k, self.rerank))
+        candidates = candidates[np.isfinite(scores[candidates])]
+        instrumentation.increment("vector_db.vectors_scanned", len(candidates))
+        exact = np.asarray(self.store.matrix[candidates], dtype=np.float32) @ query
+        best = top_k_indices(exact, k)
+        return candidates[best], exact[best]
+
+    def search_many(self, query_vectors: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if not self.is_trained:
+            return super().search_many(query_vectors, k)
+        return [self.search(query_vector, k) for query_vector in np.atleast_2d(query_vectors)]
+
+
+class ScalarQuantizedIndex(QuantizedIndex):
+    """int8 scalar quantisation with a symmetric scale per dimension (codes 4x smaller than float32 rows)."""
+
+    PARAMETERS = ("scales",)
+
+    def _fit(self, sample: np.ndarray) -> None:
+        max_abs = np.abs(sample).max(axis=0)
+        self.scales = (np.where(max_abs == 0, 1.0, max_abs) / 127.0).astype(np.float32)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return np.clip(np.rint(vectors / self.scales), -127, 127).astype(np.int8)
+
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        # Folding the scales into the query keeps the scan a single product over the codes.
+        return query * self.scales
+
+    def _approximate_scores(self, prepared: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) @ prepared
+
+
+class ProductQuantizedIndex(QuantizedIndex):
+    """
+    Product quantisation: each vector is split into ``m`` sub-vectors, each coded
+    as one byte against a 256-entry codebook. Queries are scored with asymmetric
+    distance computation (a per-query lookup table over the codebooks).
+
+    :param m: Number of sub-quantisers; must divide the vector dimension
+    """
+
+    PARAMETERS = ("codebooks",)
+
+    def __init__(self, m: int = 16, rerank: int = 0, n_iter: int = 10, **kwargs):
+        # 256 codewords per sub-quantiser converge well on ~64 points per codeword.
+        kwargs.setdefault("max_train_size", 16_384)
+        super().__init__(rerank=rerank, **kwargs)
+        self.m = m
+        self.n_iter = n_iter
+        self.codebooks: Optional[np.ndarray] = None
+
+    def restore(self, state: Dict[str, np.ndarray]) -> bool:
+        codebooks = state.get("codebooks")
+        return codebooks is not None and len(codebooks) == self.m and super().restore(state)
+
+    def _subvectors(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        if dim % self.m:
+            raise ValueError(f"Vector dimension {dim} is not divisible by m={self.m}")
+        return vectors.reshape(n, self.m, dim // self.m)
+
+    def _fit(self, sample: np.ndarray) -> None:
+        parts = self._subvectors(sample)
+        codebooks = []
+        for j in range(self.m):
+            centroids = kmeans(parts[:, j], 256, n_iter=self.n_iter, seed=self.seed + j)
+            if len(centroids) < 256:
+                centroids = np.vstack([centroids, np.zeros((256 - len(centroids), centroids.shape[1]))])
+            codebooks.append(centroids)
+        self.codebooks = np.stack(codebooks).astype(np.float32)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._subvectors(vectors)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = nearest_centroids(parts[:, j], self.codebooks[j])
+        return codes
+
+    def _prepare_query(self, query: np.ndarray) -> np.ndarray:
+        # (m, 256) table of sub-vector inner products with every codeword.
+        return np.einsum("jcd,jd->jc", self.codebooks, query.reshape(self.m, -1))
+
+    def _approximate_scores(self, prepared: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        return prepared[np.arange(self.m), codes].sum(axis=1)
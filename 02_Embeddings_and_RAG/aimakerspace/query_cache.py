@@ -0,0 +1,234 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+from aimakerspace import instrumentation
+
+
+def normalize_query(text: str) -> str:
+    """Case- and whitespace-insensitive form of a query, used for exact lookups."""
+    return " ".join(text.lower().split())
+
+
+class _Entry:
+    __slots__ = ("slot", "created", "results")
+
+    def __init__(self, slot: int, created: float):
+        self.slot = slot
+        self.created = created
+        # scope -> (k, results) of the search this query (or a paraphrase of it) ran
+        self.results: Dict[Hashable, Tuple[int, List[Any]]] = {}
+
+
+class SemanticQueryCache:
+    """
+    Two-level cache of recent queries for :meth:`VectorDatabase.search_by_text`.
+
+    1. Exact: the normalised query text maps to its embedding and results, so a
+       repeated query skips the embedding call (and the search, if the results
+       are still valid).
+    2. Semantic: a query whose embedding has cosine similarity of at least
+       ``similarity_threshold`` with a recent query reuses that query's results,
+       skipping the search.
+
+    Query embeddings stay valid as long as the embedding model does; results are
+    dropped by :meth:`invalidate`, which the database calls on every write.
+    Results for a larger ``k`` serve smaller ones. ``scope`` separates searches
+    whose results differ for the same query (mode, filter).
+
+    :param max_items: Queries kept, least recently used evicted first
+    :param ttl: Seconds an entry stays valid (None keeps it until evicted)
+    :param similarity_threshold: Minimum cosine similarity for a semantic hit
+    """
+
+    def __init__(self, max_items: int = 1024, ttl: Optional[float] = None, similarity_threshold: float = 0.95):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[str]] = [None] * max_items
+        self._free = list(range(max_items - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.result_hits = 0
+        self.embedding_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._generation = 0
+        self._embed_seconds = 0.0
+        self._embed_calls = 0
+        self._search_seconds = 0.0
+        self._search_calls = 0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expired(self, entry: _Entry) -> bool:
+        return self.ttl is not None and time.time() - entry.created > self.ttl
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._slot_keys[entry.slot] = None
+        self._free.append(entry.slot)
+
+    def _get_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    @staticmethod
+    def _usable(entry: _Entry, scope: Hashable, k: int) -> Optional[List[Any]]:
+        cached = entry.results.get(scope)
+        if cached is None or cached[0] < k:
+            return None
+        return cached[1][:k]
+
+    def _similar(self, vector: np.ndarray, scope: Hashable, k: int) -> Optional[List[Any]]:
+        if self._vectors is None or not self._entries:
+            return None
+        scores = self._vectors @ vector
+        for slot in np.argsort(-scores).tolist():
+            if scores[slot] < self.similarity_threshold:
+                return None
+            key = self._slot_keys[slot]
+            if key is None:
+                continue
+            entry = self._get_entry(key)
+            if entry is not None:
+                results = self._usable(entry, scope, k)
+                if results is not None:
+                    return results
+        return None
+
+    def _put(self, key: str, vector: np.ndarray, scope: Hashable, k: int, results: Optional[List[Any]]) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            if not self._free:
+                self._remove(next(iter(self._entries)))
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_items, len(vector)), dtype=np.float32)
+            entry = self._entries[key] = _Entry(self._free.pop(), time.time())
+            self._slot_keys[entry.slot] = key
+            self._vectors[entry.slot] = vector
+        self._entries.move_to_end(key)
+        if results is not None:
+            entry.results[scope] = (k, results)
+
+    def _count(self, kind: str, saved: float) -> None:
+        setattr(self, kind, getattr(self, kind) + 1)
+        self.saved_seconds += saved
+        instrumentation.increment("query_cache." + kind)
+        if saved:
+            instrumentation.observe("query_cache.saved_seconds", saved)
+
+    def _mean_embed(self) -> float:
+        return self._embed_seconds / self._embed_calls if self._embed_calls else 0.0
+
+    def _mean_search(self) -> float:
+        return self._search_seconds / self._search_calls if self._search_calls else 0.0
+
+    def search(
+        self,
+        query_text: str,
+        k: int,
+        scope: Hashable,
+        embed: Callable[[str], Any],
+        search: Callable[[np.ndarray], List[Any]],
+    ) -> List[Any]:
+        """
+        Returns cached results for ``query_text`` or computes and caches them.
+
+        :param embed: Query text -> embedding, called only on an exact miss
+        :param search: Query embedding -> top-``k`` results, called only when no
+            exact or semantic entry has valid results
+        """
+        key = normalize_query(query_text)
+        with self._lock:
+            generation = self._generation
+            entry = self._get_entry(key)
+            vector = None
+            if entry is not None:
+                results = self._usable(entry, scope, k)
+                if results is not None:
+                    self._count("result_hits", self._mean_embed() + self._mean_search())
+                    return results
+                vector = self._vectors[entry.slot].copy()
+
+        if vector is None:
+            start = time.perf_counter()
+            vector = np.asarray(embed(query_text), dtype=np.float32)
+            seconds = time.perf_counter() - start
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+            with self._lock:
+                self._embed_seconds += seconds
+                self._embed_calls += 1
+                results = self._similar(vector, scope, k)
+                if results is not None:
+                    self._count("semantic_hits", self._mean_search())
+                    self._put(key, vector, scope, k, results)
+                    return results
+        else:
+            with self._lock:
+                results = self._similar(vector, scope, k)
+                if results is not None:
+                    self._count("semantic_hits", self._mean_embed() + self._mean_search())
+                    self._put(key, vector, scope, k, results)
+                    return results
+
+        start = time.perf_counter()
+        results = search(vector)
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self._search_seconds += seconds
+            self._search_calls += 1
+            if entry is not None:
+                self._count("embedding_hits", self._mean_embed())
+            else:
+                self._count("misses", 0.0)
+            # Results of a search that raced with a write are returned but not kept.
+            self._put(key, vector, scope, k, results if generation == self._generation else None)
+        return results
+
+    def invalidate(self) -> None:
+        """Drops every cached result set; query embeddings are kept."""
+        with self._lock:
+            for entry in self._entries.values():
+                entry.results.clear()
+            self.invalidations += 1
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Hit counts, rates and the estimated seconds saved.
+
+        ``hit_rate`` counts lookups that skipped the search; ``embedding_hit_rate``
+        those that skipped the embedding call. Savings are estimated from the mean
+        embedding and search times measured on misses.
+        """
+        lookups = self.result_hits + self.embedding_hits + self.semantic_hits + self.misses
+        return {
+            "lookups": lookups,
+            "result_hits": self.result_hits,
+            "embedding_hits": self.embedding_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.result_hits + self.semantic_hits) / lookups if lookups else 0.0,
+            "embedding_hit_rate": (self.result_hits + self.embedding_hits) / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "saved_seconds": self.saved_seconds,
+        }
@@ -0,0 +1,326 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple, Union
+from aimakerspace import instrumentation
+from aimakerspace.concurrent_database import ConcurrentVectorDatabase
+from aimakerspace.context_packing import ContextPacker
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI
+from aimakerspace.openai_utils.prompts import SystemRolePrompt, UserRolePrompt
+from aimakerspace.vectordatabase import VectorDatabase
+
+RAG_SYSTEM_TEMPLATE = """You are a knowledgeable assistant that answers questions based strictly on provided context.
+
+Instructions:
+- Only answer questions using information from the provided context
+- If the context doesn't contain relevant information, respond with "I don't know"
+- Be accurate and cite specific parts of the context when possible
+- Keep responses {response_style} and {response_length}
+- Only use the provided context. Do not use external knowledge.
+- Only provide answers when you are confident the context supports your response."""
+
+RAG_USER_TEMPLATE = """Context Information:
+{context}
+
+Number of relevant sources found: {context_count}
+{similarity_scores}
+
+Question: {user_query}
+
+Please provide your answer based solely on the context above."""
+
+
+class StageTimeoutError(asyncio.TimeoutError):
+    """Raised when one pipeline stage exceeds its timeout; ``stage`` names it."""
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"{stage} stage timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
+
+
+async def _with_timeout(stage: str, awaitable: Awaitable, timeout: Optional[float]):
+    try:
+        return await asyncio.wait_for(awaitable, timeout)
+    except asyncio.TimeoutError:
+        instrumentation.increment(f"rag.{stage}.timeouts")
+        raise StageTimeoutError(stage, timeout) from None
+
+
+class AsyncRAGPipeline:
+    """
+    Retrieval-augmented QA over a :class:`VectorDatabase` and :class:`ChatOpenAI`
+    that never blocks the event loop.
+
+    The query is embedded with the async embedding client, the search runs on a
+    worker thread, the prompts are rendered from :class:`SystemRolePrompt` /
+    :class:`UserRolePrompt`, and the answer is generated with ``arun`` or streamed
+    with ``astream``. Each stage has its own timeout (None disables it), and the
+    number of requests retrieving and generating at once is bounded separately,
+    so one process can serve many concurrent users and a slow LLM call only
+    holds a generation slot.
+
+    Searches run on worker threads while the loop keeps serving. A plain
+    :class:`VectorDatabase` is not thread-safe, so it must not be modified while
+    the pipeline has requests in flight; to ingest while serving, pass a
+    :class:`ConcurrentVectorDatabase`, whose searches read an immutable snapshot.
+
+    :param k: Default number of records retrieved per query
+    :param packer: Optional :class:`ContextPacker` applied to the retrieved records
+    :param max_concurrent_retrievals: Requests embedding/searching at once
+    :param max_concurrent_generations: Requests generating at once
+    :param embed_timeout: Seconds allowed for the query embedding
+    :param search_timeout: Seconds allowed for search (and packing)
+    :param generate_timeout: Seconds allowed for the whole generation
+    :param first_token_timeout: Seconds allowed until the first streamed token
+    """
+
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        vector_db_retriever: Union[VectorDatabase, ConcurrentVectorDatabase],
+        system_prompt: Optional[SystemRolePrompt] = None,
+        user_prompt: Optional[UserRolePrompt] = None,
+        response_style: str = "detailed",
+        include_scores: bool = False,
+        k: int = 4,
+        packer: Optional[ContextPacker] = None,
+        max_concurrent_retrievals: int = 32,
+        max_concurrent_generations: int = 16,
+        embed_timeout: Optional[float] = 10.0,
+        search_timeout: Optional[float] = 5.0,
+        generate_timeout: Optional[float] = 120.0,
+        first_token_timeout: Optional[float] = 30.0,
+    ):
+        self.llm = llm
+        self.vector_db_retriever = vector_db_retriever
+        self.system_prompt = system_prompt or SystemRolePrompt(
+            RAG_SYSTEM_TEMPLATE,
+            strict=True,
+            defaults={"response_style": "concise", "response_length": "brief"},
+        )
+        self.user_prompt = user_prompt or UserRolePrompt(
+            RAG_USER_TEMPLATE,
+            strict=True,
+            defaults={"context_count": "", "similarity_scores": ""},
+        )
+        self.response_style = response_style
+        self.include_scores = include_scores
+        self.k = k
+        self.packer = packer
+        self.max_concurrent_retrievals = max_concurrent_retrievals
+        self.max_concurrent_generations = max_concurrent_generations
+        self.embed_timeout = embed_timeout
+        self.search_timeout = search_timeout
+        self.generate_timeout = generate_timeout
+        self.first_token_timeout = first_token_timeout
+        self._loop = None
+        self._retrieval_slots: Optional[asyncio.Semaphore] = None
+        self._generation_slots: Optional[asyncio.Semaphore] = None
+
+    def _slots(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        # Semaphores bind to the loop they first wait on, so make new ones per loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._retrieval_slots = asyncio.Semaphore(self.max_concurrent_retrievals)
+            self._generation_slots = asyncio.Semaphore(self.max_concurrent_generations)
+        return self._retrieval_slots, self._generation_slots
+
+    def _search(
+        self, query_vector, k: int, filter: Optional[Dict[str, Any]]
+    ) -> Tuple[List[Tuple[str, float]], Optional[Dict[str, int]]]:
+        db = self.vector_db_retriever
+        records = db.search_records(query_vector, k, filter=filter)
+        if self.packer is None:
+            return [(record["text"], record["score"]) for record in records], None
+        chunks, stats = self.packer.select(records, db.unit_vectors([record["id"] for record in records]))
+        return [(chunk["text"], chunk["score"]) for chunk in chunks], stats
+
+    async def aretrieve(
+        self, user_query: str, k: Optional[int] = None, filter: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Embeds ``user_query`` and searches; returns the context list, packing stats and timings."""
+        retrieval_slots, _ = self._slots()
+        timings: Dict[str, float] = {}
+        async with retrieval_slots:
+            start = time.perf_counter()
+            query_vector = await _with_timeout(
+                "embed",
+                self.vector_db_retriever.embedding_model.async_get_embedding(user_query),
+                self.embed_timeout,
+            )
+            timings["embed"] = seconds = time.perf_counter() - start
+            instrumentation.observe("rag.embed", seconds)
+
+            start = time.perf_counter()
+            # Search is numpy-bound; a worker thread keeps the loop serving other requests.
+            context_list, packing = await _with_timeout(
+                "search",
+                asyncio.to_thread(self._search, query_vector, k or self.k, filter),
+                self.search_timeout,
+            )
+            timings["search"] = seconds = time.perf_counter() - start
+            instrumentation.observe("rag.search", seconds)
+        return {"context": context_list, "packing": packing, "timings": timings}
+
+    def build_messages(
+        self, user_query: str, context_list: List[Tuple[str, float]], **system_kwargs
+    ) -> Tuple[Dict[str, str], Dict[str, str], List[str]]:
+        """Renders the system and user messages; also returns the formatted similarity scores."""
+        context_prompt = ""
+        similarity_scores = []
+        for i, (context, score) in enumerate(context_list, 1):
+            context_prompt += f"[Source {i}]: {context}\n\n"
+            similarity_scores.append(f"Source {i}: {score:.3f}")
+
+        system_message = self.system_prompt.create_message(
+            response_style=self.response_style,
+            response_length=system_kwargs.get("response_length", "detailed"),
+        )
+        user_message = self.user_prompt.create_message(
+            user_query=user_query,
+            context=context_prompt.strip(),
+            context_count=len(context_list),
+            similarity_scores=f"Relevance scores: {', '.join(similarity_scores)}" if self.include_scores else "",
+        )
+        return system_message, user_message, similarity_scores
+
+    async def _prepare(
+        self, user_query: str, k: Optional[int], filter: Optional[Dict[str, Any]], system_kwargs: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        instrumentation.increment("rag.requests")
+        retrieved = await self.aretrieve(user_query, k, filter)
+        start = time.perf_counter()
+        system_message, user_message, similarity_scores = self.build_messages(
+            user_query, retrieved["context"], **system_kwargs
+        )
+        retrieved["timings"]["render"] = seconds = time.perf_counter() - start
+        instrumentation.observe("rag.render", seconds)
+        return {
+            "context": retrieved["context"],
+            "context_count": len(retrieved["context"]),
+            "similarity_scores": similarity_scores if self.include_scores else None,
+            "packing": retrieved["packing"],
+            "prompts_used": {"system": system_message, "user": user_message},
+            "timings": retrieved["timings"],
+        }
+
+    async def arun_pipeline(
+        self,
+        user_query: str,
+        k: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        **system_kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Answers ``user_query``; the result matches the notebook pipeline's dict
+        (response, context, context_count, similarity_scores, prompts_used) plus
+        ``packing`` stats and per-stage ``timings``.
+
+        :raises StageTimeoutError: If a stage exceeds its timeout
+        """
+        result = await self._prepare(user_query, k, filter, system_kwargs)
+        _, generation_slots = self._slots()
+        messages = [result["prompts_used"]["system"], result["prompts_used"]["user"]]
+        async with generation_slots:
+            start = time.perf_counter()
+            result["response"] = await _with_timeout("generate", self.llm.arun(messages), self.generate_timeout)
+            result["timings"]["generate"] = seconds = time.perf_counter() - start
+            instrumentation.observe("rag.generate", seconds)
+        return result
+
+    async def astream_pipeline(
+        self,
+        user_query: str,
+        k: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        **system_kwargs,
+    ) -> Dict[str, Any]:
+        """
+        Like :meth:`arun_pipeline`, but returns once retrieval is done, with
+        ``response`` an async iterator of answer tokens. The generation slot is
+        taken when iteration starts and released when it ends.
+        """
+        result = await self._prepare(user_query, k, filter, system_kwargs)
+        messages = [result["prompts_used"]["system"], result["prompts_used"]["user"]]
+        result["response"] = self._stream(messages, result["timings"])
+        return result
+
+    async def _stream(self, messages: List[Dict[str, str]], timings: Dict[str, float]) -> AsyncIterator[str]:
+        _, generation_slots = self._slots()
+        async with generation_slots:
+            start = time.perf_counter()
+            deadline = None if self.generate_timeout is None else start + self.generate_timeout
+            tokens = self.llm.astream(messages)
+            try:
+                first = True
+                while True:
+                    timeout = self.first_token_timeout if first else None
+                    if deadline is not None:
+                        remaining = max(deadline - time.perf_counter(), 0.0)
+                        timeout = remaining if timeout is None else min(timeout, remaining)
+                    try:
+                        token = await _with_timeout(
+                            "first_token" if first else "generate", tokens.__anext__(), timeout
+                        )
+                    except StopAsyncIteration:
+                        break
+                    if first:
+                        timings["first_token"] = seconds = time.perf_counter() - start
+                        instrumentation.observe("rag.first_token", seconds)
+                        first = False
+                    yield token
+            finally:
+                await tokens.aclose()
+                timings["generate"] = seconds = time.perf_counter() - start
+                instrumentation.observe("rag.generate", seconds)
+
+    async def abatch(
+        self,
+        user_queries: List[str],
+        k: Optional[int] = None,
+        filter: Optional[Dict[str, Any]] = None,
+        return_exceptions: bool = False,
+        **system_kwargs,
+    ) -> List[Any]:
+        """Answers many queries concurrently (within the concurrency limits), in input order."""
+        return await asyncio.gather(
+            *[self.arun_pipeline(query, k=k, filter=filter, **system_kwargs) for query in user_queries],
+            return_exceptions=return_exceptions,
+        )
+
+    def run_pipeline(self, user_query: str, k: Optional[int] = None, **system_kwargs) -> Dict[str, Any]:
+        """Sync wrapper around :meth:`arun_pipeline` for scripts and notebooks without a running loop."""
+
+        async def run() -> Dict[str, Any]:
+            try:
+                return await self.arun_pipeline(user_query, k=k, **system_kwargs)
+            finally:
+                # Async clients are bound to this loop, which asyncio.run closes on return.
+                for model in (self.llm, self.vector_db_retriever.embedding_model):
+                    aclose = getattr(model, "aclose", None)
+                    if aclose is not None:
+                        await aclose()
+
+        return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    vector_db = VectorDatabase()
+    vector_db = asyncio.run(vector_db.abuild_from_list([
+        "I like to eat broccoli and bananas.",
+        "I ate a banana and spinach smoothie for breakfast.",
+        "Chinchillas and kittens are cute.",
+        "My sister adopted a kitten yesterday.",
+        "Look at this cute hamster munching on a piece of broccoli.",
+    ]))
+    pipeline = AsyncRAGPipeline(ChatOpenAI(), vector_db, include_scores=True, k=2)
+
+    async def main():
+        result = await pipeline.astream_pipeline("What do I like to eat?")
+        async for token in result["response"]:
+            print(token, end="", flush=True)
+        print()
+        print(result["similarity_scores"], result["timings"])
+
+    asyncio.run(main())
@@ -0,0 +1,405 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import queue
+import shutil
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from aimakerspace import instrumentation
+from aimakerspace.openai_utils.embedding import EmbeddingModel
+from aimakerspace.vector_store import top_k_indices, top_k_indices_2d
+
+_BLOCK_ROWS = 65536
+
+
+def shard_for_ids(ids: np.ndarray, n_shards: int) -> np.ndarray:
+    """Shard of each id: a multiplicative hash, so runs of ids spread evenly."""
+    mixed = (np.asarray(ids, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(32)
+    return (mixed % np.uint64(n_shards)).astype(np.int64)
+
+
+class _Segment:
+    """
+    One shard's vectors in a memory-mapped ``.npy`` file, grown by doubling.
+
+    Rows live in the page cache rather than on the worker's heap, so a shard can
+    be larger than the memory its process could comfortably allocate. The file is
+    always new: ids and deletions are not persisted, so an existing one cannot be
+    reopened and is never overwritten.
+    """
+
+    def __init__(self, path: str, dim: int, dtype, initial_capacity: int = 1024):
+        if os.path.exists(path):
+            raise FileExistsError(f"Shard file already exists: {path}")
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.size = 0
+        self.ids = np.empty(initial_capacity, dtype=np.int64)
+        self.alive = np.zeros(initial_capacity, dtype=bool)
+        self.matrix = np.lib.format.open_memmap(path, mode="w+", dtype=self.dtype, shape=(initial_capacity, dim))
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = len(self.ids)
+        while capacity < min_capacity:
+            capacity *= 2
+        grown_path = self.path + ".grow"
+        matrix = np.lib.format.open_memmap(grown_path, mode="w+", dtype=self.dtype, shape=(capacity, self.dim))
+        matrix[: self.size] = self.matrix[: self.size]
+        matrix.flush()
+        del self.matrix
+        os.replace(grown_path, self.path)
+        self.matrix = matrix
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[: self.size] = self.ids[: self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self.size] = self.alive[: self.size]
+        self.ids, self.alive = ids, alive
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray) -> None:
+        if self.size + len(ids) > len(self.ids):
+            self._grow(self.size + len(ids))
+        end = self.size + len(ids)
+        self.matrix[self.size : end] = vectors
+        self.ids[self.size : end] = ids
+        self.alive[self.size : end] = True
+        self.size = end
+
+    def delete(self, ids: np.ndarray) -> int:
+        rows = np.flatnonzero(np.isin(self.ids[: self.size], ids) & self.alive[: self.size])
+        self.alive[rows] = False
+        return len(rows)
+
+    def search(self, queries: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (ids, scores) per query, scanning the file one block at a time."""
+        candidate_rows, candidate_scores = [], []
+        for start in range(0, self.size, _BLOCK_ROWS):
+            end = min(start + _BLOCK_ROWS, self.size)
+            scores = queries @ np.asarray(self.matrix[start:end], dtype=np.float32).T
+            dead = ~self.alive[start:end]
+            if dead.any():
+                scores[:, dead] = -np.inf
+            best = top_k_indices_2d(scores, k)
+            candidate_rows.append(best + start)
+            candidate_scores.append(np.take_along_axis(scores, best, axis=1))
+        if not candidate_rows:
+            empty = np.empty(0, dtype=np.int64)
+            return [(empty, empty.astype(np.float32)) for _ in queries]
+        rows = np.concatenate(candidate_rows, axis=1)
+        scores = np.concatenate(candidate_scores, axis=1)
+        results = []
+        for query_rows, query_scores in zip(rows, scores):
+            best = top_k_indices(query_scores, k)
+            best = best[np.isfinite(query_scores[best])]
+            results.append((self.ids[query_rows[best]], query_scores[best]))
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "rows": self.size,
+            "live_rows": int(self.alive[: self.size].sum()),
+            "capacity": len(self.ids),
+            "file_bytes": os.path.getsize(self.path),
+        }
+
+
+def _serve_shard(connections, path: str, dim: int, dtype) -> None:
+    """
+    Worker loop: owns one :class:`_Segment` and answers commands from the
+    coordinator, taking them from whichever of its channels has one waiting.
+    """
+    segment = _Segment(path, dim, dtype)
+    handlers = {
+        "add": segment.add,
+        "delete": segment.delete,
+        "search": segment.search,
+        "stats": segment.stats,
+    }
+    open_connections = list(connections)
+    while open_connections:
+        for connection in multiprocessing.connection.wait(open_connections):
+            try:
+                command, args = connection.recv()
+            except EOFError:
+                open_connections.remove(connection)
+                continue
+            if command == "close":
+                connection.send(("ok", None))
+                open_connections = []
+                break
+            try:
+                connection.send(("ok", handlers[command](*args)))
+            except Exception as error:  # reported to the coordinator, which raises it
+                connection.send(("error", f"{type(error).__name__}: {error}"))
+    for connection in connections:
+        connection.close()
+
+
+class ShardedVectorDatabase:
+    """
+    Vector database partitioned across ``n_shards`` worker processes.
+
+    Each worker owns the vectors of its shard in a memory-mapped file under
+    ``path``, so shards use every core for scoring and together can hold more
+    than one process comfortably fits. Records are routed to a shard by a hash of
+    their id. A search is scattered to all shards at once, and their partial
+    top-k lists are merged here. Texts and metadata stay in this process; each
+    inserted vector is pickled once to its shard, and searches send only query
+    vectors and get (id, score) lists back.
+
+    Every worker is reached through ``max_concurrent_requests`` channels, and each
+    call takes one free channel for all shards, so requests from several threads
+    queue up at the shards instead of waiting for each other here.
+
+    Use it as a context manager, or call :meth:`close`, to stop the workers.
+
+    :param dim: Embedding dimension
+    :param n_shards: Worker processes (defaults to the CPU count)
+    :param path: Directory for the shard files (a temporary one, removed on close, if omitted);
+        it must not already hold shard files, which are never reopened or overwritten
+    :param dtype: Storage dtype, ``np.float32`` or ``np.float16``
+    :param start_method: multiprocessing start method (``"spawn"`` by default, which is
+        safe when the parent holds threads or HTTP clients)
+    :param max_concurrent_requests: Calls that can be in flight at once; further callers
+        wait for a free channel
+    :raises FileExistsError: If ``path`` already holds shard files
+    """
+
+    def __init__(
+        self,
+        dim: int,
+        n_shards: Optional[int] = None,
+        embedding_model: EmbeddingModel = None,
+        path: Optional[str] = None,
+        dtype=np.float32,
+        start_method: str = "spawn",
+        max_concurrent_requests: int = 4,
+    ):
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported dtype: {dtype}. Must be float32 or float16")
+        self.dim = dim
+        self.n_shards = n_shards or os.cpu_count() or 1
+        self._embedding_model = embedding_model
+        self._owns_path = path is None
+        self.path = path or tempfile.mkdtemp(prefix="aimakerspace-shards-")
+        os.makedirs(self.path, exist_ok=True)
+        shard_paths = [os.path.join(self.path, f"shard-{shard}.npy") for shard in range(self.n_shards)]
+        existing = [shard_path for shard_path in shard_paths if os.path.exists(shard_path)]
+        if existing:
+            raise FileExistsError(
+                f"{self.path} already holds shard files ({', '.join(existing)}); use an empty directory"
+            )
+        self._texts: Dict[int, str] = {}
+        self._metadata: Dict[int, Dict[str, Any]] = {}
+        self._next_id = 0
+        self._deleting = set()
+        # Guards the id counter, texts, metadata and ids being deleted; shard requests go through channels instead.
+        self._lock = threading.Lock()
+        context = multiprocessing.get_context(start_method)
+        # _channels[c][shard] is the coordinator's end of channel c to that shard's worker.
+        self._channels = [[] for _ in range(max_concurrent_requests)]
+        self._free_channels: "queue.Queue[list]" = queue.Queue()
+        self._workers = []
+        for shard_path in shard_paths:
+            pipes = [context.Pipe() for _ in range(max_concurrent_requests)]
+            worker = context.Process(
+                target=_serve_shard,
+                args=([child for _, child in pipes], shard_path, dim, dtype),
+                daemon=True,
+            )
+            worker.start()
+            for channel, (parent, child) in zip(self._channels, pipes):
+                child.close()
+                channel.append(parent)
+            self._workers.append(worker)
+        for channel in self._channels:
+            self._free_channels.put(channel)
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    def __enter__(self) -> "ShardedVectorDatabase":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _scatter(self, requests: Dict[int, Tuple[str, tuple]]) -> Dict[int, Any]:
+        """
+        Sends each shard its request over a free channel, then gathers every reply
+        (the shards work in parallel).
+        """
+        channel = self._free_channels.get()
+        pending: List[int] = []
+        replies = {}
+        try:
+            for shard, request in requests.items():
+                channel[shard].send(request)
+                pending.append(shard)
+            while pending:
+                replies[pending[0]] = channel[pending[0]].recv()
+                pending.pop(0)
+        finally:
+            # After a failure, read the replies still owed so they do not reach the channel's next user.
+            for shard in pending:
+                try:
+                    channel[shard].recv()
+                except (EOFError, OSError):
+                    pass
+            self._free_channels.put(channel)
+        for shard, (status, value) in replies.items():
+            if status == "error":
+                raise RuntimeError(f"Shard {shard} failed: {value}")
+        return {shard: value for shard, (_, value) in replies.items()}
+
+    @staticmethod
+    def _normalise(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+    def add_many(
+        self,
+        texts: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Adds a batch of records, each to the shard its id hashes to, and returns their ids."""
+        if len(texts) == 0:
+            return []
+        vectors = self._normalise(vectors)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        # Texts are recorded first, so any id a shard returns can be resolved.
+        with self._lock:
+            ids = np.arange(self._next_id, self._next_id + len(texts), dtype=np.int64)
+            self._next_id += len(texts)
+            for record_id, text, metadata in zip(ids.tolist(), texts, metadatas or [None] * len(texts)):
+                self._texts[record_id] = text
+                if metadata:
+                    self._metadata[record_id] = metadata
+        shards = shard_for_ids(ids, self.n_shards)
+        try:
+            self._scatter({
+                shard: ("add", (ids[shards == shard], vectors[shards == shard]))
+                for shard in np.unique(shards).tolist()
+            })
+        except BaseException:
+            self.delete_ids(ids.tolist())
+            raise
+        return ids.tolist()
+
+    def add(self, text: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> int:
+        return self.add_many([text], [vector], [metadata])[0]
+
+    def delete_ids(self, ids: List[int]) -> int:
+        """Removes records by id and returns how many existed."""
+        with self._lock:
+            existing = list(dict.fromkeys(
+                record_id for record_id in ids if record_id in self._texts and record_id not in self._deleting
+            ))
+            self._deleting.update(existing)
+        if not existing:
+            return 0
+        ids = np.asarray(existing, dtype=np.int64)
+        shards = shard_for_ids(ids, self.n_shards)
+        try:
+            self._scatter({shard: ("delete", (ids[shards == shard],)) for shard in np.unique(shards).tolist()})
+        finally:
+            # Texts are dropped once the shards stop returning the ids, so searches already under way can resolve them.
+            with self._lock:
+                for record_id in existing:
+                    del self._texts[record_id]
+                    self._metadata.pop(record_id, None)
+                self._deleting.difference_update(existing)
+        return len(ids)
+
+    def _search_ids(self, query_vectors: np.ndarray, k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = self._normalise(query_vectors)
+        instrumentation.increment("sharded.queries", len(queries))
+        with instrumentation.span("sharded.search"):
+            partials = self._scatter({shard: ("search", (queries, k)) for shard in range(self.n_shards)})
+        results = []
+        for query in range(len(queries)):
+            ids = np.concatenate([partials[shard][query][0] for shard in range(self.n_shards)])
+            scores = np.concatenate([partials[shard][query][1] for shard in range(self.n_shards)])
+            best = top_k_indices(scores, k)
+            results.append((ids[best], scores[best]))
+        return results
+
+    def _records(self, ids: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        records = []
+        for record_id, score in zip(ids.tolist(), scores.tolist()):
+            text = self._texts.get(record_id)
+            if text is not None:
+                records.append(
+                    {"id": record_id, "text": text, "score": score, "metadata": self._metadata.get(record_id, {})}
+                )
+        return records
+
+    def _results(self, ids: np.ndarray, scores: np.ndarray) -> List[Tuple[str, float]]:
+        return [(record["text"], record["score"]) for record in self._records(ids, scores)]
+
+    def search(self, query_vector: np.array, k: int) -> List[Tuple[str, float]]:
+        """Cosine top-k (text, score) pairs across every shard."""
+        return self._results(*self._search_ids(query_vector, k)[0])
+
+    def search_many(self, query_vectors: np.array, k: int) -> List[List[Tuple[str, float]]]:
+        """Cosine top-k for a batch of queries, sent to the shards as one request each."""
+        return [self._results(ids, scores) for ids, scores in self._search_ids(query_vectors, k)]
+
+    def search_records(self, query_vector: np.array, k: int) -> List[Dict[str, Any]]:
+        """Like :meth:`search`, but returns dicts with id, text, score and metadata."""
+        return self._records(*self._search_ids(query_vector, k)[0])
+
+    def search_by_text(self, query_text: str, k: int, return_as_text: bool = False) -> List[Tuple[str, float]]:
+        query_vector = self.embedding_model.get_embedding(query_text)
+        results = self.search(query_vector, k)
+        return [result[0] for result in results] if return_as_text else results
+
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> "ShardedVectorDatabase":
+        embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
+        self.add_many(list_of_text, embeddings, metadatas)
+        return self
+
+    def stats(self) -> List[Dict[str, int]]:
+        """Per-shard rows, live rows, capacity and file size."""
+        replies = self._scatter({shard: ("stats", ()) for shard in range(self.n_shards)})
+        return [replies[shard] for shard in range(self.n_shards)]
+
+    def close(self) -> None:
+        """Stops the workers and, if the shard directory was temporary, removes it."""
+        if not self._workers:
+            return
+        for connection in self._channels[0]:
+            try:
+                connection.send(("close", ()))
+                connection.recv()
+            except (EOFError, OSError):
+                pass
+        for channel in self._channels:
+            for connection in channel:
+                connection.close()
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._workers, self._channels = [], []
+        if self._owns_path:
+            shutil.rmtree(self.path, ignore_errors=True)
@@ -1,5 +1,29 @@
+import copy
+import mmap
 import os
-from typing import List
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import IO, Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from aimakerspace import instrumentation
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to an approximation
+    tiktoken = None
+
+
+class Chunk(NamedTuple):
+    """A chunk of text and where it came from: characters ``[start_char, end_char)`` of ``source``."""
+
+    text: str
+    source: str
+    start_char: int
+    end_char: int
 
 
 class TextFileLoader:
@@ -9,27 +33,42 @@ class TextFileLoader:
         self.encoding = encoding
 
     def load(self):
-        if os.path.isdir(self.path):
-            self.load_directory()
-        elif os.path.isfile(self.path) and self.path.endswith(".txt"):
-            self.load_file()
-        else:
-            raise ValueError(
-                "Provided path is neither a valid directory nor a .txt file."
-            )
+        with instrumentation.span("loader.load"):
+            if os.path.isdir(self.path):
+                self.load_directory()
+            elif os.path.isfile(self.path) and self.path.endswith(".txt"):
+                self.load_file()
+            else:
+                raise ValueError(
+                    "Provided path is neither a valid directory nor a .txt file."
+                )
 
-    def load_file(self):
-        with open(self.path, "r", encoding=self.encoding) as f:
+    def _read(self, path: str) -> None:
+        with open(path, "r", encoding=self.encoding) as f:
             self.documents.append(f.read())
+        instrumentation.increment("loader.files")
+        instrumentation.increment("loader.chars", len(self.documents[-1]))
+
+    def load_file(self):
+        self._read(self.path)
 
     def load_directory(self):
+        for path in self.iter_paths():
+            self._read(path)
+
+    def iter_paths(self) -> Iterator[str]:
+        """Yields the .txt file paths :meth:`load` would read, without reading them."""
+        if os.path.isfile(self.path) and self.path.endswith(".txt"):
+            yield self.path
+            return
+        if not os.path.isdir(self.path):
+            raise ValueError(
+                "Provided path is neither a valid directory nor a .txt file."
+            )
         for root, _, files in os.walk(self.path):
             for file in files:
                 if file.endswith(".txt"):
-                    with open(
-                        os.path.join(root, file), "r", encoding=self.encoding
-                    ) as f:
-                        self.documents.append(f.read())
+                    yield os.path.join(root, file)
 
     def load_documents(self):
         self.load()
@@ -49,12 +88,231 @@ class CharacterTextSplitter:
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
 
+    def split_offsets(self, text_length: int) -> List[Tuple[int, int]]:
+        """The ``(start, end)`` character offsets :meth:`split` cuts a text of this length at."""
+        step = self.chunk_size - self.chunk_overlap
+        return [(i, min(i + self.chunk_size, text_length)) for i in range(0, text_length, step)]
+
     def split(self, text: str) -> List[str]:
         chunks = []
         for i in range(0, len(text), self.chunk_size - self.chunk_overlap):
             chunks.append(text[i : i + self.chunk_size])
         return chunks
 
+    def iter_split_stream(self, stream: IO[str], block_size: int = 1 << 16) -> Iterator[str]:
+        """
+        Yields the same chunks as :meth:`split` while reading ``stream`` in blocks,
+        so at most ``chunk_size + block_size`` characters are held in memory.
+        """
+        step = self.chunk_size - self.chunk_overlap
+        buffer, start, eof = "", 0, False
+        while True:
+            while not eof and len(buffer) - start < self.chunk_size:
+                block = stream.read(block_size)
+                if block:
+                    buffer, start = buffer[start:] + block, 0
+                else:
+                    eof = True
+            if start >= len(buffer):
+                return
+            yield buffer[start : start + self.chunk_size]
+            start += step
+
+    def split_texts(self, texts: List[str]) -> List[str]:
+        chunks = []
+        for text in texts:
+            chunks.extend(self.split(text))
+        return chunks
+
+
+_APPROXIMATE_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_PARAGRAPH_PATTERN = re.compile(r".*?(?:\n[ \t]*\n\s*|\Z)", re.S)
+_SENTENCE_PATTERN = re.compile(r".*?(?:[.!?]+(?:\s+|\Z)|\Z)", re.S)
+_WORD_PATTERN = re.compile(r"\s*\S+\s*|\s+")
+
+
+def approximate_token_count(text: str) -> int:
+    """Counts words and punctuation marks; close to BPE counts for English prose."""
+    return len(_APPROXIMATE_TOKEN_PATTERN.findall(text))
+
+
+class TiktokenCounter:
+    """Exact token counter for a tiktoken encoding; pickles by name, so it can be sent to worker processes."""
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = tiktoken.get_encoding(encoding_name)
+
+    def __call__(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    def __reduce__(self):
+        return TiktokenCounter, (self.encoding_name,)
+
+
+def default_token_counter(encoding_name: str = "cl100k_base") -> Callable[[str], int]:
+    """tiktoken's exact counter when tiktoken is installed, else :func:`approximate_token_count`."""
+    if tiktoken is None:
+        return approximate_token_count
+    return TiktokenCounter(encoding_name)
+
+
+class TokenTextSplitter:
+    """
+    Splits text into chunks of at most ``chunk_tokens`` tokens, cutting at the
+    coarsest boundary that fits: paragraphs, then sentences, then words.
+
+    Chunk lengths are accumulated from the token counts of their pieces rather
+    than by re-tokenizing each candidate window, and piece counts are memoized in
+    an LRU cache, so repeated boilerplate is only tokenized once. That sum is only
+    an estimate (BPE tokens can span piece boundaries), so each finished chunk is
+    counted once more as a whole; trailing pieces that push it over the budget
+    move to the next chunk. Reported counts are exact, and produced chunks are
+    added to the same cache, so :meth:`count_tokens` can be passed as the
+    ``token_counter`` of an ``EmbeddingScheduler`` to pack requests by exact size.
+
+    :param chunk_tokens: Token budget per chunk
+    :param chunk_overlap_tokens: Tokens of trailing pieces repeated at the start of the next chunk
+    :param min_fill: Fraction of the budget a chunk must reach before a piece that
+        does not fit starts a new chunk instead of being split further
+    :param token_counter: Callable returning the token count of a string
+    :param cache_size: Maximum number of memoized token counts
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = 512,
+        chunk_overlap_tokens: int = 0,
+        min_fill: float = 0.75,
+        token_counter: Optional[Callable[[str], int]] = None,
+        cache_size: int = 100_000,
+    ):
+        assert (
+            chunk_tokens > chunk_overlap_tokens
+        ), "Chunk size must be greater than chunk overlap"
+
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.min_fill = min_fill
+        self.token_counter = token_counter or default_token_counter()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def count_tokens(self, text: str) -> int:
+        """Memoized token count of ``text``."""
+        count = self._cache.get(text)
+        if count is not None:
+            self.cache_hits += 1
+            self._cache.move_to_end(text)
+            return count
+        self.cache_misses += 1
+        count = self.token_counter(text)
+        self._remember(text, count)
+        return count
+
+    def __getstate__(self):
+        # Copies sent to worker processes start with an empty cache.
+        state = self.__dict__.copy()
+        state["_cache"] = OrderedDict()
+        return state
+
+    def _remember(self, text: str, count: int) -> None:
+        self._cache[text] = count
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _pieces(self, text: str, level: int) -> List[str]:
+        """Splits ``text`` one level finer: 1 = sentences, 2 = words, 3 = hard cuts."""
+        if level == 1:
+            pattern = _SENTENCE_PATTERN
+        elif level == 2:
+            pattern = _WORD_PATTERN
+        else:
+            return self._hard_cut(text)
+        return [piece for piece in pattern.findall(text) if piece]
+
+    def _hard_cut(self, text: str) -> List[str]:
+        # A single "word" longer than the budget: halve it until the parts fit.
+        if len(text) <= 1 or self.count_tokens(text) <= self.chunk_tokens:
+            return [text]
+        middle = len(text) // 2
+        return self._hard_cut(text[:middle]) + self._hard_cut(text[middle:])
+
+    def split_with_counts(self, text: str) -> List[Tuple[str, int]]:
+        """Returns ``(chunk, token_count)`` pairs."""
+        chunks: List[Tuple[str, int]] = []
+        pieces: List[Tuple[str, int]] = []
+        total = 0
+        # Leading overlap pieces carried over from the previous chunk.
+        carried_pieces = 0
+        # Pieces pushed out of the last chunk, still waiting in ``pieces``.
+        pending = False
+
+        def flush() -> None:
+            nonlocal pieces, total, carried_pieces, pending
+            if not pieces:
+                pending = False
+                return
+            keep = len(pieces)
+            chunk = "".join(piece for piece, _ in pieces).strip()
+            count = self.count_tokens(chunk) if chunk else 0
+            # Every chunk takes at least one new piece; the overlap is dropped if it leaves no room.
+            while count > self.chunk_tokens and keep > 1:
+                if keep == carried_pieces + 1:
+                    pieces, carried_pieces = pieces[carried_pieces:], 0
+                    keep = len(pieces) + 1
+                keep -= 1
+                chunk = "".join(piece for piece, _ in pieces[:keep]).strip()
+                count = self.count_tokens(chunk) if chunk else 0
+            if chunk:
+                chunks.append((chunk, count))
+            # Carry whole trailing pieces forward as overlap.
+            carried: List[Tuple[str, int]] = []
+            carried_total = 0
+            for piece, piece_count in reversed(pieces[:keep]):
+                if carried_total + piece_count > self.chunk_overlap_tokens:
+                    break
+                carried.insert(0, (piece, piece_count))
+                carried_total += piece_count
+            overflow = pieces[keep:]
+            pending = bool(overflow)
+            pieces = carried + overflow
+            carried_pieces = len(carried)
+            total = carried_total + sum(piece_count for _, piece_count in overflow)
+
+        def add(piece: str, level: int) -> None:
+            nonlocal total
+            count = self.count_tokens(piece)
+            if total + count <= self.chunk_tokens:
+                pieces.append((piece, count))
+                total += count
+                return
+            if count <= self.chunk_tokens and (total >= self.min_fill * self.chunk_tokens or level >= 2):
+                flush()
+                while pending and total + count > self.chunk_tokens:
+                    flush()
+                if total + count > self.chunk_tokens:
+                    pieces.clear()
+                    total = carried_pieces = 0
+                pieces.append((piece, count))
+                total += count
+                return
+            for sub_piece in self._pieces(piece, level + 1):
+                add(sub_piece, level + 1)
+
+        for paragraph in _PARAGRAPH_PATTERN.findall(text):
+            if paragraph:
+                add(paragraph, 0)
+        flush()
+        while pending:
+            flush()
+        return chunks
+
+    def split(self, text: str) -> List[str]:
+        return [chunk for chunk, _ in self.split_with_counts(text)]
+
     def split_texts(self, texts: List[str]) -> List[str]:
         chunks = []
         for text in texts:
@@ -62,6 +320,173 @@ class CharacterTextSplitter:
         return chunks
 
 
+class ChunkRef(NamedTuple):
+    """A chunk stored only as UTF-8 byte offsets ``[start_byte, end_byte)`` into document ``doc_id`` of a corpus."""
+
+    doc_id: int
+    start_byte: int
+    end_byte: int
+
+
+class MappedCorpus:
+    """
+    Read-only memory maps over source files, addressed by document id.
+
+    Chunks are cut as byte offsets over the maps, so splitting never copies text;
+    :meth:`text` decodes a chunk only when it is actually needed. Offsets are in
+    bytes, which equal characters for ASCII text; for other UTF-8 text chunk
+    boundaries are moved forward to the next character start.
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        if encoding.replace("-", "").lower() not in ("utf8", "ascii"):
+            raise ValueError(f"MappedCorpus supports utf-8 and ascii files, not {encoding}")
+        self.encoding = encoding
+        self.paths: List[str] = []
+        self._maps: List[Optional[mmap.mmap]] = []
+
+    @classmethod
+    def from_loader(cls, loader: "TextFileLoader") -> "MappedCorpus":
+        corpus = cls(encoding=loader.encoding)
+        for path in loader.iter_paths():
+            corpus.add_file(path)
+        return corpus
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def add_file(self, path: str) -> int:
+        """Maps ``path`` and returns its document id."""
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # Zero-length files cannot be mapped.
+            self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None)
+        self.paths.append(path)
+        return len(self.paths) - 1
+
+    def size(self, doc_id: int) -> int:
+        buffer = self._maps[doc_id]
+        return 0 if buffer is None else len(buffer)
+
+    def _snap(self, buffer: mmap.mmap, position: int) -> int:
+        # Skip UTF-8 continuation bytes (0b10xxxxxx) so a chunk never starts or ends mid-character.
+        while position < len(buffer) and buffer[position] & 0xC0 == 0x80:
+            position += 1
+        return position
+
+    def iter_refs(self, splitter: "CharacterTextSplitter", doc_id: int) -> Iterator[ChunkRef]:
+        """Yields the chunks of one document as offsets, using the splitter's size and overlap."""
+        buffer = self._maps[doc_id]
+        if buffer is None:
+            return
+        size = len(buffer)
+        step = splitter.chunk_size - splitter.chunk_overlap
+        for i in range(0, size, step):
+            start = self._snap(buffer, i)
+            if start >= size:
+                return
+            yield ChunkRef(doc_id, start, self._snap(buffer, min(i + splitter.chunk_size, size)))
+
+    def split(self, splitter: "CharacterTextSplitter") -> np.ndarray:
+        """Offsets of every chunk in the corpus as an ``(n, 3)`` int64 array of (doc_id, start, end)."""
+        refs = [ref for doc_id in range(len(self.paths)) for ref in self.iter_refs(splitter, doc_id)]
+        return np.array(refs, dtype=np.int64).reshape(-1, 3)
+
+    def text(self, ref: Sequence[int]) -> str:
+        """Decodes the text of one chunk."""
+        doc_id, start, end = (int(value) for value in ref)
+        buffer = self._maps[doc_id]
+        return "" if buffer is None else buffer[start:end].decode(self.encoding)
+
+    def texts(self, refs: Sequence[Sequence[int]]) -> List[str]:
+        return [self.text(ref) for ref in refs]
+
+    def close(self) -> None:
+        for buffer in self._maps:
+            if buffer is not None:
+                buffer.close()
+        self._maps = [None] * len(self._maps)
+
+    def __enter__(self) -> "MappedCorpus":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+_worker = threading.local()
+
+
+def _init_worker(splitter) -> None:
+    # Each worker thread or process splits with its own copy of the caller's splitter.
+    _worker.splitter = copy.deepcopy(splitter)
+
+
+def split_with_offsets(splitter, text: str, source: str = "") -> List[Chunk]:
+    """
+    Splits ``text`` with any splitter and records where each chunk came from, as
+    character offsets into ``text`` (unlike the byte offsets of a :class:`ChunkRef`).
+
+    A plain :class:`CharacterTextSplitter` reports its cut points directly; for other
+    splitters each chunk is located in ``text`` after the start of the previous one.
+
+    :raises ValueError: If a chunk is not a substring of ``text``
+    """
+    if type(splitter).split is CharacterTextSplitter.split and hasattr(splitter, "split_offsets"):
+        return [Chunk(text[start:end], source, start, end) for start, end in splitter.split_offsets(len(text))]
+    chunks = []
+    position = 0
+    for chunk in splitter.split(text):
+        start = text.find(chunk, position)
+        if start < 0:
+            raise ValueError(
+                f"{type(splitter).__name__} produced a chunk that is not a substring of {source or 'the text'}"
+            )
+        chunks.append(Chunk(chunk, source, start, start + len(chunk)))
+        position = start
+    return chunks
+
+
+def _load_and_split_file(job: Tuple[str, str]) -> List[Chunk]:
+    path, encoding = job
+    with open(path, "r", encoding=encoding) as f:
+        text = f.read()
+    return split_with_offsets(_worker.splitter, text, path)
+
+
+def load_and_split_parallel(
+    path: str,
+    splitter: Optional[CharacterTextSplitter] = None,
+    max_workers: Optional[int] = None,
+    use_threads: bool = False,
+    encoding: str = "utf-8",
+    files_per_task: int = 16,
+) -> List[Chunk]:
+    """
+    Loads and splits every .txt file under ``path`` across a pool of workers.
+
+    Files are sharded across workers ``files_per_task`` at a time. Chunks come back
+    in the same deterministic order as the serial loader + splitter, each with
+    its source path and character offsets (``start_char``/``end_char``).
+
+    :param splitter: Any splitter with ``split(text)`` (a :class:`CharacterTextSplitter`
+        by default); each worker gets its own copy, so with processes it must be picklable
+    :param max_workers: Pool size (defaults to the CPU count)
+    :param use_threads: Use a thread pool instead of processes (cheaper start-up,
+        but only the I/O overlaps because of the GIL)
+    """
+    splitter = splitter or CharacterTextSplitter()
+    jobs = [(file_path, encoding) for file_path in TextFileLoader(path, encoding=encoding).iter_paths()]
+    executor_class = ThreadPoolExecutor if use_threads else ProcessPoolExecutor
+    executor = executor_class(max_workers=max_workers, initializer=_init_worker, initargs=(splitter,))
+    with instrumentation.span("loader.load_and_split"), executor:
+        kwargs = {} if use_threads else {"chunksize": files_per_task}
+        chunks = [chunk for chunks in executor.map(_load_and_split_file, jobs, **kwargs) for chunk in chunks]
+    instrumentation.increment("loader.files", len(jobs))
+    instrumentation.increment("loader.chunks", len(chunks))
+    return chunks
+
+
 if __name__ == "__main__":
     loader = TextFileLoader("data/KingLear.txt")
     loader.load()
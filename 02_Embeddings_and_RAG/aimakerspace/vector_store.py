@@ -0,0 +1,240 @@
+import numpy as np
+from typing import Optional
+
+# float16 bits shifted into float32 position read as the value times 2**-112.
+HALF_SCALE = np.float32(2.0 ** 112)
+# Clears float32 exponent bits 28-30, which the int16 sign extension sets for negative values.
+_HALF_MASK = np.int32(-0x70000001)  # 0x8FFFFFFF
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Returns the indices of the ``k`` largest scores, best first."""
+    n = scores.shape[0]
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def top_k_indices_2d(scores: np.ndarray, k: int) -> np.ndarray:
+    """Row-wise :func:`top_k_indices` for a ``(queries, n)`` score matrix."""
+    n = scores.shape[1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        candidates = np.tile(np.arange(n), (scores.shape[0], 1))
+    order = np.argsort(-np.take_along_axis(scores, candidates, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+class MatrixStore:
+    """
+    Growable, contiguous matrix of L2-normalised embeddings.
+
+    Rows are stored pre-normalised so cosine similarity against the whole
+    store is a single matrix-vector product. The original norms are kept
+    alongside, always as float32 whatever the row dtype, so the raw vectors can
+    still be reconstructed.
+    """
+
+    def __init__(self, dim: Optional[int] = None, dtype=np.float32, initial_capacity: int = 1024):
+        self.dtype = np.dtype(dtype)
+        self.dim = dim
+        self._capacity = max(1, initial_capacity)
+        self._size = 0
+        self._matrix = None
+        self._norms = None
+        self._alive = None
+        self.deleted_count = 0
+        if dim is not None:
+            self._allocate(dim)
+
+    @classmethod
+    def from_arrays(cls, matrix: np.ndarray, norms: np.ndarray) -> "MatrixStore":
+        """
+        Wraps existing normalised rows and norms without copying them.
+
+        ``matrix`` may be a read-only memory map; it is copied into memory the
+        first time the store is written to.
+        """
+        store = cls(dtype=matrix.dtype, initial_capacity=len(matrix))
+        store.dim = matrix.shape[1]
+        store._matrix, store._norms = matrix, norms
+        store._alive = np.ones(len(matrix), dtype=bool)
+        store._size = len(matrix)
+        return store
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the normalised rows currently in use."""
+        if self._matrix is None:
+            return np.empty((0, self.dim or 0), dtype=self.dtype)
+        return self._matrix[: self._size]
+
+    @property
+    def norms(self) -> np.ndarray:
+        if self._norms is None:
+            return np.empty(0, dtype=np.float32)
+        return self._norms[: self._size]
+
+    @property
+    def alive(self) -> np.ndarray:
+        """Boolean mask of rows that have not been deleted."""
+        if self._alive is None:
+            return np.empty(0, dtype=bool)
+        return self._alive[: self._size]
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the vectors and norms of the rows in use."""
+        return self.matrix.nbytes + self.norms.nbytes
+
+    def resident_bytes(self) -> int:
+        """:meth:`memory_bytes` not counting memory-mapped arrays, which the OS pages in from disk on demand."""
+        return sum(array.nbytes for array in (self.matrix, self.norms) if not isinstance(array, np.memmap))
+
+    def _allocate(self, dim: int) -> None:
+        self.dim = dim
+        self._matrix = np.zeros((self._capacity, dim), dtype=self.dtype)
+        self._norms = np.zeros(self._capacity, dtype=np.float32)
+        self._alive = np.zeros(self._capacity, dtype=bool)
+
+    def _make_writeable(self) -> None:
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix)
+            self._norms = np.array(self._norms)
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = self._capacity
+        while capacity < min_capacity:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=self.dtype)
+        matrix[: self._size] = self._matrix[: self._size]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[: self._size] = self._norms[: self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._matrix, self._norms, self._alive, self._capacity = matrix, norms, alive, capacity
+
+    def _normalise(self, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if self.dim is None:
+            self._allocate(vectors.shape[1])
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+        norms = np.linalg.norm(vectors, axis=1)
+        safe = np.where(norms == 0, 1.0, norms)
+        return vectors / safe[:, None], norms
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """Appends one or more vectors and returns their row ids."""
+        normalised, norms = self._normalise(vectors)
+        count = normalised.shape[0]
+        if self._size + count > self._capacity:
+            self._grow(self._size + count)
+        start = self._size
+        self._matrix[start : start + count] = normalised
+        self._norms[start : start + count] = norms
+        self._alive[start : start + count] = True
+        self._size += count
+        return np.arange(start, start + count)
+
+    def set(self, row: int, vector: np.ndarray) -> None:
+        """Overwrites the vector stored at ``row``."""
+        normalised, norms = self._normalise(vector)
+        self._make_writeable()
+        self._matrix[row] = normalised[0]
+        self._norms[row] = norms[0]
+
+    def delete(self, rows) -> None:
+        """Tombstones ``rows``; they score ``-inf`` until :meth:`compact` drops them."""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        rows = rows[self._alive[rows]]
+        self._alive[rows] = False
+        self.deleted_count += len(rows)
+
+    def compact(self) -> np.ndarray:
+        """
+        Drops deleted rows, packing live rows to the front in their existing order.
+
+        :return: Array mapping each old row to its new row, or -1 if it was deleted
+        """
+        alive = self.alive.copy()
+        mapping = np.full(self._size, -1, dtype=np.int64)
+        mapping[alive] = np.arange(int(alive.sum()))
+        matrix, norms = self.matrix[alive], self.norms[alive]
+        self._capacity = max(1, len(matrix))
+        self._size = 0
+        self.deleted_count = 0
+        self._allocate(self.dim)
+        if len(matrix):
+            self._matrix[: len(matrix)] = matrix
+            self._norms[: len(matrix)] = norms
+            self._alive[: len(matrix)] = True
+            self._size = len(matrix)
+        return mapping
+
+    def get(self, row: int) -> np.ndarray:
+        """Reconstructs the original (un-normalised) vector at ``row``."""
+        return self._matrix[row].astype(np.float32) * self._norms[row]
+
+    def normalise_query(self, query_vector: np.ndarray) -> np.ndarray:
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query, axis=-1, keepdims=True)
+        return query / np.where(norm == 0, 1.0, norm)
+
+    def _blocks(self, block_rows: int = 1024):
+        """
+        Yields ``(start, float32 block)`` pairs and the factor to apply to the query.
+
+        float32 storage is yielded whole with factor 1. float16 rows are widened block
+        by block into a reused buffer by moving their bits into float32 position,
+        which is several times faster than ``astype`` but leaves every value scaled by
+        2**-112, so queries are multiplied by :data:`HALF_SCALE`. Blocks are sized to
+        stay in cache.
+        """
+        matrix = self.matrix
+        if matrix.dtype == np.float32:
+            yield 0, matrix, np.float32(1.0)
+            return
+        if matrix.dtype != np.float16:
+            for start in range(0, len(matrix), block_rows):
+                yield start, matrix[start : start + block_rows].astype(np.float32), np.float32(1.0)
+            return
+        bits = matrix.view(np.int16)
+        buffer = np.empty((min(block_rows, len(matrix)), matrix.shape[1]), dtype=np.int32)
+        for start in range(0, len(matrix), block_rows):
+            block = buffer[: min(block_rows, len(matrix) - start)]
+            np.copyto(block, bits[start : start + len(block)])
+            block <<= 13
+            block &= _HALF_MASK
+            yield start, block.view(np.float32), HALF_SCALE
+
+    def scores(self, query_vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a query against every stored row."""
+        query = self.normalise_query(query_vector)
+        scores = np.empty(self._size, dtype=np.float32)
+        for start, block, scale in self._blocks():
+            np.dot(block, query * scale, out=scores[start : start + len(block)])
+        if self.deleted_count:
+            scores[~self.alive] = -np.inf
+        return scores
+
+    def scores_many(self, query_vectors: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each query row against every stored row."""
+        queries = self.normalise_query(np.atleast_2d(query_vectors))
+        scores = np.empty((len(queries), self._size), dtype=np.float32)
+        for start, block, scale in self._blocks():
+            scores[:, start : start + len(block)] = (queries * scale) @ block.T
+        if self.deleted_count:
+            scores[:, ~self.alive] = -np.inf
+        return scores
@@ -1,8 +1,24 @@
+import hashlib
+import json
+import os
 import numpy as np
-from collections import defaultdict
-from typing import List, Tuple, Callable
+from typing import Any, Dict, List, Optional, Tuple, Callable, Union
+from aimakerspace import instrumentation
 from aimakerspace.openai_utils.embedding import EmbeddingModel
-import asyncio
+from aimakerspace.text_utils import (
+    CharacterTextSplitter,
+    Chunk,
+    ChunkRef,
+    MappedCorpus,
+    TextFileLoader,
+    split_with_offsets,
+)
+from aimakerspace.vector_store import MatrixStore, top_k_indices
+from aimakerspace.ann_index import ExactIndex
+from aimakerspace.metadata_index import MetadataStore
+from aimakerspace.context_packing import ContextPacker
+from aimakerspace.lexical_index import BM25Index, reciprocal_rank_fusion
+from aimakerspace.query_cache import SemanticQueryCache
 
 
 def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
@@ -14,24 +30,327 @@ def cosine_similarity(vector_a: np.array, vector_b: np.array) -> float:
 
 
 class VectorDatabase:
-    def __init__(self, embedding_model: EmbeddingModel = None):
-        self.vectors = defaultdict(np.array)
-        self.embedding_model = embedding_model or EmbeddingModel()
+    FORMAT_VERSION = 2
+    VECTORS_FILE = "vectors.npy"
+    NORMS_FILE = "norms.npy"
+    METADATA_FILE = "metadata.json"
+    INDEX_FILE = "index.npz"
 
-    def insert(self, key: str, vector: np.array) -> None:
-        self.vectors[key] = vector
+    def __init__(
+        self,
+        embedding_model: EmbeddingModel = None,
+        index: ExactIndex = None,
+        dtype=np.float32,
+        lexical_index: BM25Index = None,
+        query_cache: SemanticQueryCache = None,
+    ):
+        """
+        :param embedding_model: Model used to embed texts and queries; if omitted, a
+            default :class:`EmbeddingModel` is created the first time one is needed, so
+            a database that only holds precomputed vectors never builds one
+        :param index: Search index over the stored vectors (exact by default)
+        :param dtype: Storage dtype of the normalised vectors, ``np.float32`` or ``np.float16``
+        :param lexical_index: Optional empty :class:`BM25Index`, kept in step with the
+            records, that enables lexical and hybrid search
+        :param query_cache: Optional cache of recent queries for ``search_by_text``,
+            invalidated on every write
+        """
+        self.store = MatrixStore(dtype=dtype)
+        self.index = index or ExactIndex()
+        self.index.attach(self.store)
+        self.metadata = MetadataStore()
+        # Per-row columns, parallel to the store; deleted rows hold None until compaction.
+        # Texts are str, or ChunkRef offsets into self.corpus that are decoded on demand.
+        self._texts: List[Optional[Union[str, ChunkRef]]] = []
+        self._ids: List[int] = []
+        self._id_to_row: Dict[int, int] = {}
+        self._key_to_row: Dict[str, int] = {}
+        # Older live rows of keys that were added again; _key_to_row falls back to them on delete.
+        self._shadowed_rows: Dict[str, List[int]] = {}
+        self._next_id = 0
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.corpus: Optional[MappedCorpus] = None
+        self._corpus_documents = 0
+        self._embedding_model = embedding_model
+        self.lexical_index = lexical_index
+        self.query_cache = query_cache
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    @property
+    def embedding_model(self) -> EmbeddingModel:
+        if self._embedding_model is None:
+            self._embedding_model = EmbeddingModel()
+        return self._embedding_model
+
+    @embedding_model.setter
+    def embedding_model(self, embedding_model: EmbeddingModel) -> None:
+        self._embedding_model = embedding_model
+
+    @property
+    def vectors(self) -> Dict[str, np.array]:
+        """Key -> vector view of the store, rebuilt on every access."""
+        return {key: self.store.get(row) for key, row in list(self._key_to_row.items())}
+
+    def _append_rows(
+        self,
+        texts: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        self._invalidate_queries()
+        rows = self.store.add(np.asarray(vectors))
+        ids = list(range(self._next_id, self._next_id + len(texts)))
+        self._next_id += len(texts)
+        for text, record_id, row in zip(texts, ids, rows.tolist()):
+            self._texts.append(text)
+            self._ids.append(record_id)
+            self._id_to_row[record_id] = row
+            previous = self._key_to_row.get(text)
+            if previous is not None:
+                self._shadowed_rows.setdefault(text, []).append(previous)
+            self._key_to_row[text] = row
+        self.metadata.append(metadatas or [None] * len(texts))
+        self.index.add(rows)
+        if self.lexical_index is not None:
+            self.lexical_index.add(rows, [self._text(row) for row in rows.tolist()])
+        return ids
+
+    def add(self, text: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> int:
+        """Adds a new record, even if another record has the same text, and returns its id."""
+        return self._append_rows([text], [vector], [metadata])[0]
+
+    def add_many(
+        self,
+        texts: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> List[int]:
+        """Adds a batch of new records with one append to the store and returns their ids."""
+        if len(texts) == 0:
+            return []
+        return self._append_rows(list(texts), vectors, metadatas)
+
+    def insert(self, key: str, vector: np.array, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Inserts ``key``, or overwrites the vector (and metadata, if given) of the record it names."""
+        self.insert_many([key], [vector], None if metadata is None else [metadata])
+
+    def insert_many(
+        self,
+        keys: List[str],
+        vectors: np.array,
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> None:
+        """Batch :meth:`insert` with one append to the store; later duplicates win."""
+        metadatas = metadatas or [None] * len(keys)
+        new_keys: Dict[str, int] = {}
+        new_vectors, new_metadatas = [], []
+        for key, vector, metadata in zip(keys, vectors, metadatas):
+            row = self._key_to_row.get(key)
+            if row is not None:
+                self._invalidate_queries()
+                self.store.set(row, vector)
+                self.index.update(row)
+                if metadata is not None:
+                    self.metadata.set(row, metadata)
+            elif key in new_keys:
+                new_vectors[new_keys[key]] = vector
+                new_metadatas[new_keys[key]] = metadata
+            else:
+                new_keys[key] = len(new_vectors)
+                new_vectors.append(vector)
+                new_metadatas.append(metadata)
+        if new_vectors:
+            self._append_rows(list(new_keys), new_vectors, new_metadatas)
+
+    def _invalidate_queries(self) -> None:
+        if self.query_cache is not None:
+            self.query_cache.invalidate()
+
+    def _delete_row(self, row: int) -> None:
+        self._invalidate_queries()
+        text = self._texts[row]
+        shadowed = self._shadowed_rows.get(text)
+        if self._key_to_row.get(text) == row:
+            if shadowed:
+                self._key_to_row[text] = shadowed.pop()
+            else:
+                del self._key_to_row[text]
+        elif shadowed:
+            shadowed.remove(row)
+        if shadowed is not None and not shadowed:
+            del self._shadowed_rows[text]
+        del self._id_to_row[self._ids[row]]
+        self._texts[row] = None
+        self.metadata.delete(row)
+        self.store.delete(row)
+        if self.lexical_index is not None:
+            self.lexical_index.delete(row)
+
+    def _maybe_compact(self) -> None:
+        if self.store.deleted_count > len(self.store) // 2:
+            self.compact()
+
+    def delete(self, key: str) -> bool:
+        """Removes the record ``key`` names; returns False if it was not present."""
+        row = self._key_to_row.get(key)
+        if row is None:
+            return False
+        self._delete_row(row)
+        self._maybe_compact()
+        return True
+
+    def delete_ids(self, ids: List[int]) -> int:
+        """Removes records by id and returns how many existed."""
+        deleted = 0
+        for record_id in ids:
+            row = self._id_to_row.get(record_id)
+            if row is not None:
+                self._delete_row(row)
+                deleted += 1
+        self._maybe_compact()
+        return deleted
+
+    def compact(self) -> None:
+        """Reclaims the space of deleted rows and renumbers the remaining ones."""
+        if not self.store.deleted_count:
+            return
+        alive = self.store.alive.copy()
+        self.store.compact()
+        self.metadata.compact(alive)
+        if self.lexical_index is not None:
+            self.lexical_index.compact(alive)
+        keep = np.flatnonzero(alive).tolist()
+        self._texts = [self._texts[row] for row in keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._id_to_row = {record_id: row for row, record_id in enumerate(self._ids)}
+        self._index_keys()
+        self.index.rebuild()
+
+    def _index_keys(self) -> None:
+        """Rebuilds the key maps from ``_texts``; the latest row of a repeated key wins."""
+        self._key_to_row, self._shadowed_rows = {}, {}
+        for row, text in enumerate(self._texts):
+            if text is None:
+                continue
+            previous = self._key_to_row.get(text)
+            if previous is not None:
+                self._shadowed_rows.setdefault(text, []).append(previous)
+            self._key_to_row[text] = row
+
+    def get(self, record_id: int) -> Optional[Dict[str, Any]]:
+        """Returns the record with ``record_id`` as a dict (id, text, metadata, vector)."""
+        row = self._id_to_row.get(record_id)
+        if row is None:
+            return None
+        return {
+            "id": record_id,
+            "text": self._text(row),
+            "metadata": self.metadata.get(row),
+            "vector": self.store.get(row),
+        }
+
+    def _filter_rows(self, filter: Dict[str, Any]) -> np.ndarray:
+        return self.metadata.filter_rows(filter, self.store.alive)
+
+    def _search_rows(
+        self, query_vectors: np.array, k: int, filter: Optional[Dict[str, Any]]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k (rows, scores) per query, pre-filtered by metadata when ``filter`` is given."""
+        query_vectors = np.atleast_2d(np.asarray(query_vectors))
+        instrumentation.increment("vector_db.queries", len(query_vectors))
+        with instrumentation.span("vector_db.search"):
+            return self._score_rows(query_vectors, k, filter)
+
+    def _score_rows(
+        self, query_vectors: np.ndarray, k: int, filter: Optional[Dict[str, Any]]
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if len(self) == 0:
+            empty = np.empty(0, dtype=np.int64)
+            return [(empty, empty.astype(np.float32)) for _ in query_vectors]
+        if not filter:
+            if len(query_vectors) == 1:
+                return [self.index.search(query_vectors[0], k)]
+            return self.index.search_many(query_vectors, k)
+
+        # Only the matching subset is scored, exactly, whatever the index.
+        rows = self._filter_rows(filter)
+        instrumentation.increment("vector_db.vectors_scanned", len(rows) * len(query_vectors))
+        scores = self.store.normalise_query(query_vectors) @ np.asarray(
+            self.store.matrix[rows], dtype=np.float32
+        ).T
+        results = []
+        for query_scores in scores:
+            best = top_k_indices(query_scores, k)
+            results.append((rows[best], query_scores[best]))
+        return results
+
+    def _text(self, row: int) -> Optional[str]:
+        text = self._texts[row]
+        if isinstance(text, ChunkRef):
+            return self.corpus.text(text)
+        return text
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray) -> List[Tuple[str, float]]:
+        return [
+            (self._text(row), float(score))
+            for row, score in zip(rows, scores)
+            if self._texts[row] is not None
+        ]
+
+    def _records(self, rows: np.ndarray, scores: np.ndarray) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": self._ids[row],
+                "text": self._text(row),
+                "score": float(score),
+                "metadata": self.metadata.get(row),
+            }
+            for row, score in zip(rows, scores)
+            if self._texts[row] is not None
+        ]
 
     def search(
         self,
         query_vector: np.array,
         k: int,
         distance_measure: Callable = cosine_similarity,
+        filter: Optional[Dict[str, Any]] = None,
     ) -> List[Tuple[str, float]]:
-        scores = [
-            (key, distance_measure(query_vector, vector))
-            for key, vector in self.vectors.items()
-        ]
-        return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+        """
+        Returns the ``k`` most similar (text, score) pairs.
+
+        :param filter: Metadata conditions (see :class:`MetadataStore`) applied
+            before scoring, so only matching records are scanned
+        """
+        if distance_measure is not cosine_similarity:
+            rows = self._filter_rows(filter) if filter else list(self._id_to_row.values())
+            scores = [
+                (self._text(row), distance_measure(query_vector, self.store.get(row)))
+                for row in rows
+            ]
+            return sorted(scores, key=lambda x: x[1], reverse=True)[:k]
+
+        return self._results(*self._search_rows(query_vector, k, filter)[0])
+
+    def search_records(
+        self,
+        query_vector: np.array,
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[Dict[str, Any]]:
+        """Like :meth:`search`, but returns dicts with id, text, score and metadata."""
+        return self._records(*self._search_rows(query_vector, k, filter)[0])
+
+    def search_many(
+        self,
+        query_vectors: np.array,
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Cosine top-k for a batch of queries with one matrix-matrix product."""
+        return [self._results(rows, scores) for rows, scores in self._search_rows(query_vectors, k, filter)]
 
     def search_by_text(
         self,
@@ -39,22 +358,425 @@ class VectorDatabase:
         k: int,
         distance_measure: Callable = cosine_similarity,
         return_as_text: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+        mode: str = "dense",
     ) -> List[Tuple[str, float]]:
-        query_vector = self.embedding_model.get_embedding(query_text)
-        results = self.search(query_vector, k, distance_measure)
+        """
+        :param mode: ``"dense"`` (embedding similarity), ``"lexical"`` (BM25 only, no
+            embedding call) or ``"hybrid"`` (both, fused by reciprocal rank); the last
+            two need a ``lexical_index``
+        """
+        if mode == "lexical":
+            results = self.search_lexical(query_text, k, filter=filter)
+        elif mode not in ("dense", "hybrid"):
+            raise ValueError(f"Unknown search mode: {mode}. Must be dense, lexical or hybrid")
+        elif self.query_cache is not None and distance_measure is cosine_similarity:
+            scope = (mode, json.dumps(filter, sort_keys=True, default=str) if filter else None)
+            results = self.query_cache.search(
+                query_text,
+                k,
+                scope,
+                self.embedding_model.get_embedding,
+                lambda query_vector: self._search_embedded(query_text, query_vector, k, mode, distance_measure, filter),
+            )
+        else:
+            query_vector = self.embedding_model.get_embedding(query_text)
+            results = self._search_embedded(query_text, query_vector, k, mode, distance_measure, filter)
         return [result[0] for result in results] if return_as_text else results
 
+    def _search_embedded(
+        self,
+        query_text: str,
+        query_vector: np.array,
+        k: int,
+        mode: str,
+        distance_measure: Callable,
+        filter: Optional[Dict[str, Any]],
+    ) -> List[Tuple[str, float]]:
+        if mode == "hybrid":
+            return self._hybrid_results(query_text, query_vector, k, filter)
+        return self.search(query_vector, k, distance_measure, filter=filter)
+
+    def _lexical_rows(
+        self, query_text: str, k: int, filter: Optional[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if self.lexical_index is None:
+            raise ValueError("Lexical search needs a VectorDatabase created with a lexical_index")
+        allowed = None
+        if filter:
+            allowed = np.zeros(len(self.store.alive), dtype=bool)
+            allowed[self._filter_rows(filter)] = True
+        return self.lexical_index.search(query_text, k, allowed)
+
+    def search_lexical(
+        self, query_text: str, k: int, filter: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[str, float]]:
+        """BM25 top-k (text, score) pairs; no embedding call is made."""
+        return self._results(*self._lexical_rows(query_text, k, filter))
+
+    def search_hybrid(
+        self,
+        query_text: str,
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        fetch_k: Optional[int] = None,
+        rrf_k: int = 60,
+    ) -> List[Tuple[str, float]]:
+        """
+        Dense and BM25 results fused by reciprocal rank; scores are the fused RRF scores.
+
+        :param fetch_k: Candidates taken from each retriever before fusion (``2 * k`` by default)
+        :param rrf_k: Rank damping constant of the fusion
+        """
+        return self._hybrid_results(query_text, None, k, filter, fetch_k, rrf_k)
+
+    def _hybrid_results(
+        self,
+        query_text: str,
+        query_vector: Optional[np.array],
+        k: int,
+        filter: Optional[Dict[str, Any]],
+        fetch_k: Optional[int] = None,
+        rrf_k: int = 60,
+    ) -> List[Tuple[str, float]]:
+        fetch_k = fetch_k or 2 * k
+        lexical_rows, _ = self._lexical_rows(query_text, fetch_k, filter)
+        if query_vector is None:
+            query_vector = self.embedding_model.get_embedding(query_text)
+        dense_rows, _ = self._search_rows(query_vector, fetch_k, filter)[0]
+        fused = reciprocal_rank_fusion([dense_rows.tolist(), lexical_rows.tolist()], k=rrf_k)[:k]
+        return self._results(
+            np.array([row for row, _ in fused], dtype=np.int64), np.array([score for _, score in fused])
+        )
+
+    async def asearch_many_by_text(
+        self,
+        query_texts: List[str],
+        k: int,
+        return_as_text: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> List[List[Tuple[str, float]]]:
+        """Embeds every query in one batched call and searches them together."""
+        if not query_texts:
+            return []
+        query_vectors = await self.embedding_model.async_get_embeddings(query_texts)
+        results = self.search_many(np.array(query_vectors), k, filter=filter)
+        if return_as_text:
+            return [[result[0] for result in query_results] for query_results in results]
+        return results
+
+    def unit_vectors(self, record_ids: List[int]) -> np.ndarray:
+        """Stored (normalised) vectors of ``record_ids``, one float32 row each."""
+        rows = [self._id_to_row[record_id] for record_id in record_ids]
+        return np.asarray(self.store.matrix[rows], dtype=np.float32)
+
+    def search_context(
+        self,
+        query_text: str,
+        k: int,
+        packer: Optional[ContextPacker] = None,
+        filter: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[str, Dict[str, int]]:
+        """
+        Retrieves the top ``k`` records and packs them into a token-budgeted context.
+
+        :param packer: Packing settings (a default :class:`ContextPacker` if omitted)
+        :return: The context string and the packer's stats (including ``tokens_saved``)
+        """
+        packer = packer or ContextPacker()
+        query_vector = self.embedding_model.get_embedding(query_text)
+        records = self.search_records(query_vector, k, filter=filter)
+        return packer.pack(records, self.unit_vectors([record["id"] for record in records]))
+
     def retrieve_from_key(self, key: str) -> np.array:
-        return self.vectors.get(key, None)
+        row = self._key_to_row.get(key)
+        return None if row is None else self.store.get(row)
 
-    async def abuild_from_list(self, list_of_text: List[str]) -> "VectorDatabase":
+    async def abuild_from_list(
+        self,
+        list_of_text: List[str],
+        metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+    ) -> "VectorDatabase":
         embeddings = await self.embedding_model.async_get_embeddings(list_of_text)
-        for text, embedding in zip(list_of_text, embeddings):
-            self.insert(text, np.array(embedding))
+        self.insert_many(list_of_text, embeddings, metadatas)
+        return self
+
+    async def abuild_from_corpus(
+        self,
+        corpus: MappedCorpus,
+        splitter: CharacterTextSplitter = None,
+        batch_size: int = 256,
+    ) -> "VectorDatabase":
+        """
+        Adds every chunk of a memory-mapped corpus, keeping only their offsets.
+
+        Chunk text is decoded one micro-batch at a time for embedding and again
+        only when a search returns it, so resident memory stays close to the
+        offsets rather than the text.
+
+        A database refers to one corpus: calling this again with the same corpus
+        adds only the documents added to it since, and any other corpus is refused.
+
+        :raises ValueError: If the database already holds chunks of another corpus
+        """
+        if self.corpus is not None and corpus is not self.corpus:
+            raise ValueError(
+                "This database already refers to another MappedCorpus; add its files to that corpus instead"
+            )
+        splitter = splitter or CharacterTextSplitter()
+        self.corpus = corpus
+        for doc_id in range(self._corpus_documents, len(corpus.paths)):
+            path = corpus.paths[doc_id]
+            # Chunks already added by an earlier, interrupted call are skipped.
+            refs = [ref for ref in corpus.iter_refs(splitter, doc_id) if ref not in self._key_to_row]
+            for start in range(0, len(refs), batch_size):
+                batch = refs[start : start + batch_size]
+                embeddings = await self.embedding_model.async_get_embeddings(corpus.texts(batch))
+                self.add_many(batch, embeddings, [{"source": path, "start_byte": ref.start_byte} for ref in batch])
+            self._corpus_documents = doc_id + 1
         return self
 
+    async def aupdate_from_directory(
+        self,
+        path: str,
+        splitter: CharacterTextSplitter = None,
+        encoding: str = "utf-8",
+    ) -> Dict[str, int]:
+        """
+        Brings the database in line with the .txt files under ``path``.
+
+        Each document is fingerprinted by mtime, size and a SHA-256 of its content.
+        Only added or changed files are re-split and re-embedded, and chunks of
+        deleted files are removed. Chunks are stored as separate records with
+        ``source``, ``chunk`` (index) and ``start_char`` (character offset) metadata,
+        so identical text in two files never collides and neighbouring chunks can be
+        merged exactly.
+
+        :return: Counts of added, changed, unchanged and removed files and embedded chunks
+        """
+        splitter = splitter or CharacterTextSplitter()
+        stats = {"added": 0, "changed": 0, "unchanged": 0, "removed": 0, "chunks_embedded": 0}
+        root = os.path.abspath(path)
+        on_disk = set()
+        pending: Dict[str, Dict[str, Any]] = {}
+
+        for file_path in TextFileLoader(root, encoding=encoding).iter_paths():
+            file_path = os.path.abspath(file_path)
+            on_disk.add(file_path)
+            stat = os.stat(file_path)
+            known = self.documents.get(file_path)
+            if known is not None and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                stats["unchanged"] += 1
+                continue
+            with open(file_path, "rb") as f:
+                content = f.read()
+            sha256 = hashlib.sha256(content).hexdigest()
+            if known is not None and known["sha256"] == sha256:
+                known.update(mtime=stat.st_mtime, size=stat.st_size)
+                stats["unchanged"] += 1
+                continue
+            stats["changed" if known is not None else "added"] += 1
+            text = content.decode(encoding)
+            try:
+                chunks = split_with_offsets(splitter, text, file_path)
+            except ValueError:
+                # A splitter that rewrites its chunks cannot be located in the text; store indexes only.
+                chunks = [Chunk(chunk, file_path, None, None) for chunk in splitter.split(text)]
+            pending[file_path] = {
+                "mtime": stat.st_mtime,
+                "size": stat.st_size,
+                "sha256": sha256,
+                "chunks": chunks,
+            }
+
+        prefix = root if root.endswith(os.sep) else root + os.sep
+        for file_path in list(self.documents):
+            if file_path.startswith(prefix) and file_path not in on_disk:
+                self.delete_ids(self.documents.pop(file_path)["ids"])
+                stats["removed"] += 1
+
+        unique_chunks = list(dict.fromkeys(
+            chunk.text for document in pending.values() for chunk in document["chunks"]
+        ))
+        embeddings = {}
+        if unique_chunks:
+            vectors = await self.embedding_model.async_get_embeddings(unique_chunks)
+            embeddings = dict(zip(unique_chunks, vectors))
+            stats["chunks_embedded"] = len(unique_chunks)
+
+        for file_path, document in pending.items():
+            if file_path in self.documents:
+                self.delete_ids(self.documents[file_path]["ids"])
+            chunks = document.pop("chunks")
+            metadatas = [{"source": file_path, "chunk": i} for i in range(len(chunks))]
+            for metadata, chunk in zip(metadatas, chunks):
+                if chunk.start_char is not None:
+                    metadata["start_char"] = chunk.start_char
+            document["ids"] = self.add_many(
+                [chunk.text for chunk in chunks],
+                [embeddings[chunk.text] for chunk in chunks],
+                metadatas,
+            )
+            self.documents[file_path] = document
+        return stats
+
+    def update_from_directory(self, path: str, splitter: CharacterTextSplitter = None, encoding: str = "utf-8") -> Dict[str, int]:
+        """Synchronous :meth:`aupdate_from_directory`; not for use inside a running event loop."""
+        import asyncio
+
+        async def update() -> Dict[str, int]:
+            try:
+                return await self.aupdate_from_directory(path, splitter=splitter, encoding=encoding)
+            finally:
+                # The default async client cannot outlive this call's event loop.
+                aclose = getattr(self.embedding_model, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+
+        return asyncio.run(update())
+
+    def save(self, path: str, dtype=np.float32) -> None:
+        """
+        Writes the database to the directory ``path``.
+
+        Normalised vectors and norms go to ``.npy`` files that :meth:`load` can
+        memory-map; ids, texts, metadata columns and document fingerprints go to
+        a small JSON side file. An index with trained state (such as the codes of
+        a quantised index) saves it to ``index.npz`` so :meth:`load` can reuse it.
+
+        :param path: Target directory (created if missing)
+        :param dtype: On-disk vector dtype, ``np.float32`` or ``np.float16``
+        """
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float16):
+            raise ValueError(f"Unsupported dtype: {dtype}. Must be float32 or float16")
+        self.compact()
+        metadata = {
+            "format_version": self.FORMAT_VERSION,
+            "count": len(self._texts),
+            "dim": self.store.dim,
+            "dtype": dtype.name,
+            "embeddings_model_name": getattr(self._embedding_model, "embeddings_model_name", None),
+            "next_id": self._next_id,
+            "ids": self._ids,
+            "keys": [self._text(row) for row in range(len(self._texts))],
+            "metadata": self.metadata.columns,
+            "documents": self.documents,
+        }
+        index_state = self.index.state()
+        if index_state:
+            metadata["index"] = type(self.index).__name__
+        # Serialised before anything is written, so unsupported metadata leaves ``path`` untouched.
+        try:
+            payload = json.dumps(metadata, ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError) as e:
+            raise TypeError(f"Cannot save to {path}: metadata must be JSON-serialisable ({e})") from e
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, self.VECTORS_FILE), self.store.matrix.astype(dtype, copy=False))
+        np.save(os.path.join(path, self.NORMS_FILE), self.store.norms.astype(np.float32, copy=False))
+        index_path = os.path.join(path, self.INDEX_FILE)
+        if index_state:
+            np.savez(index_path, **index_state)
+        elif os.path.exists(index_path):
+            os.remove(index_path)
+        with open(os.path.join(path, self.METADATA_FILE), "w", encoding="utf-8") as f:
+            f.write(payload)
+
+    @classmethod
+    def _from_rows(
+        cls,
+        store: MatrixStore,
+        texts: List[Union[str, ChunkRef]],
+        ids: List[int],
+        metadata: MetadataStore,
+        embedding_model: EmbeddingModel = None,
+        index: ExactIndex = None,
+        next_id: Optional[int] = None,
+        keyed: bool = True,
+        index_state: Optional[Dict[str, np.ndarray]] = None,
+    ) -> "VectorDatabase":
+        """
+        Builds a database around rows that are already normalised in ``store``, without re-adding them.
+
+        ``keyed=False`` skips building the key maps, for segments whose owner tracks keys
+        itself; lookups by key on the result then find nothing. ``index_state`` is a saved
+        :meth:`ExactIndex.state` restored instead of indexing the rows afresh, if it fits.
+        """
+        database = cls(embedding_model=embedding_model, index=index)
+        database.store = store
+        database.index.attach(store)
+        database._texts = texts
+        database._ids = ids
+        database._next_id = len(ids) if next_id is None else next_id
+        database._id_to_row = dict(zip(ids, range(len(ids))))
+        if keyed:
+            database._index_keys()
+        database.metadata = metadata
+        if not (index_state and database.index.restore(index_state)):
+            database.index.add(np.arange(len(store)))
+        return database
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        mmap: bool = True,
+        embedding_model: EmbeddingModel = None,
+        index: ExactIndex = None,
+        lexical_index: BM25Index = None,
+    ) -> "VectorDatabase":
+        """
+        Loads a database written by :meth:`save`.
+
+        :param path: Directory passed to :meth:`save`
+        :param mmap: Memory-map the vector file read-only instead of reading it,
+            so worker processes share one copy through the page cache. The
+            vectors are copied into memory on the first write.
+        :param embedding_model: Model used for ``search_by_text``
+        :param index: Search index; state saved by an index of the same class is
+            reused if it fits, otherwise the index is rebuilt
+        :param lexical_index: Optional empty :class:`BM25Index`, rebuilt from the stored texts
+        """
+        with open(os.path.join(path, cls.METADATA_FILE), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        version = metadata.get("format_version")
+        if version not in (1, cls.FORMAT_VERSION):
+            raise ValueError(f"Unsupported format version: {version}")
+
+        mmap_mode = "r" if mmap else None
+        matrix = np.load(os.path.join(path, cls.VECTORS_FILE), mmap_mode=mmap_mode)
+        norms = np.load(os.path.join(path, cls.NORMS_FILE), mmap_mode=mmap_mode)
+        count = metadata["count"]
+        if len(matrix) != count or len(metadata["keys"]) != count:
+            raise ValueError(f"Corrupt database at {path}: vector and key counts do not match")
+        index_state = None
+        if index is not None and metadata.get("index") == type(index).__name__:
+            with np.load(os.path.join(path, cls.INDEX_FILE)) as saved:
+                index_state = dict(saved)
+
+        database = cls._from_rows(
+            MatrixStore.from_arrays(matrix, norms),
+            list(metadata["keys"]),
+            list(metadata.get("ids", range(count))),
+            MetadataStore.from_columns(
+                {field: list(column) for field, column in metadata.get("metadata", {}).items()}, count
+            ),
+            embedding_model=embedding_model,
+            index=index,
+            next_id=metadata.get("next_id", count),
+            index_state=index_state,
+        )
+        if version == cls.FORMAT_VERSION:
+            database.documents = metadata.get("documents", {})
+        if lexical_index is not None:
+            database.lexical_index = lexical_index
+            lexical_index.add(range(count), database._texts)
+        return database
+
 
 if __name__ == "__main__":
+    import asyncio
+
     list_of_text = [
         "I like to eat broccoli and bananas.",
         "I ate a banana and spinach smoothie for breakfast.",
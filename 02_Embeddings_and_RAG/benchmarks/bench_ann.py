@@ -0,0 +1,77 @@
+"""
+Recall@k vs. latency of ``IVFIndex`` against exact search.
+
+    python benchmarks/bench_ann.py --corpus 1000000 --dim 128 --nprobe 1 4 16 64
+    python benchmarks/bench_ann.py --pmarca
+
+``--pmarca`` indexes the chunks of ``data/PMarcaBlogs.txt`` (embedded with the
+offline fake model) instead of a synthetic clustered corpus.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.ann_index import IVFIndex  # noqa: E402
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "PMarcaBlogs.txt")
+
+
+def corpus_vectors(args) -> np.ndarray:
+    if not args.pmarca:
+        return synthetic_vectors(args.corpus, args.dim, clusters=max(1, args.corpus // 1000))
+    chunks = CharacterTextSplitter().split_texts(TextFileLoader(DATA_PATH).load_documents())
+    model = FakeEmbeddingModel(dim=args.dim)
+    return np.array(model.get_embeddings(chunks), dtype=np.float32)
+
+
+def timed_search(database: VectorDatabase, queries: np.ndarray, k: int):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        results.append({key for key, _ in database.search(query, k)})
+    return results, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--pmarca", action="store_true")
+    args = parser.parse_args()
+
+    vectors = corpus_vectors(args)
+    noise = 0.1 * np.random.default_rng(1).standard_normal((args.queries, vectors.shape[1]), dtype=np.float32)
+    queries = vectors[np.random.default_rng(2).choice(len(vectors), args.queries)] + noise
+
+    embedding_model = FakeEmbeddingModel(dim=vectors.shape[1])
+    exact = VectorDatabase(embedding_model=embedding_model)
+    ivf = VectorDatabase(embedding_model=embedding_model, index=IVFIndex(nlist=args.nlist, min_train_size=len(vectors)))
+    for database in (exact, ivf):
+        for i, vector in enumerate(vectors):
+            database.insert(str(i), vector)
+
+    truth, exact_latency = timed_search(exact, queries, args.k)
+    print(f"corpus={len(vectors)} dim={vectors.shape[1]} k={args.k} nlist={len(ivf.index.centroids)}")
+    print(f"{'mode':<16}{f'recall@{args.k}':>12}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<16}{1.0:>12.3f}{exact_latency * 1000:>12.3f}{1.0:>10.1f}")
+    for nprobe in args.nprobe:
+        ivf.index.nprobe = nprobe
+        found, latency = timed_search(ivf, queries, args.k)
+        recall = np.mean([len(a & b) / args.k for a, b in zip(found, truth)])
+        print(f"{f'ivf nprobe={nprobe}':<16}{recall:>12.3f}{latency * 1000:>12.3f}{exact_latency / latency:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+``ChatOpenAI`` against a local fake chat server: a fresh client per call versus
+the shared client, time-to-first-token of ``stream`` versus ``run``, and
+``abatch`` throughput at several concurrency limits.
+
+    python benchmarks/bench_chat_client.py --calls 200 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI, OpenAI  # noqa: E402
+
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01, help="server latency per request")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="server delay per streamed word")
+    parser.add_argument("--words", type=int, default=40, help="words in each prompt (echoed back)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    messages = [{"role": "user", "content": " ".join(["word"] * args.words)}]
+
+    with FakeOpenAIServer(latency=args.latency, token_latency=args.token_latency) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        print(f"calls={args.calls} latency={args.latency}s token_latency={args.token_latency}s words={args.words}")
+
+        # Sequential run(): a client per call (the old behaviour) versus one pooled client.
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            ChatOpenAI(client=OpenAI(base_url=server.base_url)).run(messages)
+        fresh = time.perf_counter() - start
+        chat = ChatOpenAI(client=OpenAI(base_url=server.base_url))
+        start = time.perf_counter()
+        for _ in range(args.calls):
+            chat.run(messages)
+        pooled = time.perf_counter() - start
+        print(f"{'run()':<24}{'ms/call':>10}")
+        print(f"{'  client per call':<24}{1000 * fresh / args.calls:>10.2f}")
+        print(f"{'  shared client':<24}{1000 * pooled / args.calls:>10.2f}")
+
+        # Time to first token: run() only returns once the whole completion is done.
+        start = time.perf_counter()
+        chat.run(messages, stream=False)
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        stream = chat.stream(messages)
+        next(stream)
+        first = time.perf_counter() - start
+        for _ in stream:
+            pass
+        print(f"{'first token':<24}{'ms':>10}")
+        print(f"{'  run()':<24}{1000 * full:>10.2f}")
+        print(f"{'  stream()':<24}{1000 * first:>10.2f}")
+
+        print(f"{'abatch() concurrency':<24}{'seconds':>10}{'prompts/s':>11}")
+        for concurrency in args.concurrency:
+
+            async def batch():
+                chat = ChatOpenAI(async_client=AsyncOpenAI(base_url=server.base_url))
+                start = time.perf_counter()
+                await chat.abatch([messages] * args.calls, max_concurrency=concurrency)
+                seconds = time.perf_counter() - start
+                await chat.async_client.close()
+                return seconds
+
+            seconds = asyncio.run(batch())
+            print(f"{'  ' + str(concurrency):<24}{seconds:>10.2f}{args.calls / seconds:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
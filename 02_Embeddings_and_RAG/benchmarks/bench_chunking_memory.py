@@ -0,0 +1,62 @@
+"""
+Peak Python heap while chunking a large file: ``TextFileLoader`` +
+``CharacterTextSplitter.split`` (string slices) against ``MappedCorpus.split``
+(offsets over a memory map). The input is ``data/PMarcaBlogs.txt`` repeated.
+
+    python benchmarks/bench_chunking_memory.py --repeat 50
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.text_utils import CharacterTextSplitter, MappedCorpus, TextFileLoader  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "PMarcaBlogs.txt")
+
+
+def measure(function):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with open(DATA_PATH, "rb") as f:
+        data = f.read()
+    splitter = CharacterTextSplitter()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.txt")
+        with open(path, "wb") as f:
+            for _ in range(args.repeat):
+                f.write(data)
+        source = os.path.getsize(path)
+
+        def split_strings():
+            return splitter.split_texts(TextFileLoader(path).load_documents())
+
+        def split_offsets():
+            with MappedCorpus.from_loader(TextFileLoader(path)) as corpus:
+                return corpus.split(splitter)
+
+        print(f"source={source / 2**20:.1f} MiB")
+        print(f"{'mode':<12}{'chunks':>10}{'peak MiB':>10}{'x source':>10}{'seconds':>10}")
+        for name, function in [("strings", split_strings), ("offsets", split_offsets)]:
+            chunks, peak, seconds = measure(function)
+            print(f"{name:<12}{len(chunks):>10}{peak / 2**20:>10.1f}{peak / source:>10.2f}{seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Upstream calls and wall time of ``ChatOpenAI.abatch`` on a workload of
+repeated questions, without a cache, with a completion cache, and with a
+cache plus in-flight coalescing, against a local fake chat server.
+
+    python benchmarks/bench_completion_cache.py --requests 500 --unique 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from aimakerspace.openai_utils.completion_cache import LRUCompletionCache  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--unique", type=int, default=30, help="distinct questions in the workload")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    rng = random.Random(0)
+    workload = [
+        [{"role": "user", "content": f"question {rng.randrange(args.unique)}"}] for _ in range(args.requests)
+    ]
+
+    with FakeOpenAIServer(latency=args.latency) as server:
+        print(f"requests={args.requests} unique={args.unique} latency={args.latency}s concurrency={args.concurrency}")
+        print(f"{'mode':<20}{'upstream':>10}{'seconds':>10}")
+        for mode, cache, coalesce in [
+            ("no cache", None, False),
+            ("cache", LRUCompletionCache(), False),
+            ("cache + coalesce", LRUCompletionCache(), True),
+        ]:
+
+            async def run():
+                chat = ChatOpenAI(
+                    async_client=AsyncOpenAI(base_url=server.base_url), cache=cache, coalesce=coalesce
+                )
+                start = time.perf_counter()
+                await chat.abatch(workload, max_concurrency=args.concurrency, temperature=0)
+                seconds = time.perf_counter() - start
+                await chat.async_client.close()
+                return seconds
+
+            before = server.requests
+            seconds = asyncio.run(run())
+            print(f"{mode:<20}{server.requests - before:>10}{seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Tokens saved and packing time of ``ContextPacker`` on top-k results from an
+overlapping ``CharacterTextSplitter`` corpus, for several token budgets.
+
+    python benchmarks/bench_context_packing.py --k 20 --budgets 500 1000 4000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.context_packing import ContextPacker  # noqa: E402
+from aimakerspace.text_utils import CharacterTextSplitter  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--sentences", type=int, default=300, help="sentences per document")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=150)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[500, 1000, 4000])
+    args = parser.parse_args()
+
+    splitter = CharacterTextSplitter(args.chunk_size, args.chunk_overlap)
+    texts, metadatas = [], []
+    for doc in range(args.documents):
+        document = " ".join(f"Document {doc} sentence {i} covers topic {i % 13}." for i in range(args.sentences))
+        for start, end in splitter.split_offsets(len(document)):
+            texts.append(document[start:end])
+            metadatas.append({"source": f"doc{doc}.txt", "start_char": start})
+    model = FakeEmbeddingModel(dim=128)
+    db = VectorDatabase(embedding_model=model)
+    db.insert_many(texts, model.get_embeddings(texts), metadatas)
+
+    queries = [model.get_embedding(f"topic {i % 13} in document {i % args.documents}") for i in range(args.queries)]
+    results = [db.search_records(np.array(query), args.k) for query in queries]
+    vectors = [db.unit_vectors([record["id"] for record in records]) for records in results]
+
+    print(f"chunks={len(texts)} k={args.k} chunk_size={args.chunk_size} overlap={args.chunk_overlap}")
+    print(f"{'budget':>8}{'in tokens':>11}{'out tokens':>12}{'saved':>8}{'merged':>8}{'dups':>6}{'ms/query':>10}")
+    for budget in args.budgets:
+        packer = ContextPacker(max_tokens=budget)
+        totals = {"input_tokens": 0, "output_tokens": 0, "tokens_saved": 0, "merged": 0, "dropped_duplicates": 0}
+        start = time.perf_counter()
+        for records, record_vectors in zip(results, vectors):
+            _, stats = packer.pack(records, record_vectors)
+            for key in totals:
+                totals[key] += stats[key]
+        ms = 1000 * (time.perf_counter() - start) / len(results)
+        n = len(results)
+        print(
+            f"{budget:>8}{totals['input_tokens'] / n:>11.0f}{totals['output_tokens'] / n:>12.0f}"
+            f"{totals['tokens_saved'] / n:>8.0f}{totals['merged'] / n:>8.1f}{totals['dropped_duplicates'] / n:>6.1f}"
+            f"{ms:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Texts/sec of ``EmbeddingModel.async_get_embeddings`` through the batch
+scheduler, against a local fake embeddings server that injects 429s.
+
+    python benchmarks/bench_embedding_scheduler.py --texts 20000 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from aimakerspace.openai_utils.embedding import EmbeddingModel, RETRYABLE_ERRORS  # noqa: E402
+from aimakerspace.openai_utils.scheduler import EmbeddingBatchError, EmbeddingScheduler  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=5_000)
+    parser.add_argument("--chars", type=int, default=800, help="characters per text")
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--error-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument(
+        "--max-tokens-per-batch", type=int, default=8_000, help="kept small so there are enough batches to overlap"
+    )
+    args = parser.parse_args()
+
+    texts = [f"{i} " + "lorem ipsum " * (args.chars // 12) for i in range(args.texts)]
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+    with FakeOpenAIServer(latency=args.latency, error_rate=args.error_rate) as server:
+        print(f"texts={args.texts} chars/text={args.chars} latency={args.latency}s error_rate={args.error_rate}")
+        print(f"{'concurrency':<14}{'batches':>9}{'retries':>9}{'failed':>8}{'seconds':>10}{'texts/s':>11}")
+        for concurrency in args.concurrency:
+            scheduler = EmbeddingScheduler(
+                max_concurrency=concurrency,
+                max_tokens_per_batch=args.max_tokens_per_batch,
+                base_delay=0.05,
+                retry_on=RETRYABLE_ERRORS,
+            )
+            model = EmbeddingModel(scheduler=scheduler)
+            model.async_client = AsyncOpenAI(base_url=server.base_url, max_retries=0)
+            try:
+                asyncio.run(model.async_get_embeddings(texts))
+            except EmbeddingBatchError:
+                pass
+            stats = scheduler.last_stats
+            print(
+                f"{concurrency:<14}{stats['batches']:>9}{stats['retries']:>9}{stats['failed']:>8}"
+                f"{stats['seconds']:>10.2f}{stats['texts_per_sec']:>11.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Cold-start cost of the aimakerspace modules.
+
+Each module is imported in a fresh interpreter several times; the table shows
+the median wall time and which heavy dependencies (openai, dotenv, asyncio,
+httpx) the import pulled in. Importing ``aimakerspace.vectordatabase`` should
+not load any of them: they belong to the first API call, not to loading a
+saved index or searching precomputed vectors.
+
+Exits non-zero if a module in ``--forbid-checked`` loads a forbidden dependency,
+or if any median exceeds ``--max-ms``, so it can guard against regressions:
+
+    python benchmarks/bench_import_time.py --repeats 7 --max-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODULES = [
+    "aimakerspace.vectordatabase",
+    "aimakerspace.openai_utils.embedding",
+    "aimakerspace.openai_utils.chatmodel",
+    "aimakerspace.sharded",
+    "aimakerspace.concurrent_database",
+    "aimakerspace.rag_pipeline",
+]
+HEAVY = ["openai", "dotenv", "asyncio", "httpx"]
+# Modules that must import without any of HEAVY; rag_pipeline is async by design.
+FORBID_CHECKED = [
+    "aimakerspace.vectordatabase",
+    "aimakerspace.openai_utils.embedding",
+    "aimakerspace.sharded",
+    "aimakerspace.concurrent_database",
+]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeats: int) -> dict:
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    timings, loaded = [], []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        timings.append(report["seconds"])
+        loaded = report["loaded"]
+    return {"median_ms": 1000 * statistics.median(timings), "min_ms": 1000 * min(timings), "loaded": loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if any median import exceeds this")
+    parser.add_argument("--forbid-checked", nargs="*", default=FORBID_CHECKED)
+    args = parser.parse_args()
+
+    print(f"python={sys.version.split()[0]} repeats={args.repeats}")
+    print(f"{'module':<40}{'median ms':>11}{'min ms':>9}  loaded")
+    failures = []
+    for module in args.modules:
+        report = measure(module, args.repeats)
+        print(f"{module:<40}{report['median_ms']:>11.1f}{report['min_ms']:>9.1f}  {', '.join(report['loaded']) or '-'}")
+        if module in args.forbid_checked and report["loaded"]:
+            failures.append(f"{module} imports {', '.join(report['loaded'])}")
+        if args.max_ms is not None and report["median_ms"] > args.max_ms:
+            failures.append(f"{module} took {report['median_ms']:.1f} ms (limit {args.max_ms:.0f} ms)")
+    for failure in failures:
+        print("FAIL:", failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Per-call cost of the instrumentation hooks: a bare span, prompt rendering and
+vector search, with instrumentation disabled and enabled.
+
+    python benchmarks/bench_instrumentation.py --records 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace import instrumentation  # noqa: E402
+from aimakerspace.openai_utils.prompts import UserRolePrompt  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+
+def per_call(function, seconds: float) -> float:
+    """Mean seconds per call of ``function`` over roughly ``seconds``."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(100):
+            function()
+        calls += 100
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return elapsed / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--seconds", type=float, default=0.5, help="time spent per measurement")
+    args = parser.parse_args()
+
+    def bare_span():
+        with instrumentation.span("bench.span"):
+            pass
+
+    prompt = UserRolePrompt("Context:\n{context}\n\nQuestion: {question}")
+    context = "retrieved text " * 200
+
+    def render():
+        prompt.format_prompt(context=context, question="why?")
+
+    db = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=args.dim))
+    db.add_many([str(i) for i in range(args.records)], synthetic_vectors(args.records, args.dim))
+    query = np.random.default_rng(1).standard_normal(args.dim).astype(np.float32)
+
+    def search():
+        db.search(query, k=10)
+
+    print(f"{'operation':<16}{'disabled us':>13}{'enabled us':>12}{'overhead':>10}")
+    for name, function in [("span", bare_span), ("prompt render", render), ("search", search)]:
+        instrumentation.disable()
+        disabled = per_call(function, args.seconds)
+        instrumentation.enable()
+        enabled = per_call(function, args.seconds)
+        instrumentation.disable()
+        print(f"{name:<16}{1e6 * disabled:>13.3f}{1e6 * enabled:>12.3f}{1e6 * (enabled - disabled):>9.3f}us")
+    instrumentation.metrics.reset()
+
+
+if __name__ == "__main__":
+    main()
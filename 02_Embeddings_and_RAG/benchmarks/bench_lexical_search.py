@@ -0,0 +1,103 @@
+"""
+BM25, dense and hybrid retrieval over CharacterTextSplitter chunks of a
+synthetic Zipf-distributed corpus with planted error codes.
+
+Reports per-query latency (dense and hybrid pay a simulated embedding round
+trip, lexical does not), how often the chunk holding a queried code is in the
+top k, and how many postings MaxScore scanned or probed out of the postings of
+the query terms.
+
+    python benchmarks/bench_lexical_search.py --chars 5000000 --embed-latency 0.05
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace import instrumentation  # noqa: E402
+from aimakerspace.lexical_index import BM25Index  # noqa: E402
+from aimakerspace.text_utils import CharacterTextSplitter  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel  # noqa: E402
+
+
+def synthetic_corpus(n_chars: int, seed: int, n_codes: int):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20_000)]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    words, length = [], 0
+    while length < n_chars:
+        batch = rng.choices(vocab, weights, k=1000)
+        words.extend(batch)
+        length += sum(len(word) + 1 for word in batch)
+    codes = [f"ERR-{i:05d}" for i in range(n_codes)]
+    for code in codes:
+        words[rng.randrange(len(words))] = code
+    return " ".join(words), codes, rng, vocab, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chars", type=int, default=2_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="simulated embedding round trip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    text, codes, rng, vocab, weights = synthetic_corpus(args.chars, args.seed, args.queries)
+    chunks = CharacterTextSplitter().split(text)
+    model = FakeEmbeddingModel(dim=256)
+    db = VectorDatabase(embedding_model=model, lexical_index=BM25Index())
+    start = time.perf_counter()
+    db.add_many(chunks, model.get_embeddings(chunks))
+    print(f"chunks={len(chunks)} indexed in {time.perf_counter() - start:.1f}s, "
+          f"BM25 index {db.lexical_index.memory_bytes() / 2**20:.1f} MiB")
+    model.latency = args.embed_latency
+
+    # Half the queries look up a planted code, half are 3-5 word natural queries.
+    queries = []
+    for code in codes:
+        if len(queries) % 2:
+            queries.append((" ".join(rng.choices(vocab, weights, k=rng.randint(3, 5))), None))
+        else:
+            queries.append((f"what does {code} mean", code))
+
+    print(f"{'mode':<10}{'p50 ms':>9}{'p95 ms':>9}{'code hit@k':>12}")
+    for mode in ("lexical", "dense", "hybrid"):
+        instrumentation.metrics.reset()
+        instrumentation.enable()
+        latencies, hits, code_queries = [], 0, 0
+        for query, code in queries:
+            started = time.perf_counter()
+            results = db.search_by_text(query, args.k, return_as_text=True, mode=mode)
+            latencies.append(time.perf_counter() - started)
+            if code is not None:
+                code_queries += 1
+                hits += any(code in result for result in results)
+        instrumentation.disable()
+        latencies.sort()
+        print(
+            f"{mode:<10}{1000 * statistics.median(latencies):>9.2f}"
+            f"{1000 * latencies[int(0.95 * (len(latencies) - 1))]:>9.2f}{hits / code_queries:>12.2f}"
+        )
+        if mode == "lexical":
+            counters = instrumentation.metrics.snapshot()["counters"]
+            total = sum(
+                db.lexical_index.document_frequency(token)
+                for query, _ in queries
+                for token in set(db.lexical_index.tokenizer(query))
+            )
+            print(
+                f"{'':<10}postings scanned {counters.get('lexical.postings_scanned', 0):,.0f}, "
+                f"probed {counters.get('lexical.postings_probed', 0):,.0f} of {total:,} in query lists"
+            )
+    instrumentation.metrics.reset()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Files/sec of ``load_and_split_parallel`` by worker count, against the serial
+``TextFileLoader`` + ``CharacterTextSplitter.split_texts`` path, on a
+generated directory of text files.
+
+    python benchmarks/bench_parallel_loading.py --files 20000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader, load_and_split_parallel  # noqa: E402
+
+WORDS = "the quick brown fox jumps over a lazy dog while markets and startups grow".split()
+
+
+def write_corpus(directory: str, files: int, chars: int) -> None:
+    for i in range(files):
+        words = [WORDS[(i * 7 + j) % len(WORDS)] for j in range(chars // 5)]
+        subdirectory = os.path.join(directory, f"shard{i % 16:02d}")
+        os.makedirs(subdirectory, exist_ok=True)
+        with open(os.path.join(subdirectory, f"doc{i:06d}.txt"), "w", encoding="utf-8") as f:
+            f.write(" ".join(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=5_000)
+    parser.add_argument("--chars", type=int, default=20_000, help="characters per file")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    splitter = CharacterTextSplitter()
+    with tempfile.TemporaryDirectory() as directory:
+        write_corpus(directory, args.files, args.chars)
+
+        start = time.perf_counter()
+        serial = splitter.split_texts(TextFileLoader(directory).load_documents())
+        serial_seconds = time.perf_counter() - start
+
+        print(f"files={args.files} chars/file={args.chars} cpus={os.cpu_count()} chunks={len(serial)}")
+        print(f"{'mode':<20}{'seconds':>10}{'files/s':>12}{'speedup':>10}")
+        print(f"{'serial':<20}{serial_seconds:>10.2f}{args.files / serial_seconds:>12.1f}{1.0:>10.2f}")
+        for use_threads in (False, True):
+            for workers in sorted(set(args.workers)):
+                start = time.perf_counter()
+                chunks = load_and_split_parallel(directory, splitter, max_workers=workers, use_threads=use_threads)
+                seconds = time.perf_counter() - start
+                assert [chunk.text for chunk in chunks] == serial, "parallel output differs from serial"
+                name = f"{'threads' if use_threads else 'processes'} x{workers}"
+                print(f"{name:<20}{seconds:>10.2f}{args.files / seconds:>12.1f}{serial_seconds / seconds:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
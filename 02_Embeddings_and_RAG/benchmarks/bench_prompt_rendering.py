@@ -0,0 +1,81 @@
+"""
+Renders/sec of ``BasePrompt`` and ``ConditionalPrompt`` across variable counts
+and retrieved-context sizes, next to a reference implementation of the
+previous re-parse-and-replace rendering.
+
+    python benchmarks/bench_prompt_rendering.py --variables 5 50 --context-kb 1 64
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.openai_utils.prompts import BasePrompt, ConditionalPrompt  # noqa: E402
+
+_VAR = re.compile(r"\{([^{}]+)\}")
+_BASE_VAR = re.compile(r"\{([^}]+)\}")
+_CONDITIONAL = re.compile(r"\{if\s+([^}]+)\}(.*?)(?:\{else\}(.*?))?\{/if\}", re.DOTALL)
+
+
+def reference_conditional(template: str, **kwargs) -> str:
+    """The previous ``ConditionalPrompt.format_prompt``: regex pass, then one replace per variable."""
+    result = _CONDITIONAL.sub(
+        lambda m: m.group(2).strip() if kwargs.get(m.group(1).strip()) else (m.group(3) or "").strip(), template
+    )
+    for var in _VAR.findall(result):
+        result = result.replace(f"{{{var}}}", str(kwargs.get(var, "")))
+    return result
+
+
+def reference_base(template: str, **kwargs) -> str:
+    """The previous ``BasePrompt.format_prompt``: regex pass, then ``str.format``."""
+    return template.format(**{var: kwargs.get(var, "") for var in _BASE_VAR.findall(template)})
+
+
+def rate(render, seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(20):
+            render()
+        calls += 20
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variables", type=int, nargs="+", default=[5, 50])
+    parser.add_argument("--context-kb", type=int, nargs="+", default=[1, 64])
+    parser.add_argument("--seconds", type=float, default=0.5, help="time spent per measurement")
+    args = parser.parse_args()
+
+    print(f"{'template':<14}{'vars':>6}{'ctx KB':>8}{'reference/s':>14}{'compiled/s':>13}{'speedup':>9}")
+    for n_vars in args.variables:
+        for context_kb in args.context_kb:
+            names = [f"var{i}" for i in range(n_vars)]
+            values = {name: f"value {i}" for i, name in enumerate(names)}
+            values["context"] = "retrieved text " * (context_kb * 1024 // 15)
+            values["verbose"] = True
+            body = "Context:\n{context}\n" + " ".join(f"{name}={{{name}}}" for name in names)
+            conditional = body + "\n{if verbose}Answer in detail for {var0}.{else}Be brief.{/if}"
+
+            prompt = BasePrompt(body)
+            reference = rate(lambda: reference_base(body, **values), args.seconds)
+            compiled = rate(lambda: prompt.format_prompt(**values), args.seconds)
+            print(f"{'BasePrompt':<14}{n_vars:>6}{context_kb:>8}{reference:>14,.0f}{compiled:>13,.0f}"
+                  f"{compiled / reference:>8.1f}x")
+
+            prompt = ConditionalPrompt(conditional)
+            reference = rate(lambda: reference_conditional(conditional, **values), args.seconds)
+            compiled = rate(lambda: prompt.format_prompt(**values), args.seconds)
+            print(f"{'Conditional':<14}{n_vars:>6}{context_kb:>8}{reference:>14,.0f}{compiled:>13,.0f}"
+                  f"{compiled / reference:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory per vector, recall@k and query latency for each vector storage mode:
+float32 and float16 storage with exact search, int8 scalar quantisation and
+product quantisation, each with and without exact re-ranking.
+
+    python benchmarks/bench_quantization.py --corpus 100000 --dim 256
+
+"resident" bytes are everything the process holds in RAM per vector: the
+float store plus the index (codes). Float modes keep their store in memory.
+Quantised modes are saved and reopened with ``mmap=True``, the deployment
+in which their codes replace the float store in RAM; the mapped store is read
+only for training and re-ranking, and its "build" time includes the reload.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.quantization import ProductQuantizedIndex, ScalarQuantizedIndex  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--pq-m", type=int, default=32)
+    parser.add_argument("--rerank", type=int, default=100)
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.corpus, args.dim, clusters=max(1, args.corpus // 500))
+    noise = 0.3 * np.random.default_rng(1).standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries = vectors[np.random.default_rng(2).choice(len(vectors), args.queries)] + noise
+    embedding_model = FakeEmbeddingModel(dim=args.dim)
+    train = {"min_train_size": args.corpus}
+
+    modes = [
+        ("float32", np.float32, None),
+        ("float16", np.float16, None),
+        ("int8", np.float32, ScalarQuantizedIndex(**train)),
+        (f"int8+rerank{args.rerank}", np.float32, ScalarQuantizedIndex(rerank=args.rerank, **train)),
+        (f"pq{args.pq_m}", np.float32, ProductQuantizedIndex(m=args.pq_m, **train)),
+        (f"pq{args.pq_m}+rerank{args.rerank}", np.float32, ProductQuantizedIndex(m=args.pq_m, rerank=args.rerank, **train)),
+    ]
+
+    truth = None
+    print(f"corpus={args.corpus} dim={args.dim} k={args.k}")
+    print(
+        f"{'mode':<22}{'index B/vec':>12}{'store B/vec':>12}{'resident B/vec':>15}"
+        f"{f'recall@{args.k}':>12}{'ms/query':>10}{'build s':>9}"
+    )
+    for name, dtype, index in modes:
+        start = time.perf_counter()
+        database = VectorDatabase(embedding_model=embedding_model, dtype=dtype)
+        database.insert_many([str(i) for i in range(len(vectors))], vectors)
+        if index is not None:
+            path = tempfile.mkdtemp(prefix="aimakerspace-quant-")
+            database.save(path)
+            database = VectorDatabase.load(path, mmap=True, embedding_model=embedding_model, index=index)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [{key for key, _ in database.search(query, args.k)} for query in queries]
+        latency = (time.perf_counter() - start) / len(queries)
+        if truth is None:
+            truth = found
+        recall = np.mean([len(a & b) / args.k for a, b in zip(found, truth)])
+
+        index_bytes = database.index.memory_bytes() / len(vectors)
+        store_bytes = database.store.resident_bytes() / len(vectors)
+        print(
+            f"{name:<22}{index_bytes:>12.1f}{store_bytes:>12.1f}{index_bytes + store_bytes:>15.1f}"
+            f"{recall:>12.3f}{latency * 1000:>10.3f}{build:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Semantic query cache in front of ``search_by_text`` on a Zipf-skewed stream of
+repeated and paraphrased queries.
+
+Paraphrases of a query embed close to it (cosine ~0.97 by default), so they
+can be served from the semantic level; exact repeats skip the embedding call.
+A write every ``--write-every`` queries invalidates cached results. Reports
+throughput with and without the cache, the cache's hit rates and estimated
+seconds saved, and how often a cached answer differs from a fresh search.
+
+    python benchmarks/bench_query_cache.py --queries 2000 --embed-latency 0.02
+"""
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.query_cache import SemanticQueryCache  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, fake_embedding, synthetic_vectors  # noqa: E402
+
+
+class ParaphraseEmbeddingModel(FakeEmbeddingModel):
+    """Texts ``"<topic> | <wording>"`` embed near the topic's vector, jittered per wording."""
+
+    def __init__(self, dim: int, latency: float, jitter: float):
+        super().__init__(dim=dim, latency=latency)
+        self.jitter = jitter
+
+    def _embed(self, text):
+        topic, _, wording = text.partition(" | ")
+        base = np.array(fake_embedding(topic, self.dim))
+        seed = int.from_bytes(hashlib.blake2b(wording.encode("utf-8"), digest_size=8).digest(), "little")
+        vector = base + self.jitter * np.random.default_rng(seed).standard_normal(self.dim) / np.sqrt(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--wordings", type=int, default=4, help="paraphrases per topic")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--jitter", type=float, default=0.25, help="paraphrase noise; 0.25 gives cosine ~0.97")
+    parser.add_argument("--embed-latency", type=float, default=0.01)
+    parser.add_argument("--write-every", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    weights = [1 / (i + 1) for i in range(args.topics)]
+    stream = [
+        f"topic {rng.choices(range(args.topics), weights)[0]} | wording {rng.randrange(args.wordings)}"
+        for _ in range(args.queries)
+    ]
+    vectors = synthetic_vectors(args.records, args.dim, seed=1, clusters=64)
+    writes = synthetic_vectors(args.queries // args.write_every + 1, args.dim, seed=2)
+
+    print(f"records={args.records} queries={args.queries} topics={args.topics} wordings={args.wordings}")
+    print(f"{'mode':<10}{'seconds':>9}{'queries/s':>11}{'hit rate':>10}{'embed hits':>12}{'saved s':>9}{'differs':>9}")
+    reference = None
+    for use_cache in (False, True):
+        model = ParaphraseEmbeddingModel(args.dim, args.embed_latency, args.jitter)
+        cache = SemanticQueryCache(similarity_threshold=args.threshold) if use_cache else None
+        db = VectorDatabase(embedding_model=model, query_cache=cache)
+        db.add_many([f"record {i}" for i in range(args.records)], vectors)
+        answers = []
+        start = time.perf_counter()
+        for i, query in enumerate(stream):
+            if i and i % args.write_every == 0:
+                db.add(f"write {i}", writes[i // args.write_every])
+            answers.append([text for text, _ in db.search_by_text(query, args.k)])
+        seconds = time.perf_counter() - start
+        if reference is None:
+            reference = answers
+        differing = sum(answer != expected for answer, expected in zip(answers, reference))
+        stats = cache.stats() if cache else {"hit_rate": 0.0, "embedding_hit_rate": 0.0, "saved_seconds": 0.0}
+        print(
+            f"{'cache' if use_cache else 'no cache':<10}{seconds:>9.2f}{len(stream) / seconds:>11.1f}"
+            f"{stats['hit_rate']:>10.2f}{stats['embedding_hit_rate']:>12.2f}{stats['saved_seconds']:>9.2f}"
+            f"{differing / len(stream):>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
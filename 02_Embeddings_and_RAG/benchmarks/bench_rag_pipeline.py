@@ -0,0 +1,83 @@
+"""
+Queries/sec and time-to-first-token of ``AsyncRAGPipeline`` under concurrent
+load, next to answering the same queries one at a time with the synchronous
+``search_by_text`` + ``ChatOpenAI.run`` path, against a local fake chat server.
+
+    python benchmarks/bench_rag_pipeline.py --queries 64 --generations 4 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI, OpenAI  # noqa: E402
+
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from aimakerspace.rag_pipeline import AsyncRAGPipeline  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, FakeOpenAIServer  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.1, help="LLM latency before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.002)
+    parser.add_argument("--generations", type=int, nargs="+", default=[1, 8, 32], help="concurrent generation limits")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    model = FakeEmbeddingModel(dim=256)
+    texts = [f"record {i} about topic {i % 97}" for i in range(args.records)]
+    db = VectorDatabase(embedding_model=model)
+    db.insert_many(texts, model.get_embeddings(texts))
+    queries = [f"what about topic {i}?" for i in range(args.queries)]
+
+    with FakeOpenAIServer(latency=args.latency, token_latency=args.token_latency) as server:
+        print(f"records={args.records} queries={args.queries} latency={args.latency}s")
+        print(f"{'mode':<26}{'seconds':>9}{'queries/s':>11}{'p50 TTFT ms':>13}")
+
+        llm = ChatOpenAI(client=OpenAI(base_url=server.base_url))
+        start = time.perf_counter()
+        for query in queries:
+            context = db.search_by_text(query, k=args.k, return_as_text=True)
+            llm.run([{"role": "user", "content": "\n".join(context) + "\n" + query}])
+        seconds = time.perf_counter() - start
+        print(f"{'sync, sequential':<26}{seconds:>9.2f}{len(queries) / seconds:>11.1f}{'-':>13}")
+
+        for generations in args.generations:
+
+            async def run():
+                llm = ChatOpenAI(async_client=AsyncOpenAI(base_url=server.base_url))
+                pipeline = AsyncRAGPipeline(llm, db, k=args.k, max_concurrent_generations=generations)
+
+                async def answer(query):
+                    started = time.perf_counter()
+                    result = await pipeline.astream_pipeline(query)
+                    first = None
+                    async for _ in result["response"]:
+                        if first is None:
+                            first = time.perf_counter() - started
+                    return first
+
+                start = time.perf_counter()
+                first_tokens = await asyncio.gather(*[answer(query) for query in queries])
+                seconds = time.perf_counter() - start
+                await llm.async_client.close()
+                return seconds, first_tokens
+
+            seconds, first_tokens = asyncio.run(run())
+            print(
+                f"{'async, ' + str(generations) + ' generations':<26}{seconds:>9.2f}{len(queries) / seconds:>11.1f}"
+                f"{1000 * statistics.median(first_tokens):>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Queries/sec of batched ``search_many`` / ``asearch_many_by_text`` against the
+per-query ``search`` / ``search_by_text`` loop.
+
+    python benchmarks/bench_search_many.py --corpus 100000 --queries 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+
+def build_database(corpus: int, dim: int, latency: float) -> VectorDatabase:
+    database = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=dim, latency=latency))
+    for i, vector in enumerate(synthetic_vectors(corpus, dim)):
+        database.insert(f"chunk-{i}", vector)
+    return database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated embedding round trip (s)")
+    args = parser.parse_args()
+
+    database = build_database(args.corpus, args.dim, args.latency)
+    query_vectors = synthetic_vectors(args.queries, args.dim, seed=1)
+    query_texts = [f"query {i}" for i in range(args.queries)]
+
+    start = time.perf_counter()
+    for query_vector in query_vectors:
+        database.search(query_vector, args.k)
+    loop_vectors = time.perf_counter() - start
+
+    start = time.perf_counter()
+    database.search_many(query_vectors, args.k)
+    batched_vectors = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query_text in query_texts:
+        database.search_by_text(query_text, args.k)
+    loop_texts = time.perf_counter() - start
+
+    start = time.perf_counter()
+    asyncio.run(database.asearch_many_by_text(query_texts, args.k))
+    batched_texts = time.perf_counter() - start
+
+    print(f"corpus={args.corpus} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'mode':<28}{'seconds':>10}{'queries/s':>14}")
+    for name, seconds in [
+        ("search loop", loop_vectors),
+        ("search_many", batched_vectors),
+        ("search_by_text loop", loop_texts),
+        ("asearch_many_by_text", batched_texts),
+    ]:
+        print(f"{name:<28}{seconds:>10.3f}{args.queries / seconds:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Search throughput of ``ShardedVectorDatabase`` with a growing number of worker
+processes, next to a single-process ``VectorDatabase`` on the same vectors.
+
+Single queries measure scatter-gather latency (one round trip to every shard);
+batches measure how well scoring spreads across cores. Scaling needs at least
+as many cores as shards.
+
+    python benchmarks/bench_sharded_search.py --records 1000000 --shards 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.sharded import ShardedVectorDatabase  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+
+def measure(search_one, search_batch, queries: np.ndarray, batch: int):
+    start = time.perf_counter()
+    for query in queries:
+        search_one(query)
+    single = len(queries) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for offset in range(0, len(queries), batch):
+        search_batch(queries[offset : offset + batch])
+    batched = len(queries) / (time.perf_counter() - start)
+    return single, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    vectors = synthetic_vectors(args.records, args.dim, seed=0, clusters=64)
+    texts = [f"record {i}" for i in range(args.records)]
+    queries = np.random.default_rng(1).standard_normal((args.queries, args.dim)).astype(np.float32)
+    print(f"records={args.records} dim={args.dim} cpus={os.cpu_count()} k={args.k}")
+    print(f"{'database':<22}{'load s':>8}{'single q/s':>12}{'batch q/s':>11}")
+
+    db = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=args.dim))
+    start = time.perf_counter()
+    db.add_many(texts, vectors)
+    loaded = time.perf_counter() - start
+    single, batched = measure(
+        lambda query: db.search(query, args.k), lambda batch: db.search_many(batch, args.k), queries, args.batch
+    )
+    print(f"{'single process':<22}{loaded:>8.2f}{single:>12.1f}{batched:>11.1f}")
+    del db
+
+    for shards in args.shards:
+        with ShardedVectorDatabase(args.dim, n_shards=shards, embedding_model=FakeEmbeddingModel(dim=args.dim)) as db:
+            start = time.perf_counter()
+            for offset in range(0, args.records, 50_000):
+                db.add_many(texts[offset : offset + 50_000], vectors[offset : offset + 50_000])
+            loaded = time.perf_counter() - start
+            single, batched = measure(
+                lambda query: db.search(query, args.k), lambda batch: db.search_many(batch, args.k), queries, args.batch
+            )
+            print(f"{str(shards) + ' shards':<22}{loaded:>8.2f}{single:>12.1f}{batched:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Chunking throughput and chunk token-count spread of ``TokenTextSplitter``
+against ``CharacterTextSplitter`` on ``data/PMarcaBlogs.txt``.
+
+    python benchmarks/bench_token_splitter.py --chunk-tokens 256
+
+Token counts use tiktoken when it is installed, otherwise the approximate counter.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.text_utils import CharacterTextSplitter, TextFileLoader, TokenTextSplitter, tiktoken  # noqa: E402
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "PMarcaBlogs.txt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-tokens", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus")
+    args = parser.parse_args()
+
+    documents = TextFileLoader(DATA_PATH).load_documents()
+    characters = sum(len(document) for document in documents)
+    token_splitter = TokenTextSplitter(chunk_tokens=args.chunk_tokens)
+    # Roughly the same average chunk size in characters, with the default 20% overlap.
+    char_splitter = CharacterTextSplitter(chunk_size=args.chunk_tokens * 4, chunk_overlap=args.chunk_tokens * 4 // 5)
+    counter = TokenTextSplitter(chunk_tokens=args.chunk_tokens).count_tokens
+
+    print(f"characters={characters} chunk_tokens={args.chunk_tokens} tokenizer={'tiktoken' if tiktoken else 'approximate'}")
+    print(f"{'splitter':<22}{'MB/s':>8}{'chunks':>8}{'mean tok':>10}{'stdev':>8}{'max':>6}")
+    for name, splitter in [
+        ("character", char_splitter),
+        ("token (cold cache)", token_splitter),
+        ("token (warm cache)", token_splitter),
+    ]:
+        passes = 1 if "cold" in name else args.repeat
+        start = time.perf_counter()
+        for _ in range(passes):
+            chunks = splitter.split_texts(documents)
+        seconds = (time.perf_counter() - start) / passes
+        counts = [counter(chunk) for chunk in chunks]
+        print(
+            f"{name:<22}{characters / seconds / 1e6:>8.2f}{len(chunks):>8}"
+            f"{statistics.mean(counts):>10.1f}{statistics.pstdev(counts):>8.1f}{max(counts):>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Regression checks for ``ConcurrentVectorDatabase`` bookkeeping across compactions.
+
+Record counts and key lookups must agree with the records actually stored,
+before and after compaction, and a key added twice must behave as it does in
+``VectorDatabase``. ``AsyncRAGPipeline`` must retrieve and pack from it while
+another thread keeps writing. Exits non-zero if any check fails.
+
+    python benchmarks/check_concurrent_database.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.concurrent_database import ConcurrentVectorDatabase  # noqa: E402
+from aimakerspace.context_packing import ContextPacker  # noqa: E402
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from aimakerspace.rag_pipeline import AsyncRAGPipeline  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel  # noqa: E402
+
+
+def expect(name: str, actual, expected) -> None:
+    if actual != expected:
+        raise AssertionError(f"{name}: expected {expected!r}, got {actual!r}")
+
+
+def check_delete_after_compact() -> None:
+    db = ConcurrentVectorDatabase(auto_compact=False)
+    db.add_many(["a", "b", "c"], np.eye(3))
+    expect("first delete", db.delete_ids([0]), 1)
+    db.compact()
+    expect("second delete", db.delete_ids([0]), 0)
+    expect("unknown id", db.delete_ids([3, -1]), 0)
+    expect("len", len(db), 2)
+    db.compact()
+    stats = db.stats()
+    expect("records after compact", (stats["records"], stats["base_rows"]), (2, 2))
+    expect("texts", sorted(text for text, _ in db.search(np.ones(3), 3)), ["b", "c"])
+
+
+def check_duplicate_keys() -> None:
+    def replay(db) -> list:
+        db.add_many(["x", "y"], np.eye(3)[:2])
+        db.add_many(["x"], np.eye(3)[2:])
+        steps = [len(db)]
+        for _ in range(3):
+            steps += [db.delete("x"), len(db)]
+        return steps
+
+    concurrent = ConcurrentVectorDatabase(auto_compact=False)
+    expect("shadowed keys", replay(concurrent), replay(VectorDatabase()))
+    compacted = ConcurrentVectorDatabase(auto_compact=False)
+    compacted.add_many(["x", "x"], np.eye(3)[:2])
+    compacted.compact()
+    expect("older record by id", compacted.delete_ids([0]), 1)
+    expect("key after deleting older record", compacted.delete("x"), True)
+    expect("len", len(compacted), 0)
+
+
+def check_pipeline_while_writing() -> None:
+    model = FakeEmbeddingModel(dim=32)
+    db = ConcurrentVectorDatabase(embedding_model=model, staging_limit=64)
+    texts = [f"fact number {i}" for i in range(200)]
+    db.add_many(texts, model.get_embeddings(texts))
+    stop = threading.Event()
+
+    def write() -> None:
+        i = 0
+        while not stop.is_set():
+            batch = [f"new fact {i + j}" for j in range(8)]
+            db.delete_ids([2 * i])
+            db.add_many(batch, model.get_embeddings(batch))
+            i += 8
+
+    pipeline = AsyncRAGPipeline(ChatOpenAI(), db, k=8, packer=ContextPacker(max_tokens=200))
+
+    async def retrieve() -> list:
+        return await asyncio.gather(*(pipeline.aretrieve(f"fact {i}?") for i in range(200)))
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        results = asyncio.run(retrieve())
+    finally:
+        stop.set()
+        writer.join()
+    expect("empty contexts", sum(not result["context"] for result in results), 0)
+
+
+CHECKS = {
+    "delete_after_compact": check_delete_after_compact,
+    "duplicate_keys": check_duplicate_keys,
+    "pipeline_while_writing": check_pipeline_while_writing,
+}
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    # The pipeline check never calls the chat model, but constructing one needs a key.
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    failed = False
+    for name, check in CHECKS.items():
+        try:
+            check()
+        except Exception as error:  # reported, then the next check runs
+            failed = True
+            print(f"{name:<28}FAIL  {error!r}")
+        else:
+            print(f"{name:<28}ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Regression checks for how ``ContextPacker`` merges neighbouring chunks.
+
+Merged text must be exactly the source text the chunks cover: overlap is cut
+at recorded character or byte offsets, never guessed from the text, and
+non-ASCII documents come back intact. Exits non-zero if any check fails.
+
+    python benchmarks/check_context_packing.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.context_packing import ContextPacker  # noqa: E402
+from aimakerspace.text_utils import CharacterTextSplitter, MappedCorpus  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel  # noqa: E402
+
+DOCUMENT = "".join(f"Grüße {i} aus Köln – naïve café “{i * 7}” ✓ 🎉. " for i in range(40))
+
+
+def expect(name: str, actual, expected) -> None:
+    if actual != expected:
+        raise AssertionError(f"{name}: expected {expected!r}, got {actual!r}")
+
+
+def packed_document(records) -> str:
+    chunks, _ = ContextPacker(max_tokens=100_000).select(records)
+    expect("packed chunks", len(chunks), 1)
+    return chunks[0]["text"]
+
+
+def check_chunk_indexes() -> None:
+    records = [
+        {"id": 0, "text": "Total: 2", "score": 0.9, "metadata": {"source": "a.txt", "chunk": 0}},
+        {"id": 1, "text": "2 items shipped", "score": 0.8, "metadata": {"source": "a.txt", "chunk": 1}},
+    ]
+    expect("accidental overlap kept", packed_document(records), "Total: 22 items shipped")
+
+
+def check_directory_offsets() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "a.txt"), "w", encoding="utf-8") as f:
+            f.write(DOCUMENT)
+        db = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=16))
+        db.update_from_directory(directory, splitter=CharacterTextSplitter(120, 40))
+        records = db.search_records(np.ones(16), len(db))
+    expect("merged text", packed_document(records), DOCUMENT)
+
+
+def check_corpus_offsets() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "a.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(DOCUMENT)
+        corpus = MappedCorpus()
+        corpus.add_file(path)
+        db = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=16))
+        asyncio.run(db.abuild_from_corpus(corpus, CharacterTextSplitter(121, 37)))
+        records = db.search_records(np.ones(16), len(db))
+    expect("merged text", packed_document(records), DOCUMENT)
+
+
+def check_mismatched_offsets() -> None:
+    records = [
+        {"id": 0, "text": "aé", "score": 0.9, "metadata": {"source": "a.txt", "start_byte": 0}},
+        {"id": 1, "text": "éb", "score": 0.8, "metadata": {"source": "a.txt", "start_byte": 2}},
+        {"id": 2, "text": "abc", "score": 0.7, "metadata": {"source": "b.txt", "start_char": 0}},
+        {"id": 3, "text": "xyz", "score": 0.6, "metadata": {"source": "b.txt", "start_char": 2}},
+    ]
+    chunks, stats = ContextPacker(max_tokens=100_000).select(records)
+    expect("unmerged texts", sorted(chunk["text"] for chunk in chunks), ["abc", "aé", "xyz", "éb"])
+    expect("merged", stats["merged"], 0)
+
+
+CHECKS = {
+    "chunk_indexes": check_chunk_indexes,
+    "directory_offsets": check_directory_offsets,
+    "corpus_offsets": check_corpus_offsets,
+    "mismatched_offsets": check_mismatched_offsets,
+}
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    failed = False
+    for name, check in CHECKS.items():
+        try:
+            check()
+        except Exception as error:  # reported, then the next check runs
+            failed = True
+            print(f"{name:<28}FAIL  {error!r}")
+        else:
+            print(f"{name:<28}ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Regression checks for ``ShardedVectorDatabase``.
+
+Results must match a single-process ``VectorDatabase``, existing shard files
+must never be overwritten, a request that fails part-way must not leave stale
+replies for the next one, and searches from several threads must stay correct
+while another thread writes. Exits non-zero if any check fails.
+
+    python benchmarks/check_sharded.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.sharded import ShardedVectorDatabase  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import synthetic_vectors  # noqa: E402
+
+DIM = 32
+
+
+def expect(name: str, actual, expected) -> None:
+    if actual != expected:
+        raise AssertionError(f"{name}: expected {expected!r}, got {actual!r}")
+
+
+def texts_of(results) -> list:
+    return [text for text, _ in results]
+
+
+def check_matches_single_process() -> None:
+    vectors = synthetic_vectors(2000, DIM, seed=0, clusters=16)
+    queries = synthetic_vectors(10, DIM, seed=1, clusters=16)
+    texts = [f"record {i}" for i in range(len(vectors))]
+    reference = VectorDatabase()
+    reference.add_many(texts, vectors)
+    reference.delete_ids(list(range(0, 2000, 7)))
+    with ShardedVectorDatabase(DIM, n_shards=3) as db:
+        db.add_many(texts, vectors)
+        expect("deleted", db.delete_ids(list(range(0, 2000, 7)) + [0]), 286)
+        for query in queries:
+            expect("top-10", texts_of(db.search(query, 10)), texts_of(reference.search(query, 10)))
+
+
+def check_existing_files() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        with ShardedVectorDatabase(DIM, n_shards=2, path=directory) as db:
+            db.add_many(["kept"], np.ones((1, DIM)))
+        size = os.path.getsize(os.path.join(directory, "shard-0.npy"))
+        try:
+            ShardedVectorDatabase(DIM, n_shards=2, path=directory).close()
+        except FileExistsError:
+            pass
+        else:
+            raise AssertionError("an existing shard directory was reused")
+        expect("shard file size", os.path.getsize(os.path.join(directory, "shard-0.npy")), size)
+
+
+def check_failed_scatter() -> None:
+    with ShardedVectorDatabase(DIM, n_shards=3, max_concurrent_requests=1) as db:
+        db.add_many(["a", "b", "c"], np.eye(3, DIM))
+        # The second request cannot be pickled, after the first shard already has its own.
+        requests = {0: ("stats", ()), 1: ("search", (lambda: None, 1)), 2: ("stats", ())}
+        try:
+            db._scatter(requests)
+        except Exception:
+            pass
+        else:
+            raise AssertionError("an unpicklable request was sent")
+        expect("rows after failure", sum(shard["rows"] for shard in db.stats()), 3)
+        expect("search after failure", texts_of(db.search(np.eye(1, DIM, 1)[0], 1)), ["b"])
+
+
+def check_concurrent_searches() -> None:
+    vectors = synthetic_vectors(500, DIM, seed=2, clusters=8)
+    with ShardedVectorDatabase(DIM, n_shards=2) as db:
+        ids = db.add_many([f"record {i}" for i in range(len(vectors))], vectors)
+        stop = threading.Event()
+        errors = []
+
+        def write() -> None:
+            i = 0
+            while not stop.is_set():
+                db.delete_ids([ids[i % len(ids)]])
+                db.add_many([f"extra {i}"], vectors[i % len(vectors)][None])
+                i += 1
+
+        def read(offset: int) -> None:
+            try:
+                for i in range(100):
+                    vector = vectors[(offset + i) % len(vectors)]
+                    results = db.search(vector, 5)
+                    scores = [score for _, score in results]
+                    if len(results) != 5 or scores != sorted(scores, reverse=True):
+                        raise AssertionError(f"unexpected results {results}")
+            except Exception as error:  # collected, then reported by the main thread
+                errors.append(error)
+
+        writer = threading.Thread(target=write)
+        readers = [threading.Thread(target=read, args=(100 * i,)) for i in range(4)]
+        writer.start()
+        for reader in readers:
+            reader.start()
+        for reader in readers:
+            reader.join()
+        stop.set()
+        writer.join()
+        expect("reader errors", errors, [])
+
+
+CHECKS = {
+    "matches_single_process": check_matches_single_process,
+    "existing_files": check_existing_files,
+    "failed_scatter": check_failed_scatter,
+    "concurrent_searches": check_concurrent_searches,
+}
+
+
+def main():
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    failed = False
+    for name, check in CHECKS.items():
+        try:
+            check()
+        except Exception as error:  # reported, then the next check runs
+            failed = True
+            print(f"{name:<28}FAIL  {error!r}")
+        else:
+            print(f"{name:<28}ok")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
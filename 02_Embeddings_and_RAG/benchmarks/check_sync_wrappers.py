@@ -0,0 +1,83 @@
+"""
+Regression check for the synchronous wrappers around async code.
+
+Each wrapper runs its own ``asyncio.run``; async OpenAI clients are bound to the
+loop they were first used on, so calling a wrapper twice on the same instance
+is what breaks if a client leaks from one loop into the next. Runs against the
+local fake OpenAI server and exits non-zero on the first failure.
+
+    python benchmarks/check_sync_wrappers.py
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from aimakerspace.openai_utils.embedding import EmbeddingModel  # noqa: E402
+from aimakerspace.openai_utils.scheduler import EmbeddingScheduler  # noqa: E402
+from aimakerspace.rag_pipeline import AsyncRAGPipeline  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeOpenAIServer  # noqa: E402
+
+
+def check_update_from_directory(calls: int) -> None:
+    directory = tempfile.mkdtemp(prefix="aimakerspace-check-")
+    db = VectorDatabase(embedding_model=EmbeddingModel(scheduler=EmbeddingScheduler(max_retries=0)))
+    for i in range(calls):
+        with open(os.path.join(directory, f"doc{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"document number {i}. " * 40)
+        stats = db.update_from_directory(directory)
+        if stats["added"] != 1 or stats["unchanged"] != i:
+            raise AssertionError(f"call {i + 1}: unexpected stats {stats}")
+
+
+def check_run_pipeline(calls: int) -> None:
+    db = VectorDatabase(embedding_model=EmbeddingModel(scheduler=EmbeddingScheduler(max_retries=0)))
+
+    async def build() -> None:
+        try:
+            await db.abuild_from_list([f"fact number {i}" for i in range(20)])
+        finally:
+            # Closed inside its own loop; left to the garbage collector it fails in a later one.
+            await db.embedding_model.aclose()
+
+    asyncio.run(build())
+    pipeline = AsyncRAGPipeline(ChatOpenAI(), db, k=2)
+    for i in range(calls):
+        result = pipeline.run_pipeline(f"question {i}?")
+        if not result["response"] or len(result["context"]) != 2:
+            raise AssertionError(f"call {i + 1}: unexpected result {result}")
+
+
+CHECKS = {
+    "update_from_directory": check_update_from_directory,
+    "run_pipeline": check_run_pipeline,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=3, help="calls per wrapper on the same instance")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    failed = False
+    with FakeOpenAIServer(latency=0.0) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        for name, check in CHECKS.items():
+            try:
+                check(args.calls)
+            except Exception as error:  # reported, then the next check runs
+                failed = True
+                print(f"{name:<28}FAIL  {error!r}")
+            else:
+                print(f"{name:<28}ok    ({args.calls} calls)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Deterministic, offline stand-ins for the OpenAI-backed models used by the benchmarks."""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List
+
+import numpy as np
+
+
+def fake_embedding(text: str, dim: int) -> List[float]:
+    """Fixed pseudo-random unit vector seeded from a hash of ``text``."""
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+    vector = np.random.default_rng(seed).standard_normal(dim)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingModel:
+    """
+    Drop-in replacement for ``EmbeddingModel`` that never touches the network.
+
+    Each text maps to a fixed pseudo-random unit vector seeded from its hash, and
+    every API "round trip" sleeps for ``latency`` seconds so batching effects show up.
+    """
+
+    def __init__(self, dim: int = 256, latency: float = 0.0, embeddings_model_name: str = "fake-embedding"):
+        self.dim = dim
+        self.latency = latency
+        self.embeddings_model_name = embeddings_model_name
+        self.calls = 0
+
+    def _embed(self, text: str) -> List[float]:
+        return fake_embedding(text, self.dim)
+
+    def get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in list_of_text]
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.get_embeddings([text])[0]
+
+    async def async_get_embeddings(self, list_of_text: List[str]) -> List[List[float]]:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in list_of_text]
+
+    async def async_get_embedding(self, text: str) -> List[float]:
+        return (await self.async_get_embeddings([text]))[0]
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0, clusters: int = 0) -> np.ndarray:
+    """Random float32 vectors; with ``clusters`` > 0 they are drawn around cluster centres."""
+    rng = np.random.default_rng(seed)
+    if clusters <= 0:
+        return rng.standard_normal((n, dim), dtype=np.float32)
+    centres = rng.standard_normal((clusters, dim), dtype=np.float32)
+    assignment = rng.integers(0, clusters, size=n)
+    return centres[assignment] + 0.5 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+class FakeOpenAIServer:
+    """
+    Local HTTP server speaking just enough of the OpenAI REST API for offline runs.
+
+    Serves ``POST /v1/embeddings`` and ``POST /v1/chat/completions`` (including
+    ``stream=True`` as server-sent events). Each request sleeps ``latency`` seconds
+    and fails with HTTP 429 with probability ``error_rate``. Chat replies echo the
+    last message back word by word, one streamed chunk every ``token_latency`` seconds.
+
+        with FakeOpenAIServer(error_rate=0.1) as server:
+            client = AsyncOpenAI(base_url=server.base_url, api_key="fake")
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        token_latency: float = 0.0,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.token_latency = token_latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            fail = self._random.random() < self.error_rate
+            self.errors += fail
+            return fail
+
+    @staticmethod
+    def chat_reply(messages: List[dict]) -> str:
+        return f"You said: {messages[-1]['content']}" if messages else "Hello"
+
+    def _chat_completion(self, body: dict):
+        model = body.get("model", "fake-chat")
+        reply = self.chat_reply(body.get("messages", []))
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 + 1 for m in body.get("messages", []))
+        completion_tokens = len(reply) // 4 + 1
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": model}
+        if body.get("stream"):
+            return 200, self._chat_stream(base, reply)
+        if self.token_latency:
+            # A non-streamed completion arrives only once every token is generated.
+            time.sleep(self.token_latency * len(reply.split(" ")))
+        return 200, {
+            **base,
+            "object": "chat.completion",
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _chat_stream(self, base: dict, reply: str) -> Iterator[dict]:
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            yield {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+        yield {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+
+    def handle(self, path: str, body: dict):
+        """
+        Returns ``(status, payload)`` for one request; a streamed response's payload
+        is an iterator of chunk dicts sent as server-sent events.
+        """
+        path = path.rstrip("/")
+        if path == "/v1/chat/completions":
+            return self._chat_completion(body)
+        if path != "/v1/embeddings":
+            return 404, {"error": {"message": f"Unknown path {path}", "type": "invalid_request_error"}}
+        texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        tokens = sum(len(text) // 4 + 1 for text in texts)
+        return 200, {
+            "object": "list",
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fake_embedding(text, self.dim)}
+                for i, text in enumerate(texts)
+            ],
+            "model": body.get("model", "fake-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 keep-alive, so connection reuse by pooled clients is measurable.
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: dict) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_events(self, events: Iterator[dict]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                for event in events:
+                    self.wfile.write(b"data: " + json.dumps(event).encode("utf-8") + b"\n\n")
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                # Without a Content-Length the client reads until the connection closes.
+                self.close_connection = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if server.latency:
+                    time.sleep(server.latency)
+                if server._should_fail():
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_error"}})
+                    return
+                status, payload = server.handle(self.path, body)
+                if isinstance(payload, dict):
+                    self._send_json(status, payload)
+                else:
+                    self._send_events(payload)
+
+        return Handler
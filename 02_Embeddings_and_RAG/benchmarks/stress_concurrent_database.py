@@ -0,0 +1,175 @@
+"""
+Mixed read/write stress test for ``ConcurrentVectorDatabase``.
+
+Reader threads search continuously while a writer thread adds batches,
+overwrites keys and deletes records at a fixed rate, with background compaction
+enabled. Every search result is checked: scores sorted, at most k results, and
+no record whose delete had returned before the search started. The same load is
+then run against a plain ``VectorDatabase`` behind one lock, to show how long
+readers stall behind ingest there, and the search latency ratio is reported.
+
+    python benchmarks/stress_concurrent_database.py --seconds 10 --readers 4 --min-speedup 1.2
+
+Both databases get the same offered write rate, so the comparison is of reader
+latency under equal load rather than of how much CPU an unthrottled writer can
+take. On a single core the GIL serialises the readers and the writer whichever
+database is used, and the two are close; the lock-free reads pay off once
+several cores can run searches side by side. ``--min-speedup`` turns the
+reported p50 speedup into a pass/fail gate.
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from aimakerspace.concurrent_database import ConcurrentVectorDatabase  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, synthetic_vectors  # noqa: E402
+
+
+class LockedVectorDatabase:
+    """Baseline: a VectorDatabase with every call serialised by one lock."""
+
+    def __init__(self, db: VectorDatabase):
+        self.db = db
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+
+        def locked(*args, **kwargs):
+            with self.lock:
+                return method(*args, **kwargs)
+
+        return locked
+
+
+def run(db, args, initial: int) -> dict:
+    stop = threading.Event()
+    deleted_at = {}
+    errors, violations, latencies = [], [], []
+    writes = [0]
+
+    def writer():
+        rng = random.Random(1)
+        next_key = initial
+        vectors = synthetic_vectors(args.batch, args.dim, seed=2)
+        next_batch = time.perf_counter()
+        try:
+            while not stop.is_set():
+                if args.write_rate > 0:
+                    next_batch += 1.0 / args.write_rate
+                    stop.wait(max(0.0, next_batch - time.perf_counter()))
+                keys = [f"doc {next_key + i}" for i in range(args.batch)]
+                db.insert_many(keys, vectors)
+                next_key += args.batch
+                db.insert_many([f"doc {rng.randrange(next_key)}"], vectors[:1])
+                for _ in range(args.batch // 4):
+                    key = f"doc {rng.randrange(next_key)}"
+                    if db.delete(key):
+                        deleted_at[key] = time.perf_counter()
+                writes[0] += args.batch + 1 + args.batch // 4
+        except Exception as error:  # surfaced in the report
+            errors.append(repr(error))
+
+    def reader(seed: int):
+        queries = np.random.default_rng(seed).standard_normal((64, args.dim)).astype(np.float32)
+        own = []
+        i = 0
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                results = db.search(queries[i % len(queries)], args.k)
+                own.append(time.perf_counter() - started)
+                i += 1
+                scores = [score for _, score in results]
+                if len(results) > args.k or scores != sorted(scores, reverse=True):
+                    violations.append(("order", results))
+                for text, _ in results:
+                    if deleted_at.get(text, started) < started:
+                        violations.append(("deleted", text))
+        except Exception as error:
+            errors.append(repr(error))
+        latencies.extend(own)
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader, args=(seed,)) for seed in range(args.readers)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    latencies.sort()
+    return {
+        "searches": len(latencies),
+        "writes": writes[0],
+        "p50_ms": 1000 * latencies[len(latencies) // 2] if latencies else 0.0,
+        "p99_ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))] if latencies else 0.0,
+        "max_ms": 1000 * latencies[-1] if latencies else 0.0,
+        "errors": errors,
+        "violations": violations,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--write-rate", type=float, default=20.0, help="writer batches per second (0: unthrottled)")
+    parser.add_argument(
+        "--min-speedup", type=float, help="fail unless locked p50 / concurrent p50 reaches this (default: report only)"
+    )
+    parser.add_argument("--staging-limit", type=int, default=5_000)
+    args = parser.parse_args()
+
+    model = FakeEmbeddingModel(dim=args.dim)
+    vectors = synthetic_vectors(args.records, args.dim, seed=0, clusters=32)
+    keys = [f"doc {i}" for i in range(args.records)]
+
+    concurrent = ConcurrentVectorDatabase(embedding_model=model, staging_limit=args.staging_limit)
+    concurrent.insert_many(keys, vectors)
+    concurrent.compact()
+    plain = VectorDatabase(embedding_model=model)
+    plain.insert_many(keys, vectors)
+
+    print(f"records={args.records} readers={args.readers} seconds={args.seconds} write_rate={args.write_rate}")
+    print(f"{'database':<14}{'searches':>10}{'writes':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}{'bad':>6}")
+    failed = False
+    reports = {}
+    for name, db in [("concurrent", concurrent), ("locked", LockedVectorDatabase(plain))]:
+        report = reports[name] = run(db, args, args.records)
+        print(
+            f"{name:<14}{report['searches']:>10}{report['writes']:>9}{report['p50_ms']:>9.2f}"
+            f"{report['p99_ms']:>9.2f}{report['max_ms']:>9.2f}{len(report['errors']):>8}{len(report['violations']):>6}"
+        )
+        for error in report["errors"][:3]:
+            print("  error:", error)
+        for violation in report["violations"][:3]:
+            print("  violation:", violation)
+        failed = failed or bool(report["errors"] or report["violations"])
+    print("concurrent stats:", concurrent.stats())
+    speedups = {
+        stat: reports["locked"][stat] / reports["concurrent"][stat] if reports["concurrent"][stat] else 0.0
+        for stat in ("p50_ms", "p99_ms")
+    }
+    print(f"search speedup (locked / concurrent): p50 {speedups['p50_ms']:.2f}x  p99 {speedups['p99_ms']:.2f}x")
+    if args.min_speedup is not None and speedups["p50_ms"] < args.min_speedup:
+        print(f"p50 speedup below --min-speedup {args.min_speedup:.2f}x")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
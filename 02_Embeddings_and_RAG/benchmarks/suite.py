@@ -0,0 +1,313 @@
+"""
+Offline, reproducible benchmark suite for the aimakerspace hot paths.
+
+Covers ingest throughput (splitting, embedding through the client against a
+local fake server, inserting), search latency against corpus size and k,
+resident memory per vector for each storage/index option (quantised indexes
+with the float store memory-mapped), prompt rendering rate and chat round
+trips. Everything is seeded and runs without network access.
+
+    python benchmarks/suite.py run --output baseline.json
+    python benchmarks/suite.py run --output candidate.json
+    python benchmarks/suite.py compare baseline.json candidate.json --threshold 0.10
+
+``compare`` exits with status 1 when any metric is worse than the baseline by
+more than ``threshold`` (relative), or is missing from the candidate, so it
+can gate CI.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from aimakerspace.ann_index import IVFIndex  # noqa: E402
+from aimakerspace.openai_utils.chatmodel import ChatOpenAI  # noqa: E402
+from aimakerspace.openai_utils.embedding import EmbeddingModel  # noqa: E402
+from aimakerspace.openai_utils.prompts import BasePrompt, ConditionalPrompt  # noqa: E402
+from aimakerspace.quantization import ProductQuantizedIndex, ScalarQuantizedIndex  # noqa: E402
+from aimakerspace.text_utils import CharacterTextSplitter  # noqa: E402
+from aimakerspace.vectordatabase import VectorDatabase  # noqa: E402
+from benchmarks.fakes import FakeEmbeddingModel, FakeOpenAIServer, synthetic_vectors  # noqa: E402
+
+SIZES = {"quick": {"sizes": [1_000, 10_000], "ks": [1, 10], "ingest": 2_000},
+         "full": {"sizes": [1_000, 10_000, 100_000], "ks": [1, 10, 100], "ingest": 20_000}}
+
+
+def metric(name: str, value: float, unit: str, higher_is_better: bool) -> Dict:
+    return {"name": name, "value": float(value), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def repeat(function: Callable[[], float], repeats: int) -> float:
+    """Median of ``repeats`` measurements, to damp scheduler noise."""
+    return statistics.median(function() for _ in range(repeats))
+
+
+def rate(function: Callable[[], None], seconds: float) -> float:
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def corpus(n_chars: int, seed: int) -> str:
+    words = ["retrieval", "vector", "token", "prompt", "embedding", "context", "answer", "query", "chunk", "model"]
+    rng = random.Random(seed)
+    text, length = [], 0
+    while length < n_chars:
+        word = rng.choice(words)
+        text.append(word)
+        length += len(word) + 1
+    return " ".join(text)
+
+
+def bench_ingest(config: Dict, args) -> List[Dict]:
+    text = corpus(4_000_000 if config is SIZES["full"] else 1_000_000, args.seed)
+    splitter = CharacterTextSplitter()
+
+    def split() -> float:
+        start = time.perf_counter()
+        splitter.split(text)
+        return len(text) / 1e6 / (time.perf_counter() - start)
+
+    chunks = splitter.split(text)[: config["ingest"]]
+    model = FakeEmbeddingModel(dim=args.dim)
+    vectors = model.get_embeddings(chunks)
+
+    def insert() -> float:
+        db = VectorDatabase(embedding_model=model)
+        start = time.perf_counter()
+        db.insert_many(chunks, vectors)
+        return len(chunks) / (time.perf_counter() - start)
+
+    def embed() -> float:
+        async def run():
+            embedding_model = EmbeddingModel()
+            embedding_model.async_client = AsyncOpenAI(base_url=server.base_url, max_retries=0)
+            start = time.perf_counter()
+            await embedding_model.async_get_embeddings(chunks)
+            seconds = time.perf_counter() - start
+            await embedding_model.async_client.close()
+            return len(chunks) / seconds
+
+        return asyncio.run(run())
+
+    with FakeOpenAIServer(dim=args.dim) as server:
+        embedded = repeat(embed, args.repeats)
+    return [
+        metric("ingest.split_mb_per_sec", repeat(split, args.repeats), "MB/s", True),
+        metric("ingest.embed_texts_per_sec", embedded, "texts/s", True),
+        metric("ingest.insert_texts_per_sec", repeat(insert, args.repeats), "texts/s", True),
+    ]
+
+
+def bench_search(config: Dict, args) -> List[Dict]:
+    results = []
+    rng = np.random.default_rng(args.seed + 1)
+    for size in config["sizes"]:
+        db = VectorDatabase(embedding_model=FakeEmbeddingModel(dim=args.dim))
+        db.add_many([str(i) for i in range(size)], synthetic_vectors(size, args.dim, seed=args.seed, clusters=64))
+        queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+        for k in config["ks"]:
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                db.search(query, k)
+                latencies.append(time.perf_counter() - start)
+            latencies.sort()
+            results.append(metric(f"search.n{size}.k{k}.p50_ms", 1000 * latencies[len(latencies) // 2], "ms", False))
+            results.append(metric(
+                f"search.n{size}.k{k}.p95_ms", 1000 * latencies[int(0.95 * (len(latencies) - 1))], "ms", False
+            ))
+        start = time.perf_counter()
+        db.search_many(queries, 10)
+        results.append(metric(
+            f"search.n{size}.batch_queries_per_sec", len(queries) / (time.perf_counter() - start), "queries/s", True
+        ))
+    return results
+
+
+def bench_memory(config: Dict, args) -> List[Dict]:
+    size = config["sizes"][-1]
+    vectors = synthetic_vectors(size, args.dim, seed=args.seed, clusters=64)
+    embedding_model = FakeEmbeddingModel(dim=args.dim)
+    results = []
+    for name, dtype, index in [
+        ("float32", np.float32, None),
+        ("float16", np.float16, None),
+        ("ivf", np.float32, IVFIndex(min_train_size=min(size, 10_000))),
+        ("int8", np.float32, ScalarQuantizedIndex(min_train_size=min(size, 10_000))),
+        ("pq16", np.float32, ProductQuantizedIndex(m=16, min_train_size=min(size, 10_000))),
+    ]:
+        with tempfile.TemporaryDirectory(prefix="aimakerspace-suite-") as path:
+            if name in ("int8", "pq16"):
+                # Quantised deployments keep the codes resident and map the float store from disk.
+                db = VectorDatabase(embedding_model=embedding_model, dtype=dtype)
+                db.add_many([str(i) for i in range(size)], vectors)
+                db.save(path)
+                db = VectorDatabase.load(path, mmap=True, embedding_model=embedding_model, index=index)
+            else:
+                db = VectorDatabase(embedding_model=embedding_model, index=index, dtype=dtype)
+                db.add_many([str(i) for i in range(size)], vectors)
+            per_vector = (db.store.resident_bytes() + db.index.memory_bytes()) / size
+        results.append(metric(f"memory.{name}.bytes_per_vector", per_vector, "bytes", False))
+    return results
+
+
+def bench_prompts(config: Dict, args) -> List[Dict]:
+    context = "retrieved text " * 2_000
+    values = {f"var{i}": f"value {i}" for i in range(20)}
+    base = BasePrompt("Context:\n{context}\n" + " ".join(f"{{{name}}}" for name in values))
+    conditional = ConditionalPrompt(
+        "Context:\n{context}\n" + " ".join(f"{{{name}}}" for name in values)
+        + "{if verbose}Answer in detail.{else}Be brief.{/if}"
+    )
+    return [
+        metric("prompt.base_renders_per_sec", repeat(
+            lambda: rate(lambda: base.format_prompt(context=context, **values), args.seconds), args.repeats
+        ), "renders/s", True),
+        metric("prompt.conditional_renders_per_sec", repeat(
+            lambda: rate(lambda: conditional.format_prompt(context=context, verbose=True, **values), args.seconds),
+            args.repeats,
+        ), "renders/s", True),
+    ]
+
+
+def bench_chat(config: Dict, args) -> List[Dict]:
+    messages = [[{"role": "user", "content": f"question {i}"}] for i in range(200)]
+
+    def batch() -> float:
+        async def run():
+            chat = ChatOpenAI(async_client=AsyncOpenAI(base_url=server.base_url))
+            start = time.perf_counter()
+            await chat.abatch(messages, max_concurrency=16)
+            seconds = time.perf_counter() - start
+            await chat.async_client.close()
+            return len(messages) / seconds
+
+        return asyncio.run(run())
+
+    with FakeOpenAIServer() as server:
+        return [metric("chat.abatch_requests_per_sec", repeat(batch, args.repeats), "requests/s", True)]
+
+
+BENCHMARKS = {
+    "ingest": bench_ingest,
+    "search": bench_search,
+    "memory": bench_memory,
+    "prompts": bench_prompts,
+    "chat": bench_chat,
+}
+
+
+def environment() -> Dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=os.path.dirname(__file__)
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git_commit": commit,
+    }
+
+
+def run(args) -> int:
+    os.environ.setdefault("OPENAI_API_KEY", "fake")
+    config = SIZES["quick" if args.quick else "full"]
+    selected = args.only or list(BENCHMARKS)
+    metrics: List[Dict] = []
+    for name in selected:
+        start = time.perf_counter()
+        results = BENCHMARKS[name](config, args)
+        metrics.extend(results)
+        print(f"{name:<10} {len(results):>3} metrics in {time.perf_counter() - start:6.1f}s", file=sys.stderr)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"quick": args.quick, "seed": args.seed, "dim": args.dim, "repeats": args.repeats},
+        "environment": environment(),
+        "metrics": {m["name"]: m for m in metrics},
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)["metrics"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["metrics"]
+    regressions = 0
+    print(f"{'metric':<42}{'baseline':>14}{'candidate':>14}{'change':>9}")
+    for name in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[name]["value"], candidate[name]["value"]
+        change = (after - before) / before if before else 0.0
+        worse = -change if baseline[name]["higher_is_better"] else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = "  improved"
+        print(f"{name:<42}{before:>14.4g}{after:>14.4g}{100 * change:>8.1f}%{flag}")
+    # A metric the candidate no longer reports (deleted or crashing benchmark) fails the comparison.
+    missing = sorted(set(baseline) - set(candidate))
+    for name in missing:
+        print(f"{name:<42}{baseline[name]['value']:>14.4g}{'missing':>14}  MISSING")
+    for name in sorted(set(candidate) - set(baseline)):
+        print(f"{name:<42}  only in candidate")
+    print(f"\n{regressions} regression(s) beyond {100 * args.threshold:.0f}%, {len(missing)} missing metric(s)")
+    return 1 if regressions or missing else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the suite and write JSON results")
+    run_parser.add_argument("--output", help="JSON file to write (stdout if omitted)")
+    run_parser.add_argument("--quick", action="store_true", help="smaller corpora for a fast smoke run")
+    run_parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--dim", type=int, default=256)
+    run_parser.add_argument("--queries", type=int, default=200, help="queries per search measurement")
+    run_parser.add_argument("--repeats", type=int, default=3, help="repeats per throughput measurement (median)")
+    run_parser.add_argument("--seconds", type=float, default=0.3, help="time per rate measurement")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files and flag regressions")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.command == "run" else compare(args))
+
+
+if __name__ == "__main__":
+    main()